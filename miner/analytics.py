@@ -0,0 +1,198 @@
+"""Analytics over the batchtimes history (see history.py).
+
+BatchAnalytics keeps the history in column arrays together with running
+sums of wei and tokens, so that burn rates over any time range and rolling
+windows come down to a binary search and a subtraction, for all batches at
+once. New batches are folded in with `update`, without recomputing the sums
+over the whole history.
+
+    $ python -m miner.analytics batchtimes.bin --window 86400
+"""
+
+import argparse
+
+import numpy as np
+
+from .history import BatchHistory
+
+# the miners mint 0x1a tokens per transaction
+TOKENS_PER_TX = 0x1a
+
+COLUMNS = ('end_nonce', 'time_start', 'time_end', 'wei_consumed')
+
+
+class BatchAnalytics(object):
+
+    def __init__(self, records=None, tokens_per_tx=TOKENS_PER_TX):
+        self.tokens_per_tx = tokens_per_tx
+        self._n = 0
+        self._capacity = 0
+        self._columns = {}
+        # _cum_wei[i] is the wei consumed by batches 0..i, likewise _cum_txs
+        self._cum_wei = None
+        self._cum_txs = None
+        self._grow(1024)
+        if records is not None:
+            self.update(records)
+
+    @classmethod
+    def from_history(cls, history, **kwargs):
+        return cls(history.records, **kwargs)
+
+    def __len__(self):
+        return self._n
+
+    def _grow(self, capacity):
+        def resized(column, dtype):
+            new = np.zeros(capacity, dtype=dtype)
+            if column is not None:
+                new[:self._n] = column[:self._n]
+            return new
+        for name in COLUMNS:
+            dtype = np.uint64 if name == 'end_nonce' else np.float64
+            self._columns[name] = resized(self._columns.get(name), dtype)
+        self._cum_wei = resized(self._cum_wei, np.float64)
+        self._cum_txs = resized(self._cum_txs, np.float64)
+        self._capacity = capacity
+
+    def update(self, records):
+        """Appends `records`, a structured array with the fields of
+        history.DTYPE, e.g. the tail of BatchHistory.records.
+        """
+        k = len(records)
+        if k == 0:
+            return
+        if self._n + k > self._capacity:
+            self._grow(max(2 * self._capacity, self._n + k))
+        n = self._n
+        for name in COLUMNS:
+            self._columns[name][n:n + k] = records[name]
+
+        nonces = self._columns['end_nonce'][max(n - 1, 0):n + k].astype(np.float64)
+        # the first batch has no predecessor, so its size is unknown
+        txs = np.diff(nonces)
+        if n == 0:
+            txs = np.concatenate([[0.0], txs])
+        wei = self._columns['wei_consumed'][n:n + k]
+        wei_before = self._cum_wei[n - 1] if n else 0.0
+        txs_before = self._cum_txs[n - 1] if n else 0.0
+        self._cum_wei[n:n + k] = wei_before + np.cumsum(wei)
+        self._cum_txs[n:n + k] = txs_before + np.cumsum(txs)
+        self._n = n + k
+
+    def refresh(self, history):
+        """Folds in the batches appended to `history` since the last call."""
+        self.update(history.records[self._n:])
+
+    def column(self, name):
+        return self._columns[name][:self._n]
+
+    def durations(self):
+        return self.column('time_end') - self.column('time_start')
+
+    def burn_rates(self):
+        """Wei per second of every batch."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.column('wei_consumed') / self.durations()
+
+    def txs(self):
+        """Transactions in every batch (0 for the first batch)."""
+        cum = self._cum_txs[:self._n]
+        return np.diff(cum, prepend=0.0)
+
+    def wei_per_token(self):
+        """Wei paid per minted token in every batch (nan for the first)."""
+        tokens = self.txs() * self.tokens_per_tx
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(tokens > 0, self.column('wei_consumed') / tokens, np.nan)
+
+    def latency_percentiles(self, q=(50, 90, 99)):
+        """Percentiles of the time it took to mine a batch, in seconds. The
+        engine starts every batch where the previous one ended, so this is
+        the latency at which batches of transactions are included.
+        """
+        if self._n == 0:
+            return dict((p, float('nan')) for p in q)
+        return dict(zip(q, np.percentile(self.durations(), q).tolist()))
+
+    def _range(self, start, end):
+        # batches [i, j) that ended within [start, end)
+        ends = self.column('time_end')
+        i = 0 if start is None else int(np.searchsorted(ends, start, side='left'))
+        j = self._n if end is None else int(np.searchsorted(ends, end, side='left'))
+        return i, j
+
+    def _sum(self, cum, i, j):
+        if j <= i:
+            return 0.0
+        return cum[j - 1] - (cum[i - 1] if i else 0.0)
+
+    def summary(self, start=None, end=None):
+        """Totals over the batches that ended within [start, end)."""
+        i, j = self._range(start, end)
+        wei = float(self._sum(self._cum_wei, i, j))
+        txs = float(self._sum(self._cum_txs, i, j))
+        elapsed = 0.0
+        counted_wei = wei
+        if j > i:
+            elapsed = float(self.column('time_end')[j - 1] - self.column('time_start')[i])
+            if i == 0:
+                # the first batch has no tx count to divide by
+                counted_wei -= float(self._columns['wei_consumed'][0])
+        tokens = txs * self.tokens_per_tx
+        return {
+            'batches': j - i,
+            'txs': txs,
+            'tokens': tokens,
+            'wei_consumed': wei,
+            'seconds': elapsed,
+            'burn_rate': wei / elapsed if elapsed > 0 else float('nan'),
+            'wei_per_token': counted_wei / tokens if tokens > 0 else float('nan'),
+        }
+
+    def rolling(self, window):
+        """For every batch, the burn rate (wei per second) and wei per token
+        over the batches that ended in the `window` seconds up to it.
+        Returns (time_end, burn_rate, wei_per_token) arrays.
+        """
+        ends = self.column('time_end')
+        cum_wei = self._cum_wei[:self._n]
+        cum_txs = self._cum_txs[:self._n]
+        # index of the first batch inside each window
+        first = np.searchsorted(ends, ends - window, side='right')
+        wei_before = np.where(first > 0, cum_wei[first - 1], 0.0)
+        txs_before = np.where(first > 0, cum_txs[first - 1], 0.0)
+        wei = cum_wei - wei_before
+        # the first batch has no tx count to divide by
+        counted_wei = wei - np.where(first == 0, self._columns['wei_consumed'][0], 0.0)
+        tokens = (cum_txs - txs_before) * self.tokens_per_tx
+        elapsed = ends - self.column('time_start')[first]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            burn_rate = np.where(elapsed > 0, wei / elapsed, np.nan)
+            wei_per_token = np.where(tokens > 0, counted_wei / tokens, np.nan)
+        return ends, burn_rate, wei_per_token
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarizes a batch history.')
+    parser.add_argument('history', help='binary batch history, e.g. batchtimes.bin')
+    parser.add_argument('--window', type=float, default=86400,
+                        help='rolling window in seconds (default: one day)')
+    args = parser.parse_args()
+
+    history = BatchHistory(args.history)
+    analytics = BatchAnalytics.from_history(history)
+    if not len(analytics):
+        print("no batches")
+        return
+    for key, value in sorted(analytics.summary().items()):
+        print("{:>14}: {}".format(key, value))
+    for q, latency in sorted(analytics.latency_percentiles().items()):
+        print("{:>13}%: {:.1f}s batch latency".format(q, latency))
+    ends, burn_rate, wei_per_token = analytics.rolling(args.window)
+    print("last {:.0f}s: {} wei/s, {} wei/token".format(
+        args.window, burn_rate[-1], wei_per_token[-1]))
+
+
+if __name__ == '__main__':
+    main()
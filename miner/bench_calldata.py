@@ -0,0 +1,50 @@
+"""Microbenchmark of calldata construction: the per-transaction ABI encoding
+the miners used to do against the precompiled templates of calldata.py.
+
+    $ python -m miner.bench_calldata
+"""
+
+import json
+import timeit
+
+from eth_abi import encode_abi
+from eth_utils import (
+    encode_hex,
+    function_abi_to_4byte_selector,
+)
+
+from . import calldata
+
+ADDRESS = '0x' + '42' * 20
+
+
+def main():
+    with open(calldata.ABI_PATH) as fd:
+        abi = {fn_abi.get('name'): fn_abi for fn_abi in json.load(fd)}
+
+    # what the miners did for every transaction
+    def abi_mint():
+        fn_selector = function_abi_to_4byte_selector(abi['mint'])
+        return encode_hex(fn_selector + encode_abi(["uint256"], [0x1a]))
+
+    def abi_free_from_up_to():
+        fn_selector = function_abi_to_4byte_selector(abi['freeFromUpTo'])
+        return encode_hex(fn_selector + encode_abi(["address", "uint256"], [ADDRESS, 0x1a]))
+
+    cases = [
+        ('mint(0x1a)', abi_mint,
+         lambda: calldata.to_hex(calldata.mint(0x1a))),
+        ('freeFromUpTo', abi_free_from_up_to,
+         lambda: calldata.to_hex(calldata.free_from_up_to(ADDRESS, 0x1a))),
+    ]
+    for name, old, new in cases:
+        assert old() == new(), (old(), new())
+        number = 20000
+        old_time = min(timeit.repeat(old, number=number, repeat=3)) / number
+        new_time = min(timeit.repeat(new, number=number, repeat=3)) / number
+        print("{:>14}: abi {:8.2f}us  template {:6.2f}us  ({:.0f}x)".format(
+            name, old_time * 1e6, new_time * 1e6, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
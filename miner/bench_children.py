@@ -0,0 +1,35 @@
+"""Microbenchmark of child address derivation: pyethereum's
+mk_contract_address per nonce against ChildAddresses over a nonce range.
+
+    $ python -m miner.bench_children
+"""
+
+import time
+
+from ethereum import utils
+
+from .children import ChildAddresses, GST2_ADDRESS, unpack
+
+CHILDREN = 50000
+
+
+def main():
+    children = ChildAddresses()
+    for start in (1, 2**16, 2**64):
+        stop = start + CHILDREN
+        begin = time.perf_counter()
+        expected = [utils.mk_contract_address(GST2_ADDRESS, n) for n in range(start, stop)]
+        old_time = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        packed = children.addresses(start, stop)
+        new_time = time.perf_counter() - begin
+
+        assert unpack(packed) == expected
+        print("nonces from {:>20}: mk_contract_address {:8.0f}/s  "
+              "ChildAddresses {:8.0f}/s  ({:.1f}x)".format(
+                  start, CHILDREN / old_time, CHILDREN / new_time, old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
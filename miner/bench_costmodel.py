@@ -0,0 +1,40 @@
+"""Microbenchmark of the cost model: evaluating mint and free costs for many
+(amount, nonce) points one by one against a single array call.
+
+    $ python -m miner.bench_costmodel
+"""
+
+import time
+
+import numpy as np
+
+from .costmodel import CostModel
+
+POINTS = 1000000
+
+
+def main():
+    model = CostModel.load()
+    rng = np.random.RandomState(0)
+    amounts = rng.randint(1, 256, POINTS)
+    nonces = rng.randint(1, 10**9, POINTS)
+
+    def scalar(n):
+        return [model.mint_cost('GST2_ETH', a) + model.free_cost('GST2_ETH', a, first_nonce=f)
+                for a, f in zip(amounts[:n].tolist(), nonces[:n].tolist())]
+
+    def vectorized(n):
+        return model.mint_cost('GST2_ETH', amounts[:n]) \
+            + model.free_cost('GST2_ETH', amounts[:n], first_nonce=nonces[:n])
+
+    n = 10000
+    assert scalar(n) == vectorized(n).tolist()
+    for name, fn, count in [('scalar', scalar, n), ('vectorized', vectorized, POINTS)]:
+        start = time.perf_counter()
+        fn(count)
+        elapsed = time.perf_counter() - start
+        print("{:>10}: {:10.0f} points/s".format(name, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Benchmarks the asyncio minting engine against the original blocking
+send/poll loop, using an in-process stand-in node (see standin_node.py).
+
+    $ python -m miner.bench_engine --batches 5 --latency 0.02
+
+For each approach this reports how many transactions per second get mined
+and how long after the block that mined a batch the miner noticed it.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from .engine import MintEngine
+from .pricing import ConstantPrice
+from .rpc import connect
+from .standin_node import StandinChain, StandinNode
+
+SENDER = '0x' + '11' * 20
+CONTRACT = "0x0000000000b3f879cb30fe243b4dfee438691c04"
+# mint(0x1a)
+MINT_DATA = '0xa0712d68' + '%064x' % 0x1a
+
+
+class BlockingIPC(object):
+    """Minimal synchronous JSON-RPC client, standing in for web3's IPCProvider."""
+
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.id = 0
+
+    def call(self, method, *params):
+        self.id += 1
+        self.sock.sendall(json.dumps({"jsonrpc": "2.0", "id": self.id,
+                                      "method": method, "params": list(params)}).encode())
+        while True:
+            try:
+                response, end = self.decoder.raw_decode(self.buf.lstrip())
+                self.buf = self.buf.lstrip()[end:]
+                break
+            except ValueError:
+                self.buf += self.sock.recv(2**16).decode()
+        if 'error' in response:
+            raise ValueError(response['error']['message'])
+        return response['result']
+
+
+def detection_latency(chain, sender, end_nonce, detected_at):
+    # find the block that mined the last transaction of the batch
+    for tx in list(chain.transactions.values()):
+        if tx['from'] == sender and int(tx['nonce'], 16) == end_nonce - 1 and 'blockNumber' in tx:
+            return detected_at - chain.sealed_at[int(tx['blockNumber'], 16)]
+    return float('nan')
+
+
+def bench_blocking(path, chain, batches, batch_size, poll):
+    """The stop-and-wait send/poll loop of the original miners."""
+    w3 = BlockingIPC(path)
+    latency = []
+    t0 = time.time()
+    for _ in range(batches):
+        batch_start_nonce = int(w3.call('eth_getTransactionCount', SENDER, 'latest'), 16)
+        w3.call('personal_unlockAccount', SENDER, '')
+        for i in range(batch_size):
+            w3.call('eth_sendTransaction', {"from": SENDER, "to": CONTRACT,
+                                            "gas": hex(999999), "gasPrice": hex(int(4e9)),
+                                            "data": MINT_DATA,
+                                            "nonce": hex(batch_start_nonce + i)})
+        while int(w3.call('eth_getTransactionCount', SENDER, 'latest'), 16) < batch_start_nonce + batch_size:
+            time.sleep(poll)
+        latency.append(detection_latency(chain, SENDER, batch_start_nonce + batch_size,
+                                         time.time()))
+    return batches * batch_size / (time.time() - t0), latency
+
+
+def bench_engine(path, chain, batches, batch_size, window_size, signer=None):
+    latency = []
+    # batches completed in the same block are reported as one
+    done = []
+    sender = signer.address if signer else SENDER
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def on_batch(batchtuple):
+        latency.append(detection_latency(chain, sender, batchtuple[0], batchtuple[2]))
+
+    async def go():
+        rpc = await connect(path)
+        engine = MintEngine(rpc, sender, CONTRACT, MINT_DATA, ConstantPrice(int(4e9)),
+                            batch_size=batch_size, window_size=window_size,
+                            signer=signer, on_batch=on_batch)
+        try:
+            await engine.run(batches)
+        finally:
+            rpc.close()
+        done.append(engine.batches_done)
+
+    t0 = time.time()
+    loop.run_until_complete(go())
+    loop.close()
+    return done[0] * batch_size / (time.time() - t0), latency
+
+
+def report(name, throughput, latency):
+    print("{:>10}: {:8.2f} tx/s mined, {:6.3f}s mean / {:6.3f}s max inclusion detection latency".format(
+        name, throughput, sum(latency) / len(latency), max(latency)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batches', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--window', type=int,
+                        help='transactions the engine keeps in flight (default: two batches)')
+    parser.add_argument('--block-time', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='artificial delay per request, in seconds')
+    parser.add_argument('--poll', type=float, default=2.0,
+                        help='sleep between polls of the blocking loop')
+    parser.add_argument('--sign', action='store_true',
+                        help='also run the engine with offline signing (needs pyethereum)')
+    args = parser.parse_args()
+
+    # room for one batch per block, so throughput is bound by how full the
+    # miner keeps the pipeline
+    chain = StandinChain(block_gas_limit=982614 * args.batch_size)
+    node = StandinNode(chain, block_time=args.block_time, latency=args.latency)
+    path = os.path.join(tempfile.mkdtemp(), 'standin.ipc')
+
+    node_loop = asyncio.new_event_loop()
+    node_loop.run_until_complete(node.start(ipc_path=path))
+    threading.Thread(target=node_loop.run_forever, daemon=True).start()
+
+    report('blocking', *bench_blocking(path, chain, args.batches, args.batch_size, args.poll))
+    report('engine', *bench_engine(path, chain, args.batches, args.batch_size,
+                                   args.window or 2 * args.batch_size))
+    if args.sign:
+        from ethereum import utils
+        from .signing import Signer
+
+        signer = Signer(utils.sha3('gastoken bench'))
+        report('signing', *bench_engine(path, chain, args.batches, args.batch_size,
+                                        args.window or 2 * args.batch_size, signer))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Precompiled calldata for GasToken calls.
+
+The selectors of mint, free, freeUpTo, freeFrom and freeFromUpTo are
+computed once from contract/GST.abi. Calldata is then built by patching
+the arguments into a cached template, so no ABI encoding happens per call:
+
+    >>> to_hex(mint(0x1a))
+    '0xa0712d68000000000000000000000000000000000000000000000000000000000000001a'
+"""
+
+import json
+import os
+
+from eth_utils import function_abi_to_4byte_selector
+
+ABI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, 'contract', 'GST.abi')
+
+# name -> number of 32 byte argument words
+FUNCTIONS = {'mint': 1, 'free': 1, 'freeUpTo': 1, 'freeFrom': 2, 'freeFromUpTo': 2}
+
+
+def load_selectors(path=ABI_PATH):
+    with open(path) as fd:
+        abi = json.load(fd)
+    return {fn_abi['name']: function_abi_to_4byte_selector(fn_abi)
+            for fn_abi in abi
+            if fn_abi.get('type') == 'function' and fn_abi['name'] in FUNCTIONS}
+
+
+SELECTORS = load_selectors()
+
+# selector followed by zeroed argument words
+TEMPLATES = {name: bytes(SELECTORS[name] + b'\x00' * 32 * words)
+             for name, words in FUNCTIONS.items()}
+
+
+def _address_bytes(address):
+    if isinstance(address, str):
+        address = bytes.fromhex(address[2:] if address.startswith('0x') else address)
+    if len(address) != 20:
+        raise ValueError("expected a 20 byte address, got {} bytes".format(len(address)))
+    return address
+
+
+def _value_call(template, value):
+    data = bytearray(template)
+    data[4:36] = value.to_bytes(32, 'big')
+    return bytes(data)
+
+
+def _from_value_call(template, address, value):
+    data = bytearray(template)
+    data[16:36] = _address_bytes(address)
+    data[36:68] = value.to_bytes(32, 'big')
+    return bytes(data)
+
+
+def mint(value):
+    return _value_call(TEMPLATES['mint'], value)
+
+
+def free(value):
+    return _value_call(TEMPLATES['free'], value)
+
+
+def free_up_to(value):
+    return _value_call(TEMPLATES['freeUpTo'], value)
+
+
+def free_from(address, value):
+    return _from_value_call(TEMPLATES['freeFrom'], address, value)
+
+
+def free_from_up_to(address, value):
+    return _from_value_call(TEMPLATES['freeFromUpTo'], address, value)
+
+
+def to_hex(data):
+    return '0x' + data.hex()
@@ -0,0 +1,141 @@
+"""Batch derivation of GST2's child contract addresses.
+
+The child created with nonce n lives at keccak(rlp([creator, n]))[12:].
+For a fixed creator, only the RLP encoding of the nonce changes, and its
+length only changes at powers of 256. ChildAddresses therefore keeps one
+keccak input per nonce length, with the list header and the creator filled
+in once, and only overwrites the nonce bytes for every child:
+
+    children = ChildAddresses()
+    packed = children.addresses(tail + 1, head + 1)   # 20 bytes per child
+    children.address(tail + 1) == packed[:20]
+"""
+
+import ctypes
+
+try:
+    from Crypto.Hash import keccak
+
+    def keccak256(data):
+        return keccak.new(digest_bits=256, data=data).digest()
+except ImportError:
+    import sha3 as _sha3
+    keccak = None
+
+    def keccak256(data):
+        return _sha3.keccak_256(data).digest()
+
+# the address GST2 is deployed at on ETH and ETC
+GST2_ADDRESS = bytes.fromhex('0000000000b3f879cb30fe243b4dfee438691c04')
+
+
+def _segments(start, stop):
+    """Splits [start, stop) into runs of nonces with the same RLP encoding
+    layout. Yields (first, end, length, marker): the nonces of a run are
+    encoded as `marker` (if not None) followed by `length` big endian bytes.
+    """
+    nonce = start
+    while nonce < stop:
+        if nonce == 0:
+            # 0 is the empty string
+            end, length, marker = 1, 0, 0x80
+        elif nonce < 128:
+            # a single byte below 0x80 is its own encoding
+            end, length, marker = 128, 1, None
+        else:
+            length = (nonce.bit_length() + 7) // 8
+            end, marker = 256**length, 0x80 + length
+        end = min(end, stop)
+        yield nonce, end, length, marker
+        nonce = end
+
+
+def _hasher(buf):
+    """Returns a function that returns the keccak256 of the current contents
+    of `buf`, a bytearray whose length does not change.
+
+    Creating a hash object per child costs more than hashing its 23 to 32
+    bytes, so with pycryptodome on its ctypes backend a single keccak state
+    is reset and fed straight from `buf` instead.
+    """
+    try:
+        from Crypto.Util import _raw_api
+        lib = keccak._raw_keccak_lib
+        if _raw_api.backend != 'ctypes':
+            raise ImportError("not the ctypes backend")
+    except (ImportError, AttributeError):
+        return lambda: keccak256(buf)
+
+    state = _raw_api.VoidPointer()
+    if lib.keccak_init(state.address_of(), _raw_api.c_size_t(64), _raw_api.c_ubyte(24)):
+        raise ValueError("could not instantiate keccak")
+    state = _raw_api.SmartPointer(state.get(), lib.keccak_destroy)
+    data = (ctypes.c_ubyte * len(buf)).from_buffer(buf)
+    size = _raw_api.c_size_t(len(buf))
+    out = _raw_api.create_string_buffer(32)
+    out_size, padding = _raw_api.c_size_t(32), _raw_api.c_ubyte(0x01)
+    reset, absorb, digest = lib.keccak_reset, lib.keccak_absorb, lib.keccak_digest
+
+    def hash_buffer():
+        # keep the state alive as long as the hasher
+        s = state.get()
+        reset(s)
+        absorb(s, data, size)
+        digest(s, out, out_size, padding)
+        return out.raw
+    return hash_buffer
+
+
+class ChildAddresses(object):
+
+    def __init__(self, creator=GST2_ADDRESS):
+        if len(creator) != 20:
+            raise ValueError("creator must be a 20 byte address")
+        self.creator = bytes(creator)
+
+    def _buffer(self, length, marker):
+        """The keccak input for nonces of `length` bytes, and the offset of
+        the nonce bytes in it.
+        """
+        nonce_rlp = (1 if marker is not None else 0) + length
+        payload = 1 + 20 + nonce_rlp
+        # payloads are at most 1 + 20 + 33 bytes, so the list header is one byte
+        buf = bytearray([0xc0 + payload, 0x94]) + self.creator
+        if marker is not None:
+            buf.append(marker)
+        offset = len(buf)
+        buf.extend(bytes(length))
+        return buf, offset
+
+    def address(self, nonce):
+        return self.addresses(nonce, nonce + 1)
+
+    def addresses(self, start, stop):
+        """Addresses of the children with nonces [start, stop), packed into
+        20 bytes each.
+        """
+        out = bytearray(20 * max(stop - start, 0))
+        pos = 0
+        for first, end, length, marker in _segments(start, stop):
+            buf, offset = self._buffer(length, marker)
+            hash_buffer = _hasher(buf)
+            for nonce in range(first, end):
+                if length:
+                    buf[offset:] = nonce.to_bytes(length, 'big')
+                out[pos:pos + 20] = hash_buffer()[12:]
+                pos += 20
+        return bytes(out)
+
+    def iter_addresses(self, start, stop, chunk=65536):
+        """Yields (nonce, address) for nonces [start, stop), deriving
+        `chunk` addresses at a time.
+        """
+        for first in range(start, stop, chunk):
+            packed = self.addresses(first, min(first + chunk, stop))
+            for i in range(len(packed) // 20):
+                yield first + i, packed[20 * i:20 * i + 20]
+
+
+def unpack(packed):
+    """Splits packed addresses into a list of 20 byte addresses."""
+    return [packed[i:i + 20] for i in range(0, len(packed), 20)]
@@ -0,0 +1,226 @@
+"""Gas cost model of the GasToken contracts.
+
+The constants (base and per-token gas of mint and the free* functions, and
+the cost of GST2's RLP encoding of child nonces) are fitted on the tester
+chain by test/calibrate.py and stored in cost_model.json, which both the
+test suites and the miners load:
+
+    model = CostModel.load()
+    model.variants['GST2_ETH'].mint_token
+
+Re-calibrate after changing a contract or the fork rules with
+
+    $ python -m test.calibrate
+
+The cost functions take scalars or NumPy arrays (of token counts, nonces
+or calldata values) and evaluate whole arrays at once, without Python
+loops as long as the values fit into 63 bits:
+
+    model.mint_cost('GST2_ETH', np.arange(1, 1000))
+    model.free_cost('GST2_ETH', amounts, first_nonce=heads)
+"""
+
+import collections
+import json
+import os
+
+import numpy as np
+
+from .files import atomic_write
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cost_model.json')
+
+# bump when the layout of cost_model.json changes
+FORMAT_VERSION = 1
+
+# gas per zero and non-zero byte of transaction data (ethereum.opcodes'
+# GTXDATAZERO and GTXDATANONZERO)
+GTXDATAZERO = 4
+GTXDATANONZERO = 68
+
+# gas of a token contract's functions, excluding the input data of the
+# transaction. mint_zero is the cost of mint(0) where it does not follow
+# mint_base (GST1), else None. For GST2, free_token is the cost per token
+# of children with nonces below 128, see rlp_cost for the others.
+VariantCosts = collections.namedtuple(
+    'VariantCosts', 'mint_zero mint_base mint_token free_base free_up_to_base '
+                    'free_from_base free_from_up_to_base free_token')
+
+# gas of GST2's mk_contract_address(address, nonce): zero_nonce for nonce 0,
+# small_nonce below 128, else base + per_byte * (bytes of the nonce), less
+# nine_byte_discount for nonces of 9 bytes
+RlpCosts = collections.namedtuple(
+    'RlpCosts', 'zero_nonce small_nonce base per_byte nine_byte_discount')
+
+
+def _integers(values):
+    """`values` as an int64 array, or as an object array of Python ints if
+    some do not fit into 63 bits (these take the slow path).
+    """
+    a = np.asarray(values)
+    if a.dtype.kind in 'iu' and (a.size == 0 or int(a.max()) < 2**63):
+        return a.astype(np.int64)
+    return _objects(a)
+
+
+def _objects(a):
+    return np.array(a.tolist(), dtype=object).reshape(a.shape)
+
+
+def _result(values, cost):
+    # scalars in, Python ints out
+    return int(cost) if np.ndim(values) == 0 else cost
+
+
+def _byte_mask(a):
+    """For an int64 array, which of its 8 little endian bytes are non-zero."""
+    return np.ascontiguousarray(a, dtype='<u8').reshape(-1).view(np.uint8).reshape(a.shape + (8,)) != 0
+
+
+def nonzero_bytes(values):
+    a = _integers(values)
+    if a.dtype == object:
+        count = np.vectorize(lambda v: sum(1 for b in v.to_bytes((v.bit_length() + 7) // 8, 'big') if b),
+                             otypes=[np.int64])
+        return _result(values, count(a) if a.size else np.zeros(a.shape, np.int64))
+    return _result(values, _byte_mask(a).sum(axis=-1))
+
+
+def byte_length(values):
+    """Bytes needed to encode each value (0 for 0), as in RLP."""
+    a = _integers(values)
+    if a.dtype == object:
+        length = np.vectorize(lambda v: (v.bit_length() + 7) // 8, otypes=[np.int64])
+        return _result(values, length(a) if a.size else np.zeros(a.shape, np.int64))
+    mask = _byte_mask(a)
+    # index of the highest non-zero byte, plus one
+    length = 8 - np.argmax(mask[..., ::-1], axis=-1)
+    return _result(values, np.where(mask.any(axis=-1), length, 0))
+
+
+def input_data_cost(values, num_bytes=32):
+    """Gas of `values` ABI encoded into `num_bytes` of transaction data."""
+    nonzero = nonzero_bytes(values)
+    return _result(values, GTXDATAZERO * (num_bytes - nonzero) + GTXDATANONZERO * nonzero)
+
+
+class CostModel(object):
+
+    def __init__(self, variants, rlp, calibration=None):
+        self.variants = variants
+        self.rlp = rlp
+        # how the constants were obtained (solc version, source hashes, ...)
+        self.calibration = calibration or {}
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with open(path) as fd:
+            data = json.load(fd)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError("{}: unsupported cost model version {!r}".format(
+                path, data.get('version')))
+        variants = dict((name, VariantCosts(**costs))
+                        for name, costs in data['variants'].items())
+        return cls(variants, RlpCosts(**data['rlp']), data.get('calibration'))
+
+    def save(self, path=MODEL_PATH):
+        data = {
+            'version': FORMAT_VERSION,
+            'variants': dict((name, costs._asdict()) for name, costs in self.variants.items()),
+            'rlp': self.rlp._asdict(),
+            'calibration': self.calibration,
+        }
+        with atomic_write(path) as fd:
+            json.dump(data, fd, indent=1, sort_keys=True)
+            fd.write('\n')
+
+    def rlp_cost(self, nonces):
+        """Gas of GST2's mk_contract_address for `nonces`."""
+        rlp = self.rlp
+        n = _integers(nonces)
+        length = np.asarray(byte_length(n))
+        cost = rlp.base + length * rlp.per_byte - rlp.nine_byte_discount * (length >= 9)
+        cost = np.where(n == 0, rlp.zero_nonce, np.where(n <= 127, rlp.small_nonce, cost))
+        return _result(nonces, cost.astype(np.int64))
+
+    def _rlp_segments(self):
+        # (first nonce, end nonce, rlp_cost - small_nonce) of the nonce
+        # ranges over which rlp_cost is constant
+        rlp = self.rlp
+        segments = [(0, 1, rlp.zero_nonce - rlp.small_nonce)]
+        for length in range(1, 10):
+            start = 128 if length == 1 else 256**(length - 1)
+            extra = rlp.base + length * rlp.per_byte - rlp.small_nonce
+            if length >= 9:
+                extra -= rlp.nine_byte_discount
+            segments.append((start, 256**length, extra))
+        return segments
+
+    def rlp_range_cost(self, first_nonces, counts):
+        """Gas the RLP encoding of the nonces first_nonce, ...,
+        first_nonce + count - 1 costs on top of `count` small nonces.
+        """
+        segments = self._rlp_segments()
+
+        def scalar(first, count):
+            return sum(extra * max(min(first + count, stop) - max(first, start), 0)
+                       for start, stop, extra in segments)
+
+        first = _integers(first_nonces)
+        count = _integers(counts)
+        if (first.dtype != object and count.dtype != object and first.size and count.size and
+                int(first.max()) > 2**63 - 1 - int(count.max())):
+            # first + count would overflow int64
+            first, count = _objects(first), _objects(count)
+        if first.dtype == object or count.dtype == object:
+            total = np.frompyfunc(scalar, 2, 1)(first, count)
+        else:
+            end = first + count
+            total = np.zeros(end.shape, dtype=np.int64)
+            for start, stop, extra in segments:
+                if start >= 2**63:
+                    break
+                overlap = np.minimum(end, min(stop, 2**63 - 1)) - np.maximum(first, start)
+                total += extra * np.maximum(overlap, 0)
+        if np.ndim(first_nonces) == 0 and np.ndim(counts) == 0:
+            return int(total)
+        return total
+
+    def mint_cost(self, variant, amounts):
+        """Gas used by mint(amount) transactions, including the input data."""
+        costs = self.variants[variant]
+        x = _integers(amounts)
+        data = np.asarray(input_data_cost(x))
+        cost = costs.mint_base + costs.mint_token * x + data
+        if costs.mint_zero is not None:
+            cost = np.where(x == 0, costs.mint_zero + data, cost)
+        return _result(amounts, cost)
+
+    def free_cost(self, variant, amounts, function='free', first_nonce=None):
+        """Gas of a free* transaction of `amounts` tokens, including the
+        input data, before the refund. The base cost includes a CALL from
+        a contract (TestHelper), as the free* functions are meant to be
+        called.
+
+        For GST2, the cost per token depends on the nonces of the children
+        that are destroyed. Without `first_nonce` it is that of children
+        below nonce 128 (a lower bound), with the nonce of the first child
+        to free (the token's s_tail + 1) it is exact. GST1 has no children,
+        so `first_nonce` is an error there.
+        """
+        if first_nonce is not None and variant.startswith('GST1'):
+            raise ValueError("{} has no child nonces, first_nonce must be None".format(variant))
+        costs = self.variants[variant]
+        base = {
+            'free': costs.free_base,
+            'freeUpTo': costs.free_up_to_base,
+            'freeFrom': costs.free_from_base,
+            'freeFromUpTo': costs.free_from_up_to_base,
+        }[function]
+        x = _integers(amounts)
+        cost = base + costs.free_token * x + np.asarray(input_data_cost(x))
+        if first_nonce is not None:
+            cost = cost + self.rlp_range_cost(first_nonce, x)
+        if np.ndim(amounts) == 0 and np.ndim(first_nonce) == 0:
+            return int(cost)
+        return cost
@@ -0,0 +1,424 @@
+"""Asyncio minting engine.
+
+Mint transactions are sent concurrently over a single RPC connection (see
+rpc.py), and a sliding window (see window.py) keeps a number of them in
+flight at all times: as soon as a nonce confirms, the window is topped up.
+Nonces are assigned and confirmed by a local NonceManager (see nonces.py),
+which only asks the node for the account's transaction count on startup
+or when a send error shows that our view is out of date.
+
+Confirmations are driven by new block heads (see inclusion.py): every new
+block triggers one batch of receipt lookups for the outstanding mints, so
+each transaction is confirmed with the arrival time of the block that
+included it, instead of whenever the next poll happens to notice.
+
+Given a Replacer (see replacement.py), mints that are still not mined a few
+blocks after they were sent are re-sent at the same nonce with a higher gas
+price, so an underpriced nonce does not hold up the window until the batch
+times out. Without one, the whole window is re-sent at the raised price
+when the batch times out, like the original miner did.
+
+Given a WriteAheadLog (see wal.py), every send is logged before it counts
+as done, and a transaction the node signs is logged as an intent before it
+is sent. On restart the engine replays the log, checks the logged
+transactions against the node with one batch request, and takes the ones
+still pending back into the window instead of sending them again.
+
+Given a Signer (see signing.py) the engine signs transactions itself and
+submits each top-up as one JSON-RPC batch of eth_sendRawTransaction calls;
+otherwise the node signs them with eth_sendTransaction.
+
+For the price controller and the batchtimes history, every `batch_size`
+confirmed transactions are accounted for as one batch. A batch starts
+where the previous one ended, so its burn rate is the rate at which wei is
+actually being spent. The batches one block completes are recorded as a
+single batch, since they all end at the same time.
+"""
+
+import asyncio
+import time
+
+from .inclusion import BlockWatcher, InclusionTracker
+from .nonces import NonceManager
+from .window import Window
+
+
+class MintEngine(object):
+
+    # geth unlocks an account for 300 seconds by default
+    UNLOCK_EVERY = 60
+
+    def __init__(self, rpc, sender, contract_address, data, pricing,
+                 batch_size=4, batch_timeout=1000, tx_gas_consumed=982614,
+                 window_size=None, max_window=64, poll_interval=0.25,
+                 password='', signer=None, on_batch=None, replacer=None,
+                 wal=None):
+        self.rpc = rpc
+        self.sender = sender
+        self.contract_address = contract_address
+        self.data = data
+        self.pricing = pricing
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.tx_gas_consumed = tx_gas_consumed
+        self.poll_interval = poll_interval
+        # None if the node does not need the account to be unlocked
+        self.password = password
+        self.signer = signer
+        self.on_batch = on_batch
+        self.replacer = replacer
+        self.wal = wal
+        # with window_size=None the window sizes itself from the observed
+        # inclusion latency, starting out at one batch
+        self.window = Window(window_size, max_size=max_window,
+                             initial_size=batch_size)
+
+        self.nonces = NonceManager(rpc, sender)
+        self.blocks = BlockWatcher(rpc, poll_interval)
+        self.tracker = InclusionTracker(rpc)
+        self.batches_done = 0
+        self._prices = {}
+        self._group = []
+        self._group_start = None
+        self._last_progress = None
+        self._last_unlock = None
+        self._block_number = None
+
+    async def start(self):
+        while True:
+            try:
+                await self.nonces.start()
+                await self.blocks.start()
+                self._block_number = int(await self.rpc.call('eth_blockNumber'), 16)
+                if self.wal is not None:
+                    await self._recover()
+                break
+            except Exception as e:
+                print("web3 comms failed")
+                print(e)
+                await asyncio.sleep(5)
+        self._group_start = self._last_progress = time.time()
+
+    async def _recover(self):
+        """Takes back the transactions logged by a previous run that are
+        still pending, and re-sends the ones the node no longer knows about.
+        """
+        entries = [entry for nonce, entry in sorted(self.wal.entries.items())
+                   if nonce >= self.nonces.confirmed]
+        if entries:
+            sends = [(entry.nonce, tx_hash) for entry in entries
+                     for tx_hash in entry.tx_hashes]
+            results = await self.rpc.batch(
+                [('eth_getTransactionReceipt', [tx_hash]) for _, tx_hash in sends] +
+                [('eth_getTransactionByHash', [tx_hash]) for _, tx_hash in sends])
+            mined = set()
+            known = set()
+            for (nonce, _), receipt, tx in zip(sends, results[:len(sends)],
+                                               results[len(sends):]):
+                if isinstance(receipt, dict) and receipt.get('blockNumber') is not None:
+                    mined.add(nonce)
+                if isinstance(tx, dict):
+                    known.add(nonce)
+            if mined:
+                self.nonces.confirm_below(max(mined) + 1)
+                self.nonces.take_confirmed()
+
+            last = entries[-1].nonce
+            self.nonces.next_nonce = max(self.nonces.next_nonce, last + 1)
+            # time in flight is counted from now, so that the downtime does
+            # not end up in the window's latency estimate
+            now = time.time()
+            dropped = []
+            for nonce in range(self.nonces.confirmed, last + 1):
+                entry = self.wal.entries.get(nonce)
+                if entry is not None and nonce in known:
+                    self.nonces.mark_sent(nonce, entry.tx_hashes[-1])
+                    self._track(nonce, entry.tx_hashes, entry.gas_price, now)
+                else:
+                    # dropped by the node, or logged without a hash
+                    dropped.append(nonce)
+            print("recovered", len(self.window), "in flight,", len(dropped), "to re-send")
+            if dropped:
+                await self._send_nonces(dropped)
+        self.wal.confirm_below(self.nonces.confirmed)
+
+    async def run(self, batches=None):
+        """Mints until `batches` batches have been mined (forever if None)."""
+        if self.nonces.next_nonce is None:
+            await self.start()
+        target = None if batches is None else self.batches_done + batches
+        while target is None or self.batches_done < target:
+            await self.fill()
+            await self.wait_for_confirmations()
+
+    async def _call(self, method, *params):
+        # retry until the node answers, like the original miner did
+        while True:
+            try:
+                return await self.rpc.call(method, *params)
+            except Exception as e:
+                print("web3 comms failed")
+                print(e)
+                await asyncio.sleep(5)
+
+    async def _unlock(self):
+        if self.password is None or self.signer is not None:
+            return
+        if self._last_unlock is None or time.time() - self._last_unlock > self.UNLOCK_EVERY:
+            await self._call('personal_unlockAccount', self.sender, self.password)
+            self._last_unlock = time.time()
+
+    def _transaction(self, nonce, gas_price, gas):
+        return {
+            "from": self.sender,
+            "to": self.contract_address,
+            "gas": hex(gas),
+            "gasPrice": hex(gas_price),
+            "data": self.data,
+            "nonce": hex(nonce),
+        }
+
+    async def _send(self, transaction):
+        txn_hash = None
+        while True:
+            try:
+                txn_hash = await self.rpc.call('eth_sendTransaction', transaction)
+                break
+            except Exception as e:
+                print("web3 comms failed")
+                print(e)
+                # e.g. the script was restarted and the tx was already sent
+                if await self.nonces.on_error(e):
+                    break
+                await asyncio.sleep(5)
+        print("tx sent", txn_hash, int(transaction["nonce"], 16))
+        return txn_hash
+
+    async def _send_raw(self, nonces, gas_price, gas):
+        loop = asyncio.get_event_loop()
+        signed = await loop.run_in_executor(
+            None, self.signer.sign_many, nonces, gas_price, gas,
+            self.contract_address, self.data)
+        self._log_sent([(nonce, txn_hash) for nonce, (_, txn_hash) in zip(nonces, signed)],
+                       gas_price)
+
+        hashes = {}
+        todo = list(zip(nonces, signed))
+        while todo:
+            try:
+                results = await self.rpc.batch([('eth_sendRawTransaction', [raw])
+                                                for _, (raw, _) in todo])
+            except Exception as e:
+                print("web3 comms failed")
+                print(e)
+                await asyncio.sleep(5)
+                continue
+
+            retry = []
+            resync_error = None
+            for (nonce, (raw, txn_hash)), result in zip(todo, results):
+                if not isinstance(result, Exception):
+                    hashes[nonce] = result
+                    print("tx sent", result, nonce)
+                elif NonceManager.is_resync_error(result):
+                    # e.g. the script was restarted and the tx was already sent
+                    hashes[nonce] = txn_hash if "known" in str(result) else None
+                    resync_error = result
+                else:
+                    print("web3 comms failed")
+                    print(result)
+                    retry.append((nonce, (raw, txn_hash)))
+            if resync_error is not None:
+                await self.nonces.on_error(resync_error)
+            todo = retry
+            if todo:
+                await asyncio.sleep(5)
+        return [hashes[nonce] for nonce in nonces]
+
+    def _log_sending(self, nonces, gas_price):
+        if self.wal is not None:
+            self.wal.sending(nonces, gas_price, time.time())
+
+    def _log_sent(self, sends, gas_price):
+        if self.wal is not None:
+            self.wal.sent(sends, gas_price, time.time())
+
+    def _track(self, nonce, tx_hashes, gas_price, sent_at):
+        self.window.sent(nonce, sent_at)
+        self._prices[nonce] = gas_price
+        for txn_hash in tx_hashes:
+            self.tracker.track(txn_hash, nonce)
+        if self.replacer is not None:
+            self.replacer.sent(nonce, gas_price, self._block_number)
+
+    async def fill(self):
+        """Tops the window up with new mint transactions."""
+        free_slots = self.window.free_slots()
+        if free_slots == 0:
+            return
+        await self._send_nonces(self.nonces.assign(free_slots))
+
+    async def _send_nonces(self, nonces):
+        await self._unlock()
+        gas_price = self.pricing.gas_price
+        gas = self.pricing.gas
+        if self.signer is None:
+            self._log_sending(nonces, gas_price)
+            hashes = await asyncio.gather(*[self._send(self._transaction(nonce, gas_price, gas))
+                                            for nonce in nonces])
+            self._log_sent(list(zip(nonces, hashes)), gas_price)
+        else:
+            hashes = await self._send_raw(nonces, gas_price, gas)
+
+        sent_at = time.time()
+        if len(self.window) == 0:
+            self._last_progress = sent_at
+        for nonce, txn_hash in zip(nonces, hashes):
+            self.nonces.mark_sent(nonce, txn_hash)
+            if not self.nonces.is_confirmed(nonce):
+                self._track(nonce, [] if txn_hash is None else [txn_hash], gas_price,
+                            sent_at)
+
+    async def _replace_stuck(self):
+        """Re-sends the stuck nonces at a higher gas price."""
+        nonces, gas_price = self.replacer.stuck(self._block_number, self.pricing.gas_price)
+        if nonces:
+            await self._replace(nonces, gas_price)
+
+    async def _resend_window(self):
+        """Re-sends every nonce in flight at the current gas price, after
+        the window timed out and the price was raised.
+        """
+        nonces = sorted(self.window.in_flight)
+        if nonces:
+            await self._replace(nonces, self.pricing.gas_price)
+
+    async def _replace(self, nonces, gas_price):
+        gas = self.pricing.gas
+        if self.signer is None:
+            await self._unlock()
+            self._log_sending(nonces, gas_price)
+            calls = [('eth_sendTransaction', [self._transaction(nonce, gas_price, gas)])
+                     for nonce in nonces]
+        else:
+            loop = asyncio.get_event_loop()
+            signed = await loop.run_in_executor(
+                None, self.signer.sign_many, nonces, gas_price, gas,
+                self.contract_address, self.data)
+            calls = [('eth_sendRawTransaction', [raw]) for raw, _ in signed]
+            self._log_sent([(nonce, txn_hash) for nonce, (_, txn_hash) in zip(nonces, signed)],
+                           gas_price)
+
+        results = await self.rpc.batch(calls)
+        if self.signer is None:
+            self._log_sent([(nonce, result) for nonce, result in zip(nonces, results)
+                            if not isinstance(result, Exception)], gas_price)
+        for nonce, result in zip(nonces, results):
+            if not isinstance(result, Exception):
+                print("tx replaced", result, nonce, gas_price)
+                self.nonces.mark_sent(nonce, result)
+                # keeps the original send time for the latency estimate
+                self._track(nonce, [result], gas_price, self.window.in_flight[nonce])
+            elif "underpriced" in str(result) and self.replacer is not None:
+                self.replacer.underpriced(nonce, gas_price)
+            else:
+                # most likely mined in the meantime ("nonce too low")
+                print("replacing", nonce, "failed:", result)
+
+    async def wait_for_confirmations(self):
+        """Waits until a new nonce confirms or the window times out."""
+        while True:
+            timeout = self._last_progress + self.batch_timeout - time.time()
+            try:
+                heads = await asyncio.wait_for(self.blocks.next_heads(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                self._last_progress = time.time()
+                self.pricing.on_timeout()
+                if self.replacer is None:
+                    # without a replacer nothing else would ever re-send
+                    # the stuck nonces at the raised price
+                    try:
+                        await self._resend_window()
+                    except Exception as e:
+                        print(e)
+                return
+            except Exception as e:
+                print(e)
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            seen_at = time.time()
+            self._block_number = int(heads[-1]['number'], 16)
+            try:
+                included = await self.tracker.on_block(seen_at)
+                if included:
+                    # a mined nonce means all lower nonces are mined as well
+                    self.nonces.confirm_below(included[-1].nonce + 1)
+                if None in self.nonces.sent.values():
+                    # some transactions were only known to the node, so we
+                    # have no hash to look for; fall back to the tx count
+                    confirmed = await self.nonces.on_block(self._block_number)
+                else:
+                    confirmed = self.nonces.take_confirmed()
+            except Exception as e:
+                print(e)
+                continue
+            for nonce in confirmed:
+                self.tracker.forget_nonce(nonce)
+            progress = self._confirmed(confirmed, seen_at)
+            if self.replacer is not None:
+                try:
+                    await self._replace_stuck()
+                except Exception as e:
+                    print(e)
+            if progress:
+                return
+
+    def _confirmed(self, nonces, now):
+        if self.wal is not None:
+            self.wal.confirm_below(self.nonces.confirmed)
+        if self.replacer is not None:
+            for nonce in nonces:
+                self.replacer.confirmed(nonce)
+        confirmed = [nonce for nonce in nonces
+                     if self.window.confirm(nonce, now) is not None]
+        if not confirmed:
+            return False
+        self._last_progress = now
+        self._group.extend((nonce, self._prices.pop(nonce)) for nonce in confirmed)
+
+        # the batches completed by this block all end now, so they are
+        # recorded as one, which keeps every record's time span non-zero
+        batches = len(self._group) // self.batch_size
+        if batches:
+            done = self._group[:batches * self.batch_size]
+            self._group = self._group[batches * self.batch_size:]
+            # batchtimes is list of (end_nonce,time_start,time_end,wei_consumed)
+            batchtuple = (max(nonce for nonce, _ in done) + 1, self._group_start, now,
+                          1.0 * sum(price for _, price in done) * self.tx_gas_consumed)
+            self._group_start = now
+            self.batches_done += batches
+            print("batch mined", batchtuple)
+            if self.on_batch is not None:
+                self.on_batch(batchtuple)
+            self.pricing.on_batch(batchtuple)
+
+        size = self.window.resize(self.pricing.target_rate(self.tx_gas_consumed))
+        print("confirmed", len(confirmed), "in flight", len(self.window), "window", size)
+        return True
+
+
+def run(uri, make_engine, batches=None):
+    """Connects to the node at `uri` and runs the engine returned by
+    `make_engine(rpc)` until `batches` batches have been mined (forever if
+    None).
+    """
+    from .rpc import connect
+
+    loop = asyncio.get_event_loop()
+    rpc = loop.run_until_complete(connect(uri))
+    try:
+        engine = make_engine(rpc)
+        loop.run_until_complete(engine.run(batches))
+    finally:
+        rpc.close()
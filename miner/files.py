@@ -0,0 +1,25 @@
+"""Writing files that other processes may be reading."""
+
+import contextlib
+import os
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode=0o666):
+    """Opens a temporary file next to `path` for writing text and, if the
+    block succeeds, moves it over `path`, so that readers (and a run that
+    crashed half way) never see a partial file. `mode` are the permissions
+    of a new file, before the umask.
+
+        with atomic_write(path) as fd:
+            json.dump(data, fd)
+    """
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yield f
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    os.replace(tmp, path)
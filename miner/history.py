@@ -0,0 +1,115 @@
+"""Binary store for the batchtimes history.
+
+Each mined batch is a fixed-width record of (end_nonce, time_start,
+time_end, wei_consumed), appended to a file that starts with a small header.
+Appending writes one 32 byte record, and reading maps the file as a NumPy
+structured array, so neither depends on the length of the history.
+
+Convert an existing batchtimes CSV once with
+
+    $ python -m miner.history batchtimes batchtimes.bin
+"""
+
+import argparse
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'GSTBATCH'
+VERSION = 1
+# magic, version, record size
+HEADER = struct.Struct('<8sII')
+
+DTYPE = np.dtype([
+    ('end_nonce', '<u8'),
+    ('time_start', '<f8'),
+    ('time_end', '<f8'),
+    ('wei_consumed', '<f8'),
+])
+
+
+class BatchHistory(object):
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as fd:
+                fd.write(HEADER.pack(MAGIC, VERSION, DTYPE.itemsize))
+        with open(path, 'rb') as fd:
+            magic, version, itemsize = HEADER.unpack(fd.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or itemsize != DTYPE.itemsize:
+            raise ValueError("{} is not a version {} batch history".format(path, VERSION))
+
+        self._fd = open(path, 'r+b')
+        size = self._fd.seek(0, os.SEEK_END)
+        self._count = (size - HEADER.size) // DTYPE.itemsize
+        # drop a record torn by a crash in the middle of an append
+        self._fd.truncate(HEADER.size + self._count * DTYPE.itemsize)
+        self._fd.seek(0, os.SEEK_END)
+        self._records = None
+
+    def __len__(self):
+        return self._count
+
+    def append(self, batchtuple):
+        """Appends (end_nonce, time_start, time_end, wei_consumed)."""
+        self._fd.write(np.array([tuple(batchtuple)], dtype=DTYPE).tobytes())
+        self._fd.flush()
+        self._count += 1
+
+    def extend(self, batchtuples):
+        records = np.array([tuple(b) for b in batchtuples], dtype=DTYPE)
+        self._fd.write(records.tobytes())
+        self._fd.flush()
+        self._count += len(records)
+
+    @property
+    def records(self):
+        """All records as a read-only memory-mapped structured array."""
+        if self._records is None or len(self._records) != self._count:
+            if self._count == 0:
+                return np.zeros(0, dtype=DTYPE)
+            self._records = np.memmap(self.path, dtype=DTYPE, mode='r',
+                                      offset=HEADER.size, shape=(self._count,))
+        return self._records
+
+    def last(self, n):
+        return self.records[max(self._count - n, 0):]
+
+    def close(self):
+        self._records = None
+        self._fd.close()
+
+
+def read_csv(csv_path):
+    # batchtimes is list of (end_nonce,time_start,time_end,wei_consumed)
+    with open(csv_path) as fd:
+        return [[int(float(y)) for y in line.split(",")]
+                for line in fd.read().splitlines() if line.strip()]
+
+
+def convert_csv(csv_path, path):
+    """Appends the batches in the batchtimes CSV at `csv_path` to the binary
+    history at `path`. Returns the number of batches converted.
+    """
+    history = BatchHistory(path)
+    try:
+        batchtimes = read_csv(csv_path)
+        history.extend(batchtimes)
+    finally:
+        history.close()
+    return len(batchtimes)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Converts a batchtimes CSV to a binary batch history.')
+    parser.add_argument('csv', help='batchtimes CSV file')
+    parser.add_argument('history', help='binary history to create or append to')
+    args = parser.parse_args()
+    print("converted", convert_csv(args.csv, args.history), "batches")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Event-driven inclusion tracking.
+
+BlockWatcher delivers new block headers as they arrive. Over IPC it uses an
+eth_subscribe("newHeads") subscription; otherwise it falls back to polling
+a block filter, and to polling the block number if the node has no filters.
+
+InclusionTracker matches every new block against our outstanding mint
+transactions with one JSON-RPC batch of receipt lookups, which gives the
+exact block and arrival time of each included transaction.
+"""
+
+import asyncio
+import collections
+
+from .rpc import RPCError
+
+Inclusion = collections.namedtuple(
+    'Inclusion', 'nonce tx_hash block_number gas_used seen_at')
+
+
+class BlockWatcher(object):
+
+    def __init__(self, rpc, poll_interval=0.25):
+        self.rpc = rpc
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._queue = None
+        self._filter = None
+        self._last_number = None
+
+    async def start(self):
+        if hasattr(self.rpc, 'subscribe'):
+            try:
+                _, self._queue = await self.rpc.subscribe('newHeads')
+                self.mode = 'subscription'
+                return
+            except RPCError:
+                pass
+        try:
+            self._filter = await self.rpc.call('eth_newBlockFilter')
+            self.mode = 'filter'
+        except RPCError:
+            self._last_number = await self.rpc.call('eth_blockNumber')
+            self.mode = 'poll'
+
+    async def next_heads(self):
+        """Waits for new blocks and returns their headers, oldest first."""
+        if self.mode == 'subscription':
+            heads = [await self._queue.get()]
+            while not self._queue.empty():
+                heads.append(self._queue.get_nowait())
+            return heads
+
+        while True:
+            if self.mode == 'filter':
+                try:
+                    hashes = await self.rpc.call('eth_getFilterChanges', self._filter)
+                except RPCError as e:
+                    if 'filter not found' not in str(e):
+                        raise
+                    # the node drops filters that are not polled for a while
+                    self._filter = await self.rpc.call('eth_newBlockFilter')
+                    continue
+                calls = [('eth_getBlockByHash', [h, False]) for h in hashes]
+            else:
+                number = await self.rpc.call('eth_blockNumber')
+                calls = []
+                if number != self._last_number:
+                    first = int(number, 16) if self._last_number is None \
+                        else int(self._last_number, 16) + 1
+                    calls = [('eth_getBlockByNumber', [hex(n), False])
+                             for n in range(first, int(number, 16) + 1)]
+                    self._last_number = number
+
+            if calls:
+                heads = [head for head in await self.rpc.batch(calls)
+                         if head is not None and not isinstance(head, Exception)]
+                if heads:
+                    return heads
+            await asyncio.sleep(self.poll_interval)
+
+
+class InclusionTracker(object):
+
+    def __init__(self, rpc):
+        self.rpc = rpc
+        # tx hash -> nonce
+        self.outstanding = {}
+
+    def __len__(self):
+        return len(self.outstanding)
+
+    def track(self, tx_hash, nonce):
+        self.outstanding[tx_hash] = nonce
+
+    def forget_nonce(self, nonce):
+        for tx_hash in [h for h, n in self.outstanding.items() if n == nonce]:
+            del self.outstanding[tx_hash]
+
+    async def on_block(self, seen_at):
+        """Called for every new block that arrived at `seen_at`. Looks up the
+        receipts of all outstanding transactions in one batch.
+        Returns an Inclusion for each one that has been mined, in nonce order.
+        """
+        if not self.outstanding:
+            return []
+        hashes = list(self.outstanding)
+        receipts = await self.rpc.batch([('eth_getTransactionReceipt', [tx_hash])
+                                         for tx_hash in hashes])
+        included = []
+        for tx_hash, receipt in zip(hashes, receipts):
+            if receipt is None or isinstance(receipt, Exception) \
+                    or receipt.get('blockNumber') is None:
+                continue
+            included.append(Inclusion(self.outstanding[tx_hash], tx_hash,
+                                      int(receipt['blockNumber'], 16),
+                                      int(receipt['gasUsed'], 16), seen_at))
+        for inclusion in included:
+            self.forget_nonce(inclusion.nonce)
+        return sorted(included)
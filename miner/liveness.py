@@ -0,0 +1,199 @@
+"""Scan of GST2's queue of children for tokens that cannot be refunded.
+
+Every token of GST2 is a child contract, created with nonces s_tail + 1 to
+s_head of the token contract and destroyed oldest first. A nonce in that
+range without a child is a token that frees without a refund; a child
+that is still alive at or below s_tail was burned without one (as
+destroyChildren's comment explains, on ETH the child's CALL does not get all
+the gas, so with too little its SELFDESTRUCT fails while the token is freed
+anyway).
+
+The scanner reads s_head and s_tail (storage slots 2 and 3) once, derives
+the children's addresses in chunks (children.py) and checks them with one
+JSON-RPC batch of eth_getCode per chunk, all at the same block, keeping a
+few chunks in flight. Runs of bad nonces are reported as they are found, so
+millions of tokens are scanned in bounded memory:
+
+    $ python -m miner.liveness http://localhost:8545
+    $ python -m miner.liveness /path/to/geth.ipc --orphans-from 1 --batch 2000
+
+With a pyethereum State instead of a node (StateSource), the same scan
+runs on local state, as the tests do.
+"""
+
+import argparse
+import asyncio
+import collections
+import time
+
+from .children import ChildAddresses, GST2_ADDRESS, unpack
+
+# storage slots of GST2's s_head and s_tail
+S_HEAD = 2
+S_TAIL = 3
+
+# nonces first to last (inclusive) that are all 'missing' (no child
+# between s_tail and s_head) or 'orphan' (a live child at or below s_tail)
+Anomaly = collections.namedtuple('Anomaly', 'first last kind')
+
+
+def _hex_address(address):
+    return '0x' + address.hex()
+
+
+class RPCSource(object):
+    """Reads from a node over a miner/rpc.py connection, at `block`."""
+
+    def __init__(self, rpc, block='latest'):
+        self.rpc = rpc
+        self.block = block
+
+    async def pin(self):
+        """Makes all later reads be of the current block."""
+        self.block = await self.rpc.call('eth_blockNumber')
+        return self
+
+    async def storage(self, address, slot):
+        return int(await self.rpc.call('eth_getStorageAt', _hex_address(address),
+                                       hex(slot), self.block), 16)
+
+    async def has_code(self, addresses):
+        results = await self.rpc.batch([('eth_getCode', [_hex_address(a), self.block])
+                                        for a in addresses])
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return [result not in ('0x', '', None) for result in results]
+
+
+class StateSource(object):
+    """Reads from a pyethereum State."""
+
+    def __init__(self, state):
+        self.state = state
+
+    async def pin(self):
+        return self
+
+    async def storage(self, address, slot):
+        return self.state.get_storage_data(address, slot)
+
+    async def has_code(self, addresses):
+        return [len(self.state.get_code(a)) > 0 for a in addresses]
+
+
+async def read_queue(source, token=GST2_ADDRESS):
+    """Returns (s_head, s_tail) of the GST2 contract at `token`."""
+    head = await source.storage(token, S_HEAD)
+    tail = await source.storage(token, S_TAIL)
+    return head, tail
+
+
+async def _flags(source, children, first, stop, batch_size, concurrency):
+    """Yields (nonce, has code) for the children with nonces [first, stop),
+    in order, with up to `concurrency` batches in flight.
+    """
+    def check(start):
+        end = min(start + batch_size, stop)
+        addresses = unpack(children.addresses(start, end))
+        return asyncio.ensure_future(source.has_code(addresses))
+
+    pending = collections.deque()
+    try:
+        for start in range(first, stop, batch_size):
+            pending.append((start, check(start)))
+            if len(pending) < concurrency:
+                continue
+            start, future = pending.popleft()
+            for i, flag in enumerate(await future):
+                yield start + i, flag
+        while pending:
+            start, future = pending.popleft()
+            for i, flag in enumerate(await future):
+                yield start + i, flag
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+async def scan_range(source, first, stop, expect_live, token=GST2_ADDRESS,
+                     batch_size=1000, concurrency=4):
+    """Yields Anomalies for the runs of nonces in [first, stop) whose
+    children are not as `expect_live`.
+    """
+    kind = 'missing' if expect_live else 'orphan'
+    children = ChildAddresses(token)
+    run_start = None
+    async for nonce, live in _flags(source, children, first, stop, batch_size, concurrency):
+        if live != expect_live:
+            if run_start is None:
+                run_start = nonce
+        elif run_start is not None:
+            yield Anomaly(run_start, nonce - 1, kind)
+            run_start = None
+    if run_start is not None:
+        yield Anomaly(run_start, stop - 1, kind)
+
+
+async def scan(source, token=GST2_ADDRESS, orphans_from=None, batch_size=1000, concurrency=4):
+    """Yields the Anomalies of the queue of `token`: children missing
+    between s_tail and s_head and, with `orphans_from`, children still
+    alive from that nonce up to s_tail.
+    """
+    head, tail = await read_queue(source, token)
+    if orphans_from is not None:
+        async for anomaly in scan_range(source, orphans_from, tail + 1, False, token,
+                                        batch_size, concurrency):
+            yield anomaly
+    async for anomaly in scan_range(source, tail + 1, head + 1, True, token,
+                                    batch_size, concurrency):
+        yield anomaly
+
+
+async def report(source, token=GST2_ADDRESS, orphans_from=None, batch_size=1000,
+                 concurrency=4, out=print):
+    """Scans and prints the anomalies as they are found, then a summary.
+    Returns the number of tokens affected.
+    """
+    await source.pin()
+    head, tail = await read_queue(source, token)
+    out("s_head {}, s_tail {}: {} tokens".format(head, tail, head - tail))
+    start = time.time()
+    counts = collections.Counter()
+    async for anomaly in scan(source, token, orphans_from, batch_size, concurrency):
+        count = anomaly.last - anomaly.first + 1
+        counts[anomaly.kind] += count
+        out("{} nonces {}..{} ({})".format(anomaly.kind, anomaly.first, anomaly.last, count))
+    checked = head - tail + (max(tail + 1 - orphans_from, 0) if orphans_from is not None else 0)
+    elapsed = time.time() - start
+    out("checked {} children in {:.1f}s ({:.0f}/s): {} missing, {} orphaned".format(
+        checked, elapsed, checked / elapsed if elapsed else 0.0,
+        counts['missing'], counts['orphan']))
+    return counts['missing'] + counts['orphan']
+
+
+def main():
+    from .rpc import connect
+
+    parser = argparse.ArgumentParser(description="Scans GST2's children for tokens without a refund.")
+    parser.add_argument('uri', help="node's http(s) URL or IPC socket path")
+    parser.add_argument('--token', default=_hex_address(GST2_ADDRESS), help='GST2 address')
+    parser.add_argument('--orphans-from', type=int,
+                        help='also report live children from this nonce up to s_tail')
+    parser.add_argument('--batch', type=int, default=1000, help='eth_getCode calls per batch')
+    parser.add_argument('--concurrency', type=int, default=4, help='batches in flight')
+    args = parser.parse_args()
+
+    token = bytes.fromhex(args.token[2:] if args.token.startswith('0x') else args.token)
+    loop = asyncio.get_event_loop()
+    rpc = loop.run_until_complete(connect(args.uri))
+    try:
+        bad = loop.run_until_complete(report(RPCSource(rpc), token, args.orphans_from,
+                                             args.batch, args.concurrency))
+    finally:
+        rpc.close()
+    raise SystemExit(1 if bad else 0)
+
+
+if __name__ == '__main__':
+    main()
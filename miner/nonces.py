@@ -0,0 +1,99 @@
+"""Local nonce bookkeeping for a mining account.
+
+The manager hands out nonces and remembers which ones have been sent, so
+the node is only asked for the account's transaction count on startup, on a
+new block, and after a send error that means our view is out of date
+("known transaction", "replacement transaction underpriced", "nonce too
+low"). Concurrent resyncs share a single request.
+"""
+
+import asyncio
+
+
+class NonceManager(object):
+
+    RESYNC_ERRORS = ('known', 'underpriced', 'nonce too low')
+
+    def __init__(self, rpc, address):
+        self.rpc = rpc
+        self.address = address
+        # every nonce below `confirmed` has been mined
+        self.confirmed = None
+        self.next_nonce = None
+        # nonces handed out but not sent yet
+        self.pending = set()
+        # nonce -> tx hash (None if the node already knew the tx)
+        self.sent = {}
+        # confirmed sent nonces not yet handed out by take_confirmed
+        self._newly_confirmed = []
+        self._last_block = None
+        self._sync = None
+
+    @classmethod
+    def is_resync_error(cls, e):
+        return any(reason in str(e) for reason in cls.RESYNC_ERRORS)
+
+    async def start(self):
+        await self.sync()
+        self.next_nonce = self.confirmed
+
+    def sync(self):
+        """Reads the mined transaction count from the node."""
+        if self._sync is None or self._sync.done():
+            self._sync = asyncio.ensure_future(self._do_sync())
+        return self._sync
+
+    async def _do_sync(self):
+        count = int(await self.rpc.call('eth_getTransactionCount', self.address, 'latest'), 16)
+        self.confirm_below(count)
+
+    async def on_block(self, block_number):
+        """Resyncs if `block_number` is new. Returns the sent nonces that
+        have been confirmed since the last call, including those picked up by
+        resyncs after send errors.
+        """
+        if block_number != self._last_block:
+            await self.sync()
+            self._last_block = block_number
+        return self.take_confirmed()
+
+    def take_confirmed(self):
+        confirmed, self._newly_confirmed = self._newly_confirmed, []
+        return confirmed
+
+    async def on_error(self, e):
+        """Resyncs if the send error `e` means our nonces are out of date.
+        Returns True if it did.
+        """
+        if not self.is_resync_error(e):
+            return False
+        await self.sync()
+        return True
+
+    def assign(self, n=1):
+        nonces = list(range(self.next_nonce, self.next_nonce + n))
+        self.next_nonce += n
+        self.pending.update(nonces)
+        return nonces
+
+    def mark_sent(self, nonce, tx_hash):
+        self.pending.discard(nonce)
+        if nonce >= self.confirmed:
+            self.sent[nonce] = tx_hash
+
+    def is_confirmed(self, nonce):
+        return nonce < self.confirmed
+
+    def confirm_below(self, count):
+        if self.confirmed is not None and count <= self.confirmed:
+            return []
+        self.confirmed = count
+        if self.next_nonce is not None:
+            # transactions we did not send ourselves also use up nonces
+            self.next_nonce = max(self.next_nonce, count)
+        self.pending = set(nonce for nonce in self.pending if nonce >= count)
+        confirmed = sorted(nonce for nonce in self.sent if nonce < count)
+        for nonce in confirmed:
+            del self.sent[nonce]
+        self._newly_confirmed.extend(confirmed)
+        return confirmed
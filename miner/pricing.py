@@ -0,0 +1,75 @@
+"""Gas price controllers for the miners.
+
+A controller owns the gas price (and gas limit) of the next mint transaction
+and is told when a batch of mints has been mined or has timed out.
+"""
+
+
+class ConstantPrice(object):
+    """Mints at a fixed gas price. On timeout the gas limit is bumped by one,
+    as the original constant price miner did. `tx_rate`, if given, is the
+    number of transactions per second an automatically sized window should
+    sustain.
+    """
+
+    def __init__(self, gas_price, gas=999000, tx_rate=None):
+        self.gas_price = gas_price
+        self.gas = gas
+        self.tx_rate = tx_rate
+
+    def target_rate(self, tx_gas_consumed):
+        return self.tx_rate
+
+    def on_timeout(self):
+        self.gas += 1
+
+    def on_batch(self, batchtuple):
+        pass
+
+
+class DynamicPrice(object):
+    """Steers the gas price towards burning `wei_per_second`.
+
+    After every mined batch the price is scaled by target / observed burn
+    rate, clamped to [.75, 2.0], and never drops below 1 gwei + 20. A batch
+    that times out raises the price by `gas_delta`. The price never exceeds
+    `max_buy`.
+    """
+
+    MIN_PRICE = int(1e9) + 20
+
+    def __init__(self, gas_price, wei_per_second, gas_delta, max_buy,
+                 gas=999999):
+        self._gas_price = gas_price
+        self.wei_per_second = wei_per_second
+        self.gas_delta = gas_delta
+        self.max_buy = max_buy
+        self.gas = gas
+
+    @property
+    def gas_price(self):
+        if self._gas_price > self.max_buy:
+            self._gas_price = self.max_buy
+        assert(self._gas_price <= self.max_buy) # sanity check circuit breaker
+        return self._gas_price
+
+    def target_rate(self, tx_gas_consumed):
+        # transactions per second needed to burn wei_per_second at this price
+        return self.wei_per_second / (self.gas_price * tx_gas_consumed)
+
+    def on_timeout(self):
+        self._gas_price += self.gas_delta
+        print("Timed out, upping price.  New price", self._gas_price)
+
+    def on_batch(self, batchtuple):
+        # batchtuple is (end_nonce,time_start,time_end,wei_consumed)
+        if batchtuple[2] <= batchtuple[1]:
+            # no time to measure a burn rate over
+            return
+        gas_price = self.gas_price
+        burn_rate = batchtuple[3] / (batchtuple[2] - batchtuple[1])
+        adjustment_factor = min(max((self.wei_per_second / burn_rate), .75), 2.0)
+        new_price = max(int(adjustment_factor * gas_price), self.MIN_PRICE)
+        print("Adjusting gas.  Burn rate / target / adjustment factor / old gas / new gas")
+        print(burn_rate, self.wei_per_second, adjustment_factor, gas_price, new_price)
+        self._gas_price = new_price
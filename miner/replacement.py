@@ -0,0 +1,65 @@
+"""Replacement of stuck mint transactions.
+
+A mint that sits in the mempool for `stuck_blocks` blocks is underpriced,
+and since it holds the lowest pending nonce it also blocks every later mint.
+Rather than waiting for the batch timeout, the engine re-sends such nonces
+with the same nonce and a higher gas price, which makes the node drop the
+old transaction. geth only accepts a replacement that pays at least 10% more
+than the transaction it replaces, so every replacement bumps by at least
+that much; the price never exceeds `max_price`.
+"""
+
+import math
+
+
+class Replacer(object):
+
+    # geth's default --txpool.pricebump
+    MIN_BUMP = 1.10
+
+    def __init__(self, max_price, stuck_blocks=2, bump=1.125):
+        assert bump >= self.MIN_BUMP
+        self.max_price = max_price
+        self.stuck_blocks = stuck_blocks
+        self.bump = bump
+        # nonce -> (gas price, block number it was last sent at)
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def sent(self, nonce, gas_price, block_number):
+        self.pending[nonce] = (gas_price, block_number)
+
+    def confirmed(self, nonce):
+        self.pending.pop(nonce, None)
+
+    def underpriced(self, nonce, gas_price):
+        """The node refused to replace `nonce` at `gas_price`, e.g. because
+        it requires a larger bump. The next attempt will bump from there.
+        """
+        if nonce in self.pending:
+            _, block_number = self.pending[nonce]
+            self.pending[nonce] = (gas_price, block_number)
+
+    def stuck(self, block_number, gas_price):
+        """Returns (nonces, replacement price) for the transactions that have
+        not been mined within `stuck_blocks` blocks, or ([], None) if there
+        are none or they cannot be replaced without exceeding `max_price`.
+        All stuck nonces are re-sent at one price, which is the current
+        `gas_price` or the bumped price of the most expensive of them,
+        whichever is higher.
+        """
+        nonces = sorted(nonce for nonce, (_, sent_at) in self.pending.items()
+                        if block_number - sent_at >= self.stuck_blocks)
+        if not nonces:
+            return [], None
+        old_price = max(self.pending[nonce][0] for nonce in nonces)
+        new_price = min(max(gas_price, int(math.ceil(old_price * self.bump))),
+                        self.max_price)
+        # replacing at less than the minimum bump would just be rejected
+        nonces = [nonce for nonce in nonces
+                  if new_price >= math.ceil(self.pending[nonce][0] * self.MIN_BUMP)]
+        if not nonces:
+            return [], None
+        return nonces, new_price
@@ -0,0 +1,312 @@
+"""Asyncio JSON-RPC client shared by the miners.
+
+One connection (an IPC socket or an HTTP keep-alive connection) is shared by
+every coroutine in the process. Requests are matched to responses by id, so
+any number of calls can be in flight at once without one slow round-trip
+stalling the others.
+"""
+
+import asyncio
+import codecs
+import collections
+import itertools
+import json
+import re
+from urllib.parse import urlparse
+
+
+class RPCError(Exception):
+
+    def __init__(self, code, message, data=None):
+        super(RPCError, self).__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+
+def _error_from_response(response):
+    error = response['error']
+    return RPCError(error.get('code'), error.get('message', ''), error.get('data'))
+
+
+class _Connection(object):
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._pending = {}
+
+    def _payload(self, method, params):
+        return {"jsonrpc": "2.0", "id": next(self._ids), "method": method,
+                "params": list(params)}
+
+    async def call(self, method, *params):
+        result = (await self._send([self._payload(method, params)], False))[0]
+        if isinstance(result, RPCError):
+            raise result
+        return result
+
+    async def batch(self, calls):
+        """Sends `calls`, a list of (method, params) tuples, as a single
+        JSON-RPC batch request. Errors are returned in place as RPCError
+        instances rather than raised, so one rejected call does not hide the
+        results of the others.
+        """
+        if not calls:
+            return []
+        return await self._send([self._payload(method, params)
+                                 for method, params in calls], True)
+
+    def _register(self, payloads):
+        loop = asyncio.get_event_loop()
+        futures = []
+        for payload in payloads:
+            future = loop.create_future()
+            self._pending[payload['id']] = future
+            futures.append(future)
+        return futures
+
+    def _dispatch(self, response):
+        if isinstance(response, list):
+            for item in response:
+                self._dispatch(item)
+            return
+        future = self._pending.pop(response.get('id'), None)
+        if future is None or future.done():
+            return
+        if 'error' in response:
+            future.set_result(_error_from_response(response))
+        else:
+            future.set_result(response.get('result'))
+
+    def _fail_pending(self, exc):
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    async def _send(self, payloads, as_batch):
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+class _JSONStream(object):
+    """Splits a byte stream of back to back JSON objects and arrays into the
+    values. Every byte is scanned once: a value is only parsed when the
+    bracket that closes it arrives.
+    """
+
+    _SPECIAL = re.compile(r'[][{}"\\]')
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        # text of the value being received
+        self._pieces = []
+        self._depth = 0
+        self._in_string = False
+        # whether the last chunk ended with a backslash in a string
+        self._escaped = False
+
+    def feed(self, data):
+        """Returns the values `data` completes."""
+        text = self._decoder.decode(data)
+        values = []
+        start = 0
+        skip = 0 if self._escaped else -1
+        self._escaped = False
+        for match in self._SPECIAL.finditer(text):
+            i = match.start()
+            if i == skip:
+                continue
+            c = text[i]
+            if self._in_string:
+                if c == '\\':
+                    skip = i + 1
+                    self._escaped = skip == len(text)
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in '[{':
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pieces.append(text[start:i + 1])
+                    values.append(json.loads(''.join(self._pieces)))
+                    self._pieces = []
+                    start = i + 1
+        if self._pieces or text[start:].strip():
+            self._pieces.append(text[start:])
+        return values
+
+
+class IPCConnection(_Connection):
+
+    def __init__(self, path):
+        super(IPCConnection, self).__init__()
+        self.path = path
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        # subscription id -> queue of notifications
+        self._subscriptions = {}
+        # notifications that arrived before their subscription was registered
+        self._early = collections.defaultdict(list)
+
+    async def open(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(
+            self.path, limit=2**24)
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+        return self
+
+    async def _read_loop(self):
+        # geth writes responses back to back without any framing, so split
+        # off complete JSON values as they become available
+        stream = _JSONStream()
+        try:
+            while True:
+                chunk = await self._reader.read(2**16)
+                if not chunk:
+                    raise ConnectionError("IPC connection closed")
+                for response in stream.feed(chunk):
+                    self._on_message(response)
+        except Exception as e:
+            self._fail_pending(e)
+
+    def _on_message(self, message):
+        if isinstance(message, dict) and message.get('method') == 'eth_subscription':
+            params = message['params']
+            queue = self._subscriptions.get(params['subscription'])
+            if queue is None:
+                self._early[params['subscription']].append(params['result'])
+            else:
+                queue.put_nowait(params['result'])
+        else:
+            self._dispatch(message)
+
+    async def subscribe(self, *params):
+        """Creates an eth_subscribe subscription. Returns the subscription id
+        and an asyncio.Queue that receives its notifications.
+        """
+        subscription = await self.call('eth_subscribe', *params)
+        queue = asyncio.Queue()
+        for result in self._early.pop(subscription, []):
+            queue.put_nowait(result)
+        self._subscriptions[subscription] = queue
+        return subscription, queue
+
+    async def _send(self, payloads, as_batch):
+        futures = self._register(payloads)
+        body = payloads if as_batch else payloads[0]
+        self._writer.write(json.dumps(body).encode())
+        await self._writer.drain()
+        return await asyncio.gather(*futures)
+
+    def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+
+class HTTPConnection(_Connection):
+    """HTTP transport over one keep-alive connection.
+
+    HTTP cannot interleave responses, so calls issued while a request is
+    outstanding are queued and flushed together as the next JSON-RPC batch.
+    """
+
+    def __init__(self, url):
+        super(HTTPConnection, self).__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.ssl = parsed.scheme == 'https'
+        self.path = parsed.path or '/'
+        self._reader = None
+        self._writer = None
+        self._outbox = []
+        self._flusher = None
+
+    async def open(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl or None, limit=2**24)
+        return self
+
+    async def _send(self, payloads, as_batch):
+        futures = self._register(payloads)
+        self._outbox.extend(payloads)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush())
+        return await asyncio.gather(*futures)
+
+    async def _flush(self):
+        while self._outbox:
+            payloads, self._outbox = self._outbox, []
+            body = payloads[0] if len(payloads) == 1 else payloads
+            try:
+                if self._writer is None:
+                    await self.open()
+                self._dispatch(await self._post(json.dumps(body).encode()))
+            except Exception as e:
+                self._writer = None
+                for payload in payloads:
+                    future = self._pending.pop(payload['id'], None)
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+
+    async def _post(self, body):
+        request = ("POST {} HTTP/1.1\r\n"
+                   "Host: {}:{}\r\n"
+                   "Content-Type: application/json\r\n"
+                   "Content-Length: {}\r\n"
+                   "Connection: keep-alive\r\n\r\n").format(
+            self.path, self.host, self.port, len(body))
+        self._writer.write(request.encode() + body)
+        await self._writer.drain()
+
+        status = await self._reader.readline()
+        if not status:
+            raise ConnectionError("HTTP connection closed")
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode().partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = b''
+            while True:
+                size = int((await self._reader.readline()).strip(), 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                data += await self._reader.readexactly(size)
+                await self._reader.readline()
+        else:
+            data = await self._reader.readexactly(int(headers['content-length']))
+
+        if headers.get('connection', '').lower() == 'close':
+            self._writer.close()
+            self._writer = None
+        return json.loads(data.decode())
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+async def connect(uri):
+    """Opens a connection to `uri`, which is either an http(s):// URL or the
+    path of a node's IPC socket.
+    """
+    if uri.startswith('http://') or uri.startswith('https://'):
+        return await HTTPConnection(uri).open()
+    if uri.startswith('ipc://'):
+        uri = uri[len('ipc://'):]
+    return await IPCConnection(uri).open()
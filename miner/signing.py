@@ -0,0 +1,90 @@
+"""Offline signing of mint transactions.
+
+Raw transactions are built and signed locally with pyethereum, using a key
+loaded from a geth keystore file, so the node no longer has to unlock the
+account and sign every transaction serially. Very large batches are signed
+in a process pool. The engine submits signed transactions as one JSON-RPC
+batch of eth_sendRawTransaction calls.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import rlp
+from ethereum import utils
+from ethereum.tools import keys
+from ethereum.transactions import Transaction
+
+
+def load_key(keystore_path, password):
+    with open(keystore_path) as fd:
+        return keys.decode_keystore_json(json.load(fd), password)
+
+
+def _data_bytes(data):
+    if isinstance(data, str):
+        return bytes.fromhex(data[2:] if data.startswith('0x') else data)
+    return data
+
+
+def sign_transaction(key, nonce, gas_price, gas, to, data, network_id=None):
+    """Returns (raw transaction, tx hash) as 0x-prefixed hex strings."""
+    tx = Transaction(nonce, gas_price, gas, utils.normalize_address(to), 0,
+                     _data_bytes(data))
+    tx.sign(key, network_id)
+    return '0x' + utils.encode_hex(rlp.encode(tx)), '0x' + utils.encode_hex(tx.hash)
+
+
+def _sign_chunk(args):
+    key, nonces, gas_price, gas, to, data, network_id = args
+    return [sign_transaction(key, nonce, gas_price, gas, to, data, network_id)
+            for nonce in nonces]
+
+
+class Signer(object):
+
+    # below this many transactions, signing in-process beats the overhead of
+    # shipping work to the pool
+    POOL_THRESHOLD = 256
+
+    def __init__(self, key, network_id=None, processes=None):
+        self.key = key
+        self.address = '0x' + utils.encode_hex(utils.privtoaddr(key))
+        # EIP 155 chain id (1 for Ethereum, 61 for Ethereum Classic), or None
+        # for unprotected transactions
+        self.network_id = network_id
+        self.processes = processes
+        self._pool = None
+
+    def sign(self, nonce, gas_price, gas, to, data):
+        return sign_transaction(self.key, nonce, gas_price, gas, to, data,
+                                self.network_id)
+
+    def sign_many(self, nonces, gas_price, gas, to, data):
+        """Signs one transaction per nonce. Returns a list of
+        (raw transaction, tx hash) in the order of `nonces`.
+        """
+        nonces = list(nonces)
+        data = _data_bytes(data)
+        if len(nonces) < self.POOL_THRESHOLD:
+            return _sign_chunk((self.key, nonces, gas_price, gas, to, data,
+                                self.network_id))
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.processes)
+        workers = self.processes or os.cpu_count() or 1
+        chunk_size = -(-len(nonces) // workers)
+        chunks = [(self.key, nonces[i:i + chunk_size], gas_price, gas, to, data,
+                   self.network_id)
+                  for i in range(0, len(nonces), chunk_size)]
+        signed = []
+        for chunk in self._pool.map(_sign_chunk, chunks):
+            signed.extend(chunk)
+        return signed
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
@@ -0,0 +1,322 @@
+"""In-memory reference model of GST1 and GST2 for strategy simulations.
+
+GST1 and GST2 keep balances, allowances and their token storage (GST1's
+words at 0xDEADBEEF + 1, ..., GST2's queue of children between s_tail and
+s_head) like the contracts do, return what the contracts return, and charge
+mint and the free* functions the gas of the calibrated cost model
+(costmodel.py), so that millions of operations take seconds instead of
+hours on the EVM:
+
+    token = simulator('GST2_ETH')
+    token.mint(me, 100).gas
+    receipt = token.free(me, 40)
+    gas_used(receipt, other_gas=1000000)
+
+The model was calibrated with storage that is already in use (the minter's
+balance, the supply or s_head and s_tail non-zero before and after), so a
+call that takes a word from zero to non-zero is charged the difference
+between SSTORE's set and reset costs on top, and one that clears a word is
+refunded like the EVM does. The free* functions are charged as called from
+a contract (see test_free_cost_and_refund); transfers and approvals are not
+charged (their receipts have gas None). test/generic_gas_token.py checks
+all of this against the tester chain.
+
+    $ python -m miner.simulator --ops 1000000
+"""
+
+import argparse
+import collections
+import random
+import time
+
+from .costmodel import CostModel, GTXDATAZERO, GTXDATANONZERO
+
+# SSTORE of a non-zero value to a zero word, SSTORE otherwise, and the refund
+# for clearing a word (ethereum.opcodes)
+GSTORAGEADD = 20000
+GSTORAGEMOD = 5000
+GSTORAGEREFUND = 15000
+GSUICIDEREFUND = 24000
+
+SSTORE_SET_EXTRA = GSTORAGEADD - GSTORAGEMOD
+
+# result is what the contract function returns (None for mint), gas the gas
+# of the transaction before the refund and refund the refund it asks for
+Receipt = collections.namedtuple('Receipt', 'result gas refund')
+
+
+def gas_used(receipt, other_gas=0):
+    """Gas a transaction that spends `other_gas` besides `receipt`'s call
+    ends up paying, with the refund capped at half the gas used.
+    """
+    gas = receipt.gas + other_gas
+    return gas - min(receipt.refund, gas // 2)
+
+
+def _data_cost(value):
+    # calldata gas of a uint256 argument
+    nonzero = len(value.to_bytes(32, 'big').replace(b'\x00', b''))
+    return GTXDATAZERO * (32 - nonzero) + GTXDATANONZERO * nonzero
+
+
+class GasToken(object):
+    """The ERC20 part and the gas accounting shared by GST1 and GST2."""
+
+    # refund per freed token
+    REFUND = None
+
+    def __init__(self, variant, model=None):
+        self.variant = variant
+        self.model = model or CostModel.load()
+        self.costs = self.model.variants[variant]
+        self.balances = {}
+        self.allowances = {}
+        self._free_bases = {
+            'free': self.costs.free_base,
+            'freeUpTo': self.costs.free_up_to_base,
+            'freeFrom': self.costs.free_from_base,
+            'freeFromUpTo': self.costs.free_from_up_to_base,
+        }
+
+    def balance_of(self, owner):
+        return self.balances.get(owner, 0)
+
+    def allowance(self, owner, spender):
+        return self.allowances.get((owner, spender), 0)
+
+    def total_supply(self):
+        raise NotImplementedError
+
+    def storage_words(self):
+        """Number of non-zero words in the contract's storage."""
+        return len(self.balances) + len(self.allowances) + self._token_words()
+
+    @staticmethod
+    def _store(mapping, key, value):
+        """Sets a storage word. Returns the (extra gas, refund) of the
+        SSTORE compared with rewriting a non-zero word.
+        """
+        old = mapping.get(key, 0)
+        if value:
+            mapping[key] = value
+        else:
+            mapping.pop(key, None)
+        if value and not old:
+            return SSTORE_SET_EXTRA, 0
+        if old and not value:
+            return 0, GSTORAGEREFUND
+        return 0, 0
+
+    def _transfer(self, sender, to, value):
+        if value > self.balance_of(sender):
+            return False
+        self._store(self.balances, sender, self.balance_of(sender) - value)
+        self._store(self.balances, to, self.balance_of(to) + value)
+        return True
+
+    def transfer(self, sender, to, value):
+        return Receipt(self._transfer(sender, to, value), None, 0)
+
+    def transfer_from(self, sender, owner, to, value):
+        if value <= self.allowance(owner, sender) and self._transfer(owner, to, value):
+            self._store(self.allowances, (owner, sender), self.allowance(owner, sender) - value)
+            return Receipt(True, None, 0)
+        return Receipt(False, None, 0)
+
+    def approve(self, sender, spender, value):
+        if value != 0 and self.allowance(sender, spender) != 0:
+            return Receipt(False, None, 0)
+        self._store(self.allowances, (sender, spender), value)
+        return Receipt(True, None, 0)
+
+    # token storage, implemented by GST1 and GST2
+
+    def _token_words(self):
+        raise NotImplementedError
+
+    def _create(self, value):
+        """Stores `value` new tokens. Returns the extra gas."""
+        raise NotImplementedError
+
+    def _destroy(self, value):
+        """Frees `value` tokens. Returns (extra gas, refund)."""
+        raise NotImplementedError
+
+    def mint(self, sender, value):
+        costs = self.costs
+        data = _data_cost(value)
+        if value == 0 and costs.mint_zero is not None:
+            return Receipt(None, costs.mint_zero + data, 0)
+        gas = costs.mint_base + costs.mint_token * value + data
+        gas += self._create(value)
+        gas += self._store(self.balances, sender, self.balance_of(sender) + value)[0]
+        return Receipt(None, gas, 0)
+
+    def _free(self, function, owner, spender, value, up_to):
+        """free, freeUpTo, freeFrom and freeFromUpTo of `owner`'s tokens,
+        with `spender` None unless called for another account.
+        """
+        gas = self._free_bases[function] + _data_cost(value)
+        balance = self.balance_of(owner)
+        allowance = self.allowance(owner, spender) if spender is not None else None
+        if value > balance or (allowance is not None and value > allowance):
+            if not up_to:
+                return Receipt(False, gas, 0)
+            value = min(value, balance, balance if allowance is None else allowance)
+
+        extra, refund = self._destroy(value)
+        gas += self.costs.free_token * value + extra
+        extra, cleared = self._store(self.balances, owner, balance - value)
+        gas += extra
+        refund += cleared
+        if allowance is not None:
+            extra, cleared = self._store(self.allowances, (owner, spender), allowance - value)
+            gas += extra
+            refund += cleared
+        return Receipt(value if up_to else True, gas, refund + self.REFUND * value)
+
+    def free(self, sender, value):
+        return self._free('free', sender, None, value, False)
+
+    def free_up_to(self, sender, value):
+        return self._free('freeUpTo', sender, None, value, True)
+
+    def free_from(self, sender, owner, value):
+        return self._free('freeFrom', owner, sender, value, False)
+
+    def free_from_up_to(self, sender, owner, value):
+        return self._free('freeFromUpTo', owner, sender, value, True)
+
+
+class GST1(GasToken):
+
+    REFUND = GSTORAGEREFUND
+
+    # the supply is stored here, the tokens in the words after it
+    STORAGE_LOCATION_ARRAY = 0xDEADBEEF
+
+    def __init__(self, variant='GST1', model=None):
+        super(GST1, self).__init__(variant, model)
+        self.supply = 0
+
+    def total_supply(self):
+        return self.supply
+
+    def storage(self):
+        """The token words of the contract's storage, as slot: value."""
+        slots = {self.STORAGE_LOCATION_ARRAY: self.supply} if self.supply else {}
+        for i in range(1, self.supply + 1):
+            slots[self.STORAGE_LOCATION_ARRAY + i] = 1
+        return slots
+
+    def _token_words(self):
+        return self.supply + 1 if self.supply else 0
+
+    def _create(self, value):
+        # the new token words are part of the calibrated cost
+        extra = SSTORE_SET_EXTRA if value and not self.supply else 0
+        self.supply += value
+        return extra
+
+    def _destroy(self, value):
+        self.supply -= value
+        # the token words' refunds are REFUND per token
+        return 0, GSTORAGEREFUND if value and not self.supply else 0
+
+
+class GST2(GasToken):
+
+    REFUND = GSUICIDEREFUND
+
+    def __init__(self, variant='GST2_ETH', model=None):
+        super(GST2, self).__init__(variant, model)
+        # s_head is the nonce of the newest child, s_tail the one before
+        # the oldest
+        self.head = 0
+        self.tail = 0
+        # rlp_range_cost without NumPy, which is slow for single values
+        self._rlp_segments = self.model._rlp_segments()
+
+    def total_supply(self):
+        return self.head - self.tail
+
+    def children(self):
+        """Nonces of the live children, oldest first."""
+        return range(self.tail + 1, self.head + 1)
+
+    def _token_words(self):
+        return (self.head != 0) + (self.tail != 0)
+
+    def _create(self, value):
+        extra = SSTORE_SET_EXTRA if value and not self.head else 0
+        self.head += value
+        return extra
+
+    def _destroy(self, value):
+        # the cost model's free_token holds for nonces below 128
+        extra = 0
+        if value:
+            first, end = self.tail + 1, self.tail + 1 + value
+            for start, stop, segment_extra in self._rlp_segments:
+                if start >= end:
+                    break
+                if stop > first:
+                    extra += segment_extra * (min(end, stop) - max(first, start))
+            if not self.tail:
+                extra += SSTORE_SET_EXTRA
+        self.tail += value
+        return extra, 0
+
+
+def simulator(variant, model=None):
+    """A fresh token of cost model variant `variant`."""
+    cls = GST1 if variant.startswith('GST1') else GST2
+    return cls(variant, model)
+
+
+def simulate(token, ops, seed=0, accounts=4, max_value=50):
+    """Applies `ops` random mints, frees and transfers to `token`. Returns
+    the total gas used.
+    """
+    rng = random.Random(seed)
+    names = list(range(accounts))
+    for a in names:
+        for b in names:
+            token.approve(a, b, 2**128)
+    total = 0
+    for _ in range(ops):
+        sender = rng.choice(names)
+        value = rng.randrange(max_value)
+        kind = rng.randrange(4)
+        if kind == 0:
+            receipt = token.mint(sender, value)
+        elif kind == 1:
+            receipt = token.free_up_to(sender, value)
+        elif kind == 2:
+            receipt = token.free_from_up_to(sender, rng.choice(names), value)
+        else:
+            receipt = token.transfer(sender, rng.choice(names), value)
+        if receipt.gas is not None:
+            total += gas_used(receipt)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Times random operations on the simulated tokens.')
+    parser.add_argument('--ops', type=int, default=1000000)
+    parser.add_argument('--variant', action='append',
+                        help='cost model variant, may be repeated (default: all)')
+    args = parser.parse_args()
+
+    model = CostModel.load()
+    for variant in args.variant or sorted(model.variants):
+        token = simulator(variant, model)
+        start = time.perf_counter()
+        total = simulate(token, args.ops)
+        elapsed = time.perf_counter() - start
+        print("{:>9}: {} ops in {:.2f}s ({:.0f} ops/s), {} gas used, supply {}".format(
+            variant, args.ops, elapsed, args.ops / elapsed, total, token.total_supply()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+"""Local stand-in for an Ethereum node, for benchmarking the miners offline.
+
+Speaks just enough JSON-RPC (over an IPC socket and/or HTTP) to mine: it
+keeps per-account nonces and a mempool, and seals a block every
+`block_time` seconds containing the best paying executable transactions
+that fit into the block gas limit. An artificial per-request latency
+simulates a slow node. New heads are pushed to eth_subscribe subscribers
+over IPC and can be polled with block filters over either transport.
+
+    $ python -m miner.standin_node --ipc /tmp/standin.ipc --block-time 1
+"""
+
+import argparse
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import time
+
+
+class NodeError(Exception):
+
+    def __init__(self, message, code=-32000):
+        super(NodeError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _quantity(x):
+    return int(x, 16) if isinstance(x, str) else int(x)
+
+
+class StandinChain(object):
+
+    def __init__(self, block_gas_limit=8000000, tx_gas_used=982614,
+                 min_gas_price=0):
+        self.block_gas_limit = block_gas_limit
+        # gas used by every included transaction; the miners only send mints
+        self.tx_gas_used = tx_gas_used
+        self.min_gas_price = min_gas_price
+        self.nonces = {}
+        # sender -> nonce -> tx
+        self.mempool = {}
+        self.transactions = {}
+        self.receipts = {}
+        self.blocks = []
+        # block number -> wall clock time the block was sealed
+        self.sealed_at = []
+        self._seal([])
+
+    def _hash(self, *parts):
+        return '0x' + hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def _seal(self, txs):
+        number = len(self.blocks)
+        parent = self.blocks[-1]['hash'] if self.blocks else '0x' + '00' * 32
+        block = {
+            'number': hex(number),
+            'hash': self._hash('block', number, parent, time.time()),
+            'parentHash': parent,
+            'timestamp': hex(int(time.time())),
+            'gasLimit': hex(self.block_gas_limit),
+            'gasUsed': hex(self.tx_gas_used * len(txs)),
+            'transactions': [tx['hash'] for tx in txs],
+        }
+        for index, tx in enumerate(txs):
+            tx['blockNumber'] = block['number']
+            tx['blockHash'] = block['hash']
+            tx['transactionIndex'] = hex(index)
+            self.receipts[tx['hash']] = {
+                'transactionHash': tx['hash'],
+                'transactionIndex': hex(index),
+                'blockNumber': block['number'],
+                'blockHash': block['hash'],
+                'from': tx['from'],
+                'to': tx['to'],
+                'gasUsed': hex(self.tx_gas_used),
+                'cumulativeGasUsed': hex(self.tx_gas_used * (index + 1)),
+                'status': '0x1',
+                'logs': [],
+            }
+        self.blocks.append(block)
+        self.sealed_at.append(time.time())
+        return block
+
+    def mine(self):
+        """Seals a block out of the executable mempool transactions, most
+        expensive first, respecting nonce order within each sender.
+        """
+        candidates = []
+        for sender, pending in self.mempool.items():
+            nonce = self.nonces.get(sender, 0)
+            if nonce in pending:
+                tx = pending[nonce]
+                heapq.heappush(candidates, (-_quantity(tx['gasPrice']), tx['hash'], tx))
+
+        included = []
+        gas_left = self.block_gas_limit
+        while candidates and gas_left >= self.tx_gas_used:
+            _, _, tx = heapq.heappop(candidates)
+            if _quantity(tx['gasPrice']) < self.min_gas_price:
+                continue
+            sender = tx['from']
+            del self.mempool[sender][_quantity(tx['nonce'])]
+            self.nonces[sender] = _quantity(tx['nonce']) + 1
+            included.append(tx)
+            gas_left -= self.tx_gas_used
+            following = self.mempool[sender].get(self.nonces[sender])
+            if following is not None:
+                heapq.heappush(candidates, (-_quantity(following['gasPrice']),
+                                            following['hash'], following))
+        return self._seal(included)
+
+    def send(self, tx, tx_hash=None):
+        sender = tx['from'].lower()
+        nonce = _quantity(tx['nonce']) if 'nonce' in tx \
+            else self.pending_nonce(sender)
+        tx = dict(tx, **{'from': sender, 'nonce': hex(nonce),
+                         'gas': hex(_quantity(tx.get('gas', 90000))),
+                         'gasPrice': hex(_quantity(tx.get('gasPrice', 0)))})
+        tx['hash'] = tx_hash or self._hash('tx', tx)
+
+        if nonce < self.nonces.get(sender, 0):
+            raise NodeError("nonce too low")
+        pending = self.mempool.setdefault(sender, {})
+        old = pending.get(nonce)
+        if old is not None:
+            if old['hash'] == tx['hash']:
+                raise NodeError("known transaction: " + tx['hash'][2:])
+            # geth requires a 10% price bump to replace a pending transaction
+            if _quantity(tx['gasPrice']) < _quantity(old['gasPrice']) * 110 // 100:
+                raise NodeError("replacement transaction underpriced")
+            del self.transactions[old['hash']]
+        pending[nonce] = tx
+        self.transactions[tx['hash']] = tx
+        return tx['hash']
+
+    def send_raw(self, raw):
+        # imported here so that the stand-in node only needs pyethereum when
+        # it is sent raw transactions
+        import rlp
+        from ethereum import utils
+        from ethereum.transactions import Transaction
+
+        tx = rlp.decode(bytes.fromhex(raw[2:]), Transaction)
+        return self.send({'from': '0x' + utils.encode_hex(tx.sender),
+                          'to': '0x' + utils.encode_hex(tx.to),
+                          'nonce': tx.nonce,
+                          'gas': tx.startgas,
+                          'gasPrice': tx.gasprice,
+                          'data': '0x' + utils.encode_hex(tx.data)},
+                         tx_hash='0x' + utils.encode_hex(tx.hash))
+
+    def pending_nonce(self, sender):
+        nonce = self.nonces.get(sender, 0)
+        pending = self.mempool.get(sender, {})
+        while nonce in pending:
+            nonce += 1
+        return nonce
+
+    def block_by_hash(self, block_hash):
+        for block in reversed(self.blocks):
+            if block['hash'] == block_hash:
+                return block
+        return None
+
+    def block(self, number):
+        if number == 'latest':
+            return self.blocks[-1]
+        if number == 'earliest':
+            return self.blocks[0]
+        number = _quantity(number)
+        return self.blocks[number] if number < len(self.blocks) else None
+
+
+class StandinNode(object):
+
+    def __init__(self, chain, block_time=1.0, latency=0.0):
+        self.chain = chain
+        self.block_time = block_time
+        self.latency = latency
+        self.requests = 0
+        self._ids = itertools.count(1)
+        # subscription id -> IPC writer of the subscriber
+        self._subscriptions = {}
+        # filter id -> number of the first block not yet returned
+        self._filters = {}
+        self.methods = {
+            'eth_blockNumber': lambda: hex(len(self.chain.blocks) - 1),
+            'eth_gasPrice': lambda: hex(max(self.chain.min_gas_price, 1)),
+            'eth_getTransactionCount': self._transaction_count,
+            'eth_sendTransaction': self.chain.send,
+            'eth_sendRawTransaction': self.chain.send_raw,
+            'eth_getTransactionByHash': lambda h: self.chain.transactions.get(h),
+            'eth_getTransactionReceipt': lambda h: self.chain.receipts.get(h),
+            'eth_getBlockByNumber': lambda n, full=False: self.chain.block(n),
+            'eth_getBlockByHash': lambda h, full=False: self.chain.block_by_hash(h),
+            'eth_newBlockFilter': self._new_block_filter,
+            'eth_getFilterChanges': self._filter_changes,
+            'eth_uninstallFilter': lambda f: self._filters.pop(f, None) is not None,
+            'personal_unlockAccount': lambda *args: True,
+            'net_version': lambda: '1',
+        }
+        # methods that need the connection the request arrived on
+        self.client_methods = {
+            'eth_subscribe': self._subscribe,
+            'eth_unsubscribe': self._unsubscribe,
+        }
+
+    def _transaction_count(self, address, tag='latest'):
+        address = address.lower()
+        if tag == 'pending':
+            return hex(self.chain.pending_nonce(address))
+        return hex(self.chain.nonces.get(address, 0))
+
+    def _new_block_filter(self):
+        filter_id = hex(next(self._ids))
+        self._filters[filter_id] = len(self.chain.blocks)
+        return filter_id
+
+    def _filter_changes(self, filter_id):
+        if filter_id not in self._filters:
+            raise NodeError("filter not found")
+        first, self._filters[filter_id] = self._filters[filter_id], len(self.chain.blocks)
+        return [block['hash'] for block in self.chain.blocks[first:]]
+
+    def _subscribe(self, client, kind, *args):
+        if client is None:
+            raise NodeError("notifications not supported")
+        if kind != 'newHeads':
+            raise NodeError("no \"{}\" subscription in eth namespace".format(kind))
+        subscription = hex(next(self._ids))
+        self._subscriptions[subscription] = client
+        return subscription
+
+    def _unsubscribe(self, client, subscription):
+        return self._subscriptions.pop(subscription, None) is not None
+
+    async def _handle_one(self, request, client=None):
+        self.requests += 1
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        name = request.get('method')
+        params = request.get('params', [])
+        try:
+            if name in self.client_methods:
+                response['result'] = self.client_methods[name](client, *params)
+            elif name in self.methods:
+                response['result'] = self.methods[name](*params)
+            else:
+                raise NodeError("the method {} does not exist/is not available".format(
+                    name), code=-32601)
+        except NodeError as e:
+            response['error'] = {'code': e.code, 'message': e.message}
+        except Exception as e:
+            response['error'] = {'code': -32602, 'message': str(e)}
+        return response
+
+    async def handle(self, request, client=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(request, list):
+            return [await self._handle_one(r, client) for r in request]
+        return await self._handle_one(request, client)
+
+    async def _serve_ipc_client(self, reader, writer):
+        decoder = json.JSONDecoder()
+        buf = ''
+
+        async def respond(request):
+            response = await self.handle(request, writer)
+            writer.write(json.dumps(response).encode())
+
+        while True:
+            chunk = await reader.read(2**16)
+            if not chunk:
+                break
+            buf += chunk.decode()
+            while True:
+                buf = buf.lstrip()
+                if not buf:
+                    break
+                try:
+                    request, end = decoder.raw_decode(buf)
+                except ValueError:
+                    break
+                buf = buf[end:]
+                # requests are answered concurrently and possibly out of order,
+                # as geth does
+                asyncio.ensure_future(respond(request))
+        for subscription in [s for s, w in self._subscriptions.items() if w is writer]:
+            del self._subscriptions[subscription]
+        writer.close()
+
+    async def _serve_http_client(self, reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            headers = {}
+            while True:
+                header = await reader.readline()
+                if header in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = header.decode().partition(':')
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            response = json.dumps(await self.handle(json.loads(body.decode()))).encode()
+            writer.write(("HTTP/1.1 200 OK\r\n"
+                          "Content-Type: application/json\r\n"
+                          "Content-Length: {}\r\n\r\n").format(len(response)).encode()
+                         + response)
+            await writer.drain()
+        writer.close()
+
+    async def _mine_forever(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            block = self.chain.mine()
+            self.on_block(block)
+
+    def on_block(self, block):
+        head = {k: v for k, v in block.items() if k != 'transactions'}
+        for subscription, writer in list(self._subscriptions.items()):
+            notification = {'jsonrpc': '2.0', 'method': 'eth_subscription',
+                            'params': {'subscription': subscription, 'result': head}}
+            writer.write(json.dumps(notification).encode())
+
+    async def start(self, ipc_path=None, http_port=None):
+        servers = []
+        if ipc_path is not None:
+            servers.append(await asyncio.start_unix_server(
+                self._serve_ipc_client, ipc_path, limit=2**24))
+        if http_port is not None:
+            servers.append(await asyncio.start_server(
+                self._serve_http_client, '127.0.0.1', http_port, limit=2**24))
+        self._miner = asyncio.ensure_future(self._mine_forever())
+        self._servers = servers
+        return self
+
+    def stop(self):
+        self._miner.cancel()
+        for server in self._servers:
+            server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ipc', help='path of the IPC socket to listen on')
+    parser.add_argument('--http', type=int, help='HTTP port to listen on')
+    parser.add_argument('--block-time', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='artificial delay per request, in seconds')
+    parser.add_argument('--min-gas-price', type=int, default=0)
+    parser.add_argument('--block-gas-limit', type=int, default=8000000)
+    args = parser.parse_args()
+    if args.ipc is None and args.http is None:
+        parser.error('need at least one of --ipc and --http')
+
+    chain = StandinChain(block_gas_limit=args.block_gas_limit,
+                         min_gas_price=args.min_gas_price)
+    node = StandinNode(chain, block_time=args.block_time, latency=args.latency)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(node.start(args.ipc, args.http))
+    print("stand-in node listening", args.ipc or '', args.http or '')
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""Search for deployment addresses with leading zero bytes.
+
+GST2's children embed the token's address in their code, and every leading
+zero byte of it is one byte less of child code to deploy (PUSH15 instead of
+PUSH20 for the five zero bytes of 0x0000000000b3F879...), so every token
+mints cheaper. This finds (deployer, nonce) pairs whose CREATE address has
+`--zero-bytes` leading zero bytes, either for random deployer keys or for
+the nonces of one `--address`:
+
+    $ python -m miner.vanity --zero-bytes 3 --max-nonce 200 --checkpoint vanity.json
+    $ python -m miner.vanity --address 0x470F1C3217A2F408769bca5AB8a5c67A9040664A \\
+          --zero-bytes 2 --max-nonce 1000000
+    $ python -m miner.vanity --savings
+
+The work is split into chunks (of keys, or of nonces) that are searched by
+a pool of processes. Keys are derived from a random seed and the key's
+index, so the checkpoint (which holds the seed, the chunks done and the
+matches found) is enough to resume an interrupted search, and MUST be kept
+as secret as the keys it finds.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import ethereum.opcodes as op
+from ethereum import utils
+
+from .children import ChildAddresses, keccak256
+from .files import atomic_write
+
+CHECKPOINT_VERSION = 1
+
+# child runtime without the address: PUSH, CALLER XOR PC JUMPI CALLER SELFDESTRUCT
+CHILD_CODE_OVERHEAD = 1 + 6
+
+
+def child_code_length(zero_bytes):
+    """Length of GST2's child code for a token address with `zero_bytes`
+    leading zero bytes.
+    """
+    return CHILD_CODE_OVERHEAD + 20 - zero_bytes
+
+
+def savings(max_zero_bytes=8):
+    """Yields (zero bytes, child code length, gas saved per minted token
+    against an address without zero bytes, gas saved by the last byte,
+    expected candidates to find such an address).
+    """
+    for n in range(max_zero_bytes + 1):
+        saved = op.GCONTRACTBYTE * (child_code_length(0) - child_code_length(n))
+        yield n, child_code_length(n), saved, op.GCONTRACTBYTE if n else 0, 256**n
+
+
+def key_at(seed, index):
+    return keccak256(seed + index.to_bytes(8, 'big'))
+
+
+def _matches(packed, zero_bytes):
+    """Indices of the addresses in `packed` that start with `zero_bytes`
+    zero bytes.
+    """
+    prefix = bytes(zero_bytes)
+    pos = packed.find(prefix)
+    while pos >= 0:
+        if pos % 20 == 0:
+            yield pos // 20
+            pos = packed.find(prefix, pos + 20)
+        else:
+            # not aligned to an address, continue at the next one
+            pos = packed.find(prefix, pos - pos % 20 + 20)
+
+
+def search_chunk(job):
+    """Searches one chunk. Returns (chunk, matches, candidates), where
+    matches are dicts of key (if any), deployer, nonce and address.
+    """
+    chunk, search = job
+    found = []
+    if search['address'] is not None:
+        deployer = utils.decode_hex(search['address'])
+        first = chunk * search['chunk_size']
+        stop = min(first + search['chunk_size'], search['max_nonce'] + 1)
+        packed = ChildAddresses(deployer).addresses(first, stop)
+        for i in _matches(packed, search['zero_bytes']):
+            found.append({'key': None, 'deployer': search['address'], 'nonce': first + i,
+                          'address': utils.encode_hex(packed[20 * i:20 * i + 20])})
+        return chunk, found, stop - first
+
+    seed = utils.decode_hex(search['seed'])
+    first = chunk * search['chunk_size']
+    candidates = 0
+    for index in range(first, first + search['chunk_size']):
+        key = key_at(seed, index)
+        deployer = utils.privtoaddr(key)
+        packed = ChildAddresses(deployer).addresses(0, search['max_nonce'] + 1)
+        candidates += search['max_nonce'] + 1
+        for i in _matches(packed, search['zero_bytes']):
+            found.append({'key': utils.encode_hex(key), 'deployer': utils.encode_hex(deployer),
+                          'nonce': i, 'address': utils.encode_hex(packed[20 * i:20 * i + 20])})
+    return chunk, found, candidates
+
+
+class Search(object):
+    """State of a search: its parameters, the chunks done, the matches
+    found so far and the work they took. Saved as the checkpoint.
+    """
+
+    def __init__(self, zero_bytes, max_nonce, address=None, chunk_size=None, seed=None):
+        if zero_bytes < 1:
+            raise ValueError("zero_bytes must be at least 1, not {}".format(zero_bytes))
+        self.params = {
+            'zero_bytes': zero_bytes,
+            'max_nonce': max_nonce,
+            'address': address,
+            # keys per chunk, or nonces per chunk for a single address
+            'chunk_size': chunk_size or (64 if address is None else 2**16),
+            'seed': seed or (None if address is not None else utils.encode_hex(os.urandom(32))),
+        }
+        # chunks below next_chunk are all done, as are those in done
+        self.next_chunk = 0
+        self.done = set()
+        self.found = []
+        self.candidates = 0
+        self.seconds = 0.0
+
+    @property
+    def chunks(self):
+        """Number of chunks, or None if the search has no end."""
+        if self.params['address'] is None:
+            return None
+        return -(-(self.params['max_nonce'] + 1) // self.params['chunk_size'])
+
+    def pending(self):
+        """Yields the chunks left to search, in order."""
+        chunk = self.next_chunk
+        while self.chunks is None or chunk < self.chunks:
+            if chunk not in self.done:
+                yield chunk
+            chunk += 1
+
+    def complete(self, chunk, found, candidates):
+        self.done.add(chunk)
+        while self.next_chunk in self.done:
+            self.done.remove(self.next_chunk)
+            self.next_chunk += 1
+        self.found.extend(found)
+        self.candidates += candidates
+
+    @property
+    def rate(self):
+        return self.candidates / self.seconds if self.seconds else 0.0
+
+    def save(self, path):
+        data = dict(self.params, version=CHECKPOINT_VERSION, next_chunk=self.next_chunk,
+                    done=sorted(self.done), found=self.found,
+                    candidates=self.candidates, seconds=self.seconds)
+        # the checkpoint holds the seed of the keys, and the keys found
+        with atomic_write(path, 0o600) as fd:
+            json.dump(data, fd, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fd:
+            data = json.load(fd)
+        if data.get('version') != CHECKPOINT_VERSION:
+            raise ValueError("{}: unsupported checkpoint version {!r}".format(
+                path, data.get('version')))
+        search = cls(data['zero_bytes'], data['max_nonce'], data['address'],
+                     data['chunk_size'], data['seed'])
+        search.next_chunk = data['next_chunk']
+        search.done = set(data['done'])
+        search.found = data['found']
+        search.candidates = data['candidates']
+        search.seconds = data['seconds']
+        return search
+
+
+def run(search, processes=None, count=1, checkpoint=None, checkpoint_every=30.0,
+        report=print):
+    """Searches until `count` matches are found (None: until the search
+    space or the process ends), saving the checkpoint every
+    `checkpoint_every` seconds and when done. Returns the first `count`
+    matches; the search (and its checkpoint) keeps all those found in the
+    chunks completed, which can be more.
+    """
+    workers = processes or os.cpu_count() or 1
+    pending = search.pending()
+    last_save = started = time.time()
+    seconds_before = search.seconds
+
+    def enough():
+        return count is not None and len(search.found) >= count
+
+    def save():
+        search.seconds = seconds_before + time.time() - started
+        search.save(checkpoint)
+
+    with ProcessPoolExecutor(workers) as pool:
+        running = {}
+
+        def submit():
+            # keep two chunks queued per worker
+            while len(running) < 2 * workers and not enough():
+                chunk = next(pending, None)
+                if chunk is None:
+                    return
+                running[pool.submit(search_chunk, (chunk, search.params))] = chunk
+
+        try:
+            submit()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    chunk, found, candidates = future.result()
+                    search.complete(chunk, found, candidates)
+                    for match in found:
+                        report("found {address} at nonce {nonce} of {deployer}".format(**match))
+                if enough():
+                    break
+                submit()
+                if checkpoint and time.time() - last_save > checkpoint_every:
+                    save()
+                    last_save = time.time()
+                    report("{} candidates, {:.0f}/s".format(search.candidates, search.rate))
+        finally:
+            for future in running:
+                future.cancel()
+            search.seconds = seconds_before + time.time() - started
+            if checkpoint:
+                save()
+    return search.found if count is None else search.found[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Searches for CREATE addresses with leading zero bytes.')
+    parser.add_argument('--zero-bytes', type=int, default=3, help='leading zero bytes wanted')
+    parser.add_argument('--max-nonce', type=int, default=200,
+                        help='highest deployer nonce to consider')
+    parser.add_argument('--address', help='only search the nonces of this deployer')
+    parser.add_argument('--count', type=int, default=1, help='stop after this many matches')
+    parser.add_argument('--checkpoint', help='file to save the search to and resume it from')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--savings', action='store_true',
+                        help='only print the gas each leading zero byte saves')
+    args = parser.parse_args()
+    if args.zero_bytes < 1:
+        parser.error('--zero-bytes must be at least 1')
+
+    if args.savings:
+        print("zero bytes  child bytes  gas saved/token  by this byte  expected candidates")
+        for n, length, saved, marginal, expected in savings():
+            print("{:>10} {:>12} {:>16} {:>13} {:>20}".format(n, length, saved, marginal, expected))
+        return
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        search = Search.load(args.checkpoint)
+        print("resuming: {} candidates searched, {} found".format(
+            search.candidates, len(search.found)))
+    else:
+        address = None
+        if args.address:
+            address = utils.encode_hex(utils.normalize_address(args.address))
+        search = Search(args.zero_bytes, args.max_nonce, address)
+
+    n = search.params['zero_bytes']
+    print("searching for {} leading zero bytes: expect {} candidates per match; "
+          "each token minted then saves {} gas against an address without zero bytes".format(
+              n, 256**n, op.GCONTRACTBYTE * n))
+    try:
+        found = run(search, args.jobs, args.count, args.checkpoint)
+    except KeyboardInterrupt:
+        found = search.found
+        print("interrupted")
+    print("{} candidates in {:.1f}s, {:.0f} addresses/s".format(
+        search.candidates, search.seconds, search.rate))
+    if search.rate:
+        print("expected time per match: {:.0f}s".format(256**n / search.rate))
+    for match in found:
+        print(json.dumps(match, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
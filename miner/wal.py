@@ -0,0 +1,168 @@
+"""Crash-safe write-ahead log of the miner's transactions.
+
+Every transaction the miner sends (including replacements) is appended to
+the log as one JSON line with its nonce, hash, gas price and send time, and
+the file is fsync'd before the send is considered done. Signed transactions
+are logged before they are submitted. A transaction the node signs only gets
+its hash from eth_sendTransaction, so an intent record with a null hash is
+logged before it is sent and the hash once the node returns it. Mined nonces
+are recorded with `{"confirmed": count}` lines, meaning every nonce below
+count has been mined.
+
+Replaying the log after a crash yields the transactions that may still be
+in flight, which the engine reconciles with the node instead of guessing
+from "known transaction" errors. A torn last line, left by a crash in the
+middle of a write, is dropped. The log is compacted down to the outstanding
+transactions after every `compact_every` appended records.
+"""
+
+import collections
+import json
+import os
+
+# all hashes sent for one nonce, oldest first (empty if only an intent to
+# send was logged), with the price and time of the latest send
+Entry = collections.namedtuple('Entry', 'nonce tx_hashes gas_price sent_at')
+
+
+def replay(path):
+    """Reads the log at `path`. Returns (confirmed, entries, good_size)
+    where `entries` maps every nonce >= confirmed to its Entry and
+    `good_size` is the length of the file without a torn last line.
+    """
+    confirmed = 0
+    entries = {}
+    good_size = 0
+    if not os.path.exists(path):
+        return confirmed, entries, good_size
+    with open(path, 'rb') as fd:
+        lines = fd.read().split(b'\n')
+    # a complete file ends with a newline, so the last piece is b''
+    for i, line in enumerate(lines):
+        try:
+            record = json.loads(line.decode()) if line else None
+        except ValueError:
+            if i == len(lines) - 1:
+                break
+            raise ValueError("{}: corrupt record on line {}".format(path, i + 1))
+        if i < len(lines) - 1:
+            good_size += len(line) + 1
+        if record is None:
+            continue
+        if 'confirmed' in record:
+            confirmed = max(confirmed, record['confirmed'])
+            for nonce in [n for n in entries if n < confirmed]:
+                del entries[nonce]
+        elif record['nonce'] >= confirmed:
+            old = entries.get(record['nonce'])
+            hashes = old.tx_hashes if old is not None else []
+            if record['hash'] is not None:
+                hashes = hashes + [record['hash']]
+            entries[record['nonce']] = Entry(record['nonce'], hashes,
+                                             record['gas_price'], record['sent_at'])
+    return confirmed, entries, good_size
+
+
+def _write_records(fd, records):
+    data = b''.join(json.dumps(record, sort_keys=True).encode() + b'\n'
+                    for record in records)
+    while data:
+        data = data[os.write(fd, data):]
+    os.fsync(fd)
+
+
+class WriteAheadLog(object):
+
+    def __init__(self, path, compact_every=10000):
+        self.path = path
+        self.compact_every = compact_every
+        self.confirmed = 0
+        # nonce -> Entry, for every nonce >= confirmed that has been sent
+        self.entries = {}
+        self._fd = None
+        self._records = 0
+
+    def open(self):
+        self.confirmed, self.entries, good_size = replay(self.path)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        # cut off a torn last record so new records start on a fresh line
+        os.ftruncate(self._fd, good_size)
+        self._sync_dir()
+        return self
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _sync_dir(self):
+        fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _append(self, records):
+        _write_records(self._fd, records)
+        self._records += len(records)
+
+    def sending(self, nonces, gas_price, sent_at):
+        """Logs the intent to send `nonces` at `gas_price`, for transactions
+        whose hash is only known once they have been sent.
+        """
+        records = []
+        for nonce in nonces:
+            if nonce < self.confirmed:
+                continue
+            old = self.entries.get(nonce)
+            self.entries[nonce] = Entry(nonce, old.tx_hashes if old is not None else [],
+                                        gas_price, sent_at)
+            records.append({'nonce': nonce, 'hash': None,
+                            'gas_price': gas_price, 'sent_at': sent_at})
+        if records:
+            self._append(records)
+
+    def sent(self, sends, gas_price, sent_at):
+        """Logs `sends`, a list of (nonce, tx hash), all sent at `gas_price`."""
+        records = []
+        for nonce, tx_hash in sends:
+            if tx_hash is None or nonce < self.confirmed:
+                continue
+            old = self.entries.get(nonce)
+            hashes = (old.tx_hashes if old is not None else []) + [tx_hash]
+            self.entries[nonce] = Entry(nonce, hashes, gas_price, sent_at)
+            records.append({'nonce': nonce, 'hash': tx_hash,
+                            'gas_price': gas_price, 'sent_at': sent_at})
+        if records:
+            self._append(records)
+
+    def confirm_below(self, count):
+        if count <= self.confirmed:
+            return
+        self.confirmed = count
+        for nonce in [n for n in self.entries if n < count]:
+            del self.entries[nonce]
+        self._append([{'confirmed': count}])
+        if self._records >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Rewrites the log with just the outstanding transactions."""
+        tmp = self.path + '.tmp'
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        records = [{'confirmed': self.confirmed}]
+        for nonce in sorted(self.entries):
+            entry = self.entries[nonce]
+            # replay only keeps the price and time of the latest send anyway
+            records.extend({'nonce': nonce, 'hash': tx_hash,
+                            'gas_price': entry.gas_price, 'sent_at': entry.sent_at}
+                           for tx_hash in entry.tx_hashes or [None])
+        try:
+            _write_records(fd, records)
+        finally:
+            os.close(fd)
+        os.rename(tmp, self.path)
+        self._sync_dir()
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self._records = 0
@@ -0,0 +1,73 @@
+"""Sliding window of in-flight mint transactions.
+
+Rather than sending a batch and waiting for all of it to be mined, the
+engine keeps `size` transactions in flight and tops the window up as soon
+as nonces confirm.
+
+With `size=None` the window sizes itself by Little's law: to sustain a
+rate of r transactions per second when a transaction takes W seconds to be
+included, r * W transactions have to be in flight. W is a moving average of
+observed inclusion latencies and r comes from the price controller.
+"""
+
+import collections
+import math
+
+
+class Window(object):
+
+    def __init__(self, size=None, min_size=1, max_size=64, smoothing=0.2,
+                 initial_size=None):
+        self.auto = size is None
+        if size is None:
+            size = min_size if initial_size is None else initial_size
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.smoothing = smoothing
+        # exponential moving average of inclusion latency, in seconds
+        self.latency = None
+        # nonce -> time sent, in nonce order
+        self.in_flight = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.in_flight)
+
+    def free_slots(self):
+        return max(self.size - len(self.in_flight), 0)
+
+    def sent(self, nonce, sent_at):
+        self.in_flight[nonce] = sent_at
+
+    def oldest(self):
+        """Returns (nonce, time sent) of the oldest in-flight transaction,
+        or None if the window is empty.
+        """
+        for item in self.in_flight.items():
+            return item
+        return None
+
+    def confirm(self, nonce, confirmed_at):
+        """Removes `nonce` from the window and records its inclusion latency.
+        Returns the time it was sent, or None if it was not in flight.
+        """
+        sent_at = self.in_flight.pop(nonce, None)
+        if sent_at is not None:
+            self.observe(confirmed_at - sent_at)
+        return sent_at
+
+    def observe(self, latency):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+
+    def resize(self, rate):
+        """Resizes an automatic window to sustain `rate` transactions per
+        second at the observed inclusion latency.
+        """
+        if not self.auto or not rate or self.latency is None:
+            return self.size
+        size = int(math.ceil(rate * self.latency))
+        self.size = min(max(size, self.min_size), self.max_size)
+        return self.size
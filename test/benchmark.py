@@ -0,0 +1,159 @@
+"""Gas benchmarks of mint and the free* functions, with regression checks.
+
+For every variant (the contracts compiled from source and their deployed
+.asm bytecode), mint and the free* functions are run for the token counts
+test.calibrate uses, and the base and per-token gas of each function are
+fitted, along with the wall time the tester took:
+
+    $ python -m test.benchmark --json bench.json
+    $ python -m test.benchmark --baseline bench.json --variant GST2_ETH
+
+With --baseline, the results are compared with a stored run, and the
+command fails if a base or per-token cost grew by more than --tolerance
+(a fraction, 0 by default: gas on the tester is deterministic) or, if
+--max-slowdown is given, if a function's wall time grew by more than that
+factor.
+"""
+
+import argparse
+import collections
+import json
+import sys
+import time
+
+from .calibrate import FREE_FUNCTIONS, fit, measure_free, measure_mint
+from .compile_cache import solc_version
+from .gas_profile import VARIANTS, suites
+
+# bump when the layout of the JSON output changes
+FORMAT_VERSION = 1
+
+FUNCTIONS = ('mint',) + tuple(FREE_FUNCTIONS)
+
+# base and per_token are the fitted gas (excluding input data; the free*
+# functions' base includes TestHelper's CALL), residual the largest
+# deviation from the fit, zero the gas of mint(0) and seconds the wall
+# time of the `transactions` measured
+Result = collections.namedtuple(
+    'Result', 'base per_token residual zero seconds transactions')
+
+
+def _fit(samples):
+    counted = [(x, gas) for x, gas in samples if x > 0]
+    (base, per_token), residual = fit(
+        [[1] * len(counted), [x for x, _ in counted]], [gas for _, gas in counted])
+    return base, per_token, residual
+
+
+def benchmark_variant(variant):
+    """Returns the Results of `variant`'s functions, by name."""
+    suite = suites()[variant][0]
+    suite.setUpClass()
+    results = collections.OrderedDict()
+    for function in FUNCTIONS:
+        if getattr(suite.c, function, None) is None:
+            continue
+        start = time.perf_counter()
+        if function == 'mint':
+            samples = measure_mint(suite)
+        else:
+            samples = measure_free(suite, function)
+        seconds = time.perf_counter() - start
+        base, per_token, residual = _fit(samples)
+        zero = dict(samples).get(0)
+        results[function] = Result(base, per_token, residual, zero, seconds, len(samples))
+    return results
+
+
+def to_json(results):
+    return {
+        'version': FORMAT_VERSION,
+        'solc': solc_version(),
+        'variants': dict((variant, dict((function, result._asdict())
+                                        for function, result in functions.items()))
+                         for variant, functions in results.items()),
+    }
+
+
+def load(path):
+    with open(path) as fd:
+        data = json.load(fd)
+    if data.get('version') != FORMAT_VERSION:
+        raise ValueError("{}: unsupported benchmark version {!r}".format(
+            path, data.get('version')))
+    return data
+
+
+def compare(results, baseline, tolerance=0.0, max_slowdown=None):
+    """Returns the regressions of `results` against the JSON `baseline`, as
+    messages. Functions missing from the baseline are not compared.
+    """
+    regressions = []
+    for variant, functions in results.items():
+        for function, result in functions.items():
+            old = baseline['variants'].get(variant, {}).get(function)
+            if old is None:
+                continue
+            for field in ('base', 'per_token', 'zero'):
+                new_value, old_value = getattr(result, field), old[field]
+                if new_value is None or old_value is None:
+                    continue
+                if new_value > old_value + tolerance * abs(old_value):
+                    regressions.append("{} {} {}: {} gas, was {}".format(
+                        variant, function, field, new_value, old_value))
+            if max_slowdown is not None and result.seconds > max_slowdown * old['seconds']:
+                regressions.append("{} {}: {:.2f}s, was {:.2f}s".format(
+                    variant, function, result.seconds, old['seconds']))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    lines = ['{:<14} {:<13} {:>8} {:>9} {:>8} {:>9}'.format(
+        'variant', 'function', 'base', 'per token', 'resid.', 'seconds')]
+    for variant, functions in results.items():
+        for function, result in functions.items():
+            line = '{:<14} {:<13} {:>8} {:>9} {:>8.0f} {:>9.2f}'.format(
+                variant, function, result.base, result.per_token, result.residual,
+                result.seconds)
+            old = (baseline or {}).get('variants', {}).get(variant, {}).get(function)
+            if old is not None:
+                line += '   ({:+} base, {:+} per token)'.format(
+                    result.base - old['base'], result.per_token - old['per_token'])
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the gas of the GasToken functions.')
+    parser.add_argument('--variant', action='append', choices=VARIANTS,
+                        help='contract to benchmark, may be repeated (default: all)')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results to compare with, fails on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='allowed relative growth of a gas cost (default: 0)')
+    parser.add_argument('--max-slowdown', type=float,
+                        help='allowed factor of wall time growth (default: not checked)')
+    args = parser.parse_args()
+
+    baseline = load(args.baseline) if args.baseline else None
+    results = collections.OrderedDict()
+    for variant in args.variant or VARIANTS:
+        results[variant] = benchmark_variant(variant)
+    print(format_results(results, baseline))
+
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump(to_json(results), fd, indent=1, sort_keys=True)
+            fd.write('\n')
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.max_slowdown)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        if regressions:
+            sys.exit(1)
+        print('no regressions against {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
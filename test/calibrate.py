@@ -0,0 +1,255 @@
+"""Fits the gas cost model (miner/cost_model.json) on the tester chain.
+
+    $ python -m test.calibrate                       # all variants, writes the model
+    $ python -m test.calibrate --variant GST1 --dry-run
+
+For every variant, mint and the free* functions are run for a sweep of
+token counts, the gas of the transaction's input data is subtracted, and
+the base and per-token costs are fitted by least squares. The free* calls
+go through TestHelper, like in test_free_cost_and_refund, and start from a
+fresh deployment, so GST2 only frees children with nonces below 128. The
+RLP constants are fitted from Rlp.mk_contract_address over nonces of every
+length.
+
+The fitted constants are rounded to whole gas; the largest residual of each
+fit is printed and stored in the model's calibration info, so a fit that no
+longer describes the contract shows up at once.
+"""
+
+import argparse
+import collections
+import hashlib
+import os
+
+import numpy as np
+from ethereum import utils
+
+from miner.costmodel import CostModel, VariantCosts, RlpCosts, MODEL_PATH
+
+from .compile_cache import solc_version
+from .generic_gas_token import input_data_cost
+from .instrumentation import record_tx
+
+CONTRACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir, 'contract')
+
+MINT_AMOUNTS = [0, 1, 2, 3, 4, 5, 10, 20, 50, 100, 255, 256, 257, 500, 1000]
+# small enough that mint(sum + 11) stays below nonce 128 in GST2
+FREE_AMOUNTS = [0, 1, 2, 3, 4, 5, 10, 20, 30, 40]
+FREE_FUNCTIONS = collections.OrderedDict([
+    # name: (helper function, needs_transfer)
+    ('free', ('burnGasAndFree', True)),
+    ('freeUpTo', ('burnGasAndFreeUpTo', True)),
+    ('freeFrom', ('burnGasAndFreeFrom', False)),
+    ('freeFromUpTo', ('burnGasAndFreeFromUpTo', False)),
+])
+RLP_NONCES = [0, 1, 2, 5, 100, 127] + sorted(set(
+    n for length in range(1, 10)
+    for n in (256**(length - 1), 256**(length - 1) + 1, 2 * 256**(length - 1) + 7, 256**length - 1)
+    if n > 127))
+
+# contracts of each variant, to tell which sources a calibration is for
+SOURCES = {
+    'GST1': ['GST1.sol', 'test_helper.sol'],
+    'GST2_ETH': ['GST2_ETH.sol', 'rlp.sol', 'test_helper.sol'],
+    'GST2_ETC': ['GST2_ETC.sol', 'rlp.sol', 'test_helper.sol'],
+}
+
+
+def _suites():
+    from .test_GST1 import TestGST1
+    from .test_GST2 import TestGST2, TestGST2ETC
+    return collections.OrderedDict([
+        ('GST1', TestGST1),
+        ('GST2_ETH', TestGST2),
+        ('GST2_ETC', TestGST2ETC),
+    ])
+
+
+def fit(columns, y):
+    """Least squares fit of y ~ columns. Returns the coefficients rounded to
+    whole gas and the largest absolute residual of the rounded fit.
+    """
+    a = np.array(columns, dtype=np.float64).T
+    y = np.array(y, dtype=np.float64)
+    coefficients = np.linalg.lstsq(a, y, rcond=None)[0]
+    coefficients = [int(round(c)) for c in coefficients]
+    residual = np.abs(a.dot(coefficients) - y).max() if len(y) else 0.0
+    return coefficients, float(residual)
+
+
+def _gas(chain, func):
+    before = chain.head_state.gas_used
+    func()
+    return chain.head_state.gas_used - before
+
+
+def measure_mint(suite):
+    """Returns [(tokens, gas - input data)], after a first mint that
+    initializes the storage of the minter, like test_mint_scaling.
+    """
+    s, t, c = suite.s, suite.t, suite.c
+    s.revert(suite.initial_state)
+    c.mint(1, sender=t.k1, startgas=10 ** 20)
+    return [(x, _gas(s, lambda: c.mint(x, sender=t.k1, startgas=10 ** 20)) - input_data_cost(x))
+            for x in MINT_AMOUNTS]
+
+
+def measure_free(suite, name):
+    """Returns [(tokens, gas - input data)] of `name` called through the
+    helper, excluding the gas the helper burns and before the refund.
+    """
+    s, t, c, helper = suite.s, suite.t, suite.c, suite.helper
+    helper_function, needs_transfer = FREE_FUNCTIONS[name]
+    s.revert(suite.initial_state)
+
+    # a refund is capped at half the gas used, so burn enough to see it all
+    ideal_burn = max(FREE_AMOUNTS) * suite.REFUND * 2 + 1000
+    actual_burn = _gas(s, lambda: helper.burnGas(ideal_burn, startgas=10 ** 20))
+    c.approve(helper.address, 2 ** 128, sender=t.k1)
+    c.mint(sum(FREE_AMOUNTS) + 11, sender=t.k1, startgas=10 ** 20)
+    # the model is of calls that find GST2's s_tail non-zero, like all but
+    # the first free does
+    c.free(1, sender=t.k1)
+    if needs_transfer:
+        c.transfer(helper.address, sum(FREE_AMOUNTS) + 1, sender=t.k1)
+
+    samples = []
+    for x in FREE_AMOUNTS:
+        call = lambda: getattr(helper, helper_function)(c.address, ideal_burn, x,
+                                                         sender=t.k1, startgas=10 ** 20)
+        before = s.head_state.gas_used
+        record = record_tx(call)
+        gas = s.head_state.gas_used - before - actual_burn + record.refund
+        samples.append((x, gas - input_data_cost(x)))
+    return samples
+
+
+def calibrate_variant(suite):
+    """Returns the VariantCosts of `suite`'s contract and the largest
+    residuals of its fits.
+    """
+    suite.setUpClass()
+
+    mint = measure_mint(suite)
+    counted = [(x, gas) for x, gas in mint if x > 0]
+    (mint_base, mint_token), mint_residual = fit(
+        [[1] * len(counted), [x for x, _ in counted]], [gas for _, gas in counted])
+    mint_zero = dict(mint)[0]
+    # mint(0) is only kept when it does not follow the fit (GST1 returns early)
+    if abs(mint_zero - mint_base) <= 0.01 * mint_base:
+        mint_zero = None
+
+    # all free* functions share the per-token cost, each has its own base
+    names = [name for name in FREE_FUNCTIONS if getattr(suite.c, name, None) is not None]
+    columns = [[] for _ in range(len(names) + 1)]
+    y = []
+    for i, name in enumerate(names):
+        for x, gas in measure_free(suite, name):
+            for j in range(len(names)):
+                columns[j].append(1 if i == j else 0)
+            columns[-1].append(x)
+            y.append(gas)
+    coefficients, free_residual = fit(columns, y)
+    bases = dict(zip(names, coefficients))
+
+    costs = VariantCosts(
+        mint_zero=mint_zero,
+        mint_base=mint_base,
+        mint_token=mint_token,
+        free_base=bases.get('free'),
+        free_up_to_base=bases.get('freeUpTo'),
+        free_from_base=bases.get('freeFrom'),
+        free_from_up_to_base=bases.get('freeFromUpTo'),
+        free_token=coefficients[-1])
+    return costs, {'mint': mint_residual, 'free': free_residual}
+
+
+def calibrate_rlp():
+    from .test_rlp import TestRLP, RLP_BASE
+    TestRLP.setUpClass()
+    s, c = TestRLP.s, TestRLP.c
+    s.revert(TestRLP.initial_state)
+    address = '0000000000b3f879cb30fe243b4dfee438691c04'
+    address_cost = input_data_cost(utils.decode_int(utils.decode_hex(address)), num_bytes=20)
+
+    samples = []
+    for nonce in RLP_NONCES:
+        gas = _gas(s, lambda: c.mk_contract_address(address, nonce))
+        samples.append((nonce, gas - RLP_BASE - input_data_cost(nonce) - address_cost))
+
+    zero = [gas for nonce, gas in samples if nonce == 0]
+    small = [gas for nonce, gas in samples if 0 < nonce <= 127]
+    large = [(nonce, gas) for nonce, gas in samples if nonce > 127]
+    (zero_nonce,), zero_residual = fit([[1] * len(zero)], zero)
+    (small_nonce,), small_residual = fit([[1] * len(small)], small)
+    (base, per_byte, discount), large_residual = fit(
+        [[1] * len(large),
+         [(nonce.bit_length() + 7) // 8 for nonce, _ in large],
+         [-1 if nonce >= 256**8 else 0 for nonce, _ in large]],
+        [gas for _, gas in large])
+    rlp = RlpCosts(zero_nonce=zero_nonce, small_nonce=small_nonce, base=base,
+                   per_byte=per_byte, nine_byte_discount=discount)
+    return rlp, max(zero_residual, small_residual, large_residual)
+
+
+def _source_hashes(names):
+    hashes = {}
+    for name in names:
+        with open(os.path.join(CONTRACT_DIR, name), 'rb') as fd:
+            hashes[name] = hashlib.sha256(fd.read()).hexdigest()
+    return hashes
+
+
+def main():
+    suites = _suites()
+    parser = argparse.ArgumentParser(description='Fits the gas cost model on the tester chain.')
+    parser.add_argument('--variant', action='append', choices=list(suites),
+                        help='variant to calibrate, may be repeated (default: all); '
+                             'the others keep their current constants')
+    parser.add_argument('--no-rlp', action='store_true',
+                        help='keep the current RLP constants')
+    parser.add_argument('--model', default=MODEL_PATH, help='cost model file to update')
+    parser.add_argument('--dry-run', action='store_true', help='only print the fitted constants')
+    args = parser.parse_args()
+
+    model = CostModel.load(args.model)
+    calibration = dict(model.calibration)
+    calibration.pop('note', None)
+    calibration['solc'] = solc_version()
+    calibration.setdefault('variants', {})
+
+    for name in args.variant or suites:
+        costs, residuals = calibrate_variant(suites[name])
+        old = model.variants.get(name)
+        print(name)
+        for field in VariantCosts._fields:
+            before = getattr(old, field) if old is not None else None
+            after = getattr(costs, field)
+            print('  {:<22} {:>8} -> {:>8}{}'.format(
+                field, str(before), str(after), '' if before == after else '  *'))
+        print('  largest residual: mint {:.0f}, free {:.0f} gas'.format(
+            residuals['mint'], residuals['free']))
+        model.variants[name] = costs
+        calibration['variants'][name] = {'residuals': residuals,
+                                         'sources': _source_hashes(SOURCES[name])}
+
+    if not args.no_rlp:
+        rlp, residual = calibrate_rlp()
+        print('rlp')
+        for field in RlpCosts._fields:
+            before, after = getattr(model.rlp, field), getattr(rlp, field)
+            print('  {:<22} {:>8} -> {:>8}{}'.format(
+                field, before, after, '' if before == after else '  *'))
+        print('  largest residual: {:.0f} gas'.format(residual))
+        model.rlp = rlp
+        calibration['rlp'] = {'residual': residual, 'sources': _source_hashes(['rlp.sol'])}
+
+    model.calibration = calibration
+    if not args.dry_run:
+        model.save(args.model)
+        print('wrote {}'.format(args.model))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""On-disk cache of solc output for the test suites.
+
+Compiling a source hashes it, together with the sources it imports, the
+solc version and the compiler flags. If the hash is in the cache, the
+combined-json output stored there is used and solc is not started at all.
+The solc version is itself remembered per solc binary (keyed by its path,
+size and mtime), so a warm run never executes solc.
+
+The cache lives in .solc_cache/ at the repository root, or wherever the
+GASTOKEN_SOLC_CACHE environment variable points.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+
+from ethereum.abi import ContractTranslator
+from ethereum.tools._solidity import solc_parse_output
+from ethereum.tools.tester import k0, STARTGAS, GASPRICE, ABIContract
+
+from miner.files import atomic_write
+
+CACHE_DIR = os.environ.get(
+    'GASTOKEN_SOLC_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '.solc_cache'))
+
+IMPORT_RE = re.compile(r'^\s*import\s+"([^"]+)"\s*;', re.MULTILINE)
+
+_solc_version = None
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as fd:
+        fd.write(data)
+
+
+def solc_version():
+    global _solc_version
+    if _solc_version is None:
+        solc = shutil.which('solc')
+        if solc is None:
+            raise RuntimeError("solc not found")
+        st = os.stat(os.path.realpath(solc))
+        identity = '{}:{}:{}'.format(os.path.realpath(solc), st.st_size, st.st_mtime_ns)
+
+        versions_path = os.path.join(CACHE_DIR, 'versions.json')
+        versions = {}
+        if os.path.exists(versions_path):
+            with open(versions_path) as fd:
+                versions = json.load(fd)
+        if identity not in versions:
+            versions[identity] = subprocess.check_output([solc, '--version']).decode().strip()
+            _write(versions_path, json.dumps(versions, indent=1, sort_keys=True))
+        _solc_version = versions[identity]
+    return _solc_version
+
+
+def _imported_sources(source, base_dir, seen):
+    for path in IMPORT_RE.findall(source):
+        path = os.path.normpath(os.path.join(base_dir, path))
+        if path in seen:
+            continue
+        with open(path) as fd:
+            imported = fd.read()
+        seen[path] = imported
+        _imported_sources(imported, os.path.dirname(path), seen)
+    return seen
+
+
+def _cache_key(source, name, args, base_dir):
+    h = hashlib.sha256()
+    h.update(solc_version().encode())
+    h.update(json.dumps(args).encode())
+    h.update(name.encode())
+    h.update(source.encode())
+    for path, imported in sorted(_imported_sources(source, base_dir, {}).items()):
+        h.update(path.encode())
+        h.update(imported.encode())
+    return h.hexdigest()
+
+
+def _compile(source, name, args, stdin=None, parse=True):
+    """Runs `solc args...` unless its output for `source` is cached.
+    `name` is the path solc is given, or '-' to read the source from stdin.
+    Returns the contracts as parsed by pyethereum, or with parse=False the
+    whole combined-json output (which also has the sourceList).
+    """
+    base_dir = os.path.dirname(name) if stdin is None else '.'
+    entry = os.path.join(CACHE_DIR, _cache_key(source, name, args, base_dir) + '.json')
+    if os.path.exists(entry):
+        with open(entry) as fd:
+            output = fd.read()
+    else:
+        output = subprocess.run(['solc'] + args + [name], input=stdin,
+                                stdout=subprocess.PIPE, check=True).stdout.decode()
+        _write(entry, output)
+    return solc_parse_output(output) if parse else json.loads(output)
+
+
+def compile_file(contract_path, optimize=False, combined='bin,abi', parse=True):
+    """Compiles the file at `contract_path` like
+    `solc --combined-json bin,abi contract_path`.
+    """
+    with open(contract_path) as fd:
+        source = fd.read()
+    args = ['--combined-json', combined] + (['--optimize'] if optimize else [])
+    return _compile(source, contract_path, args, parse=parse)
+
+
+def compile_source(source, optimize=True, combined='bin,abi', parse=True):
+    """Compiles `source` from stdin. Optimizes by default, as pyethereum's
+    tester does when given solidity source.
+    """
+    args = ['--combined-json', combined] + (['--optimize'] if optimize else [])
+    return _compile(source, '-', args, stdin=source.encode(), parse=parse)
+
+
+def contract_data(result, contract_name):
+    """Returns the abi and bin of `contract_name` from parsed solc output."""
+    for key, data in result.items():
+        if key == contract_name or key.endswith(':' + contract_name):
+            return data
+    raise KeyError(contract_name)
+
+
+def deploy(data, chain, sender=k0, value=0, startgas=STARTGAS, gasprice=GASPRICE,
+           *args):
+    ct = ContractTranslator(data['abi'])
+    code = data['bin'] \
+           + (ct.encode_constructor_arguments(args) if args else b'')
+    addr = chain.tx(
+        sender=sender,
+        to=b'',
+        value=value,
+        data=code,
+        startgas=startgas,
+        gasprice=gasprice)
+    contract = ABIContract(chain, ct, addr)
+    # kept so that fixtures.py can store the contract
+    contract.abi = data['abi']
+    return contract
+
+
+def deploy_solidity_contract(contract_path, contract_name,
+                             chain, sender=k0, value=0,
+                             startgas=STARTGAS, gasprice=GASPRICE, *args):
+    data = contract_data(compile_file(contract_path), contract_name)
+    return deploy(data, chain, sender, value, startgas, gasprice, *args)
+
+
+def deploy_solidity_source(source, contract_name, chain, sender=k0, value=0,
+                           startgas=STARTGAS, gasprice=GASPRICE, *args):
+    """Cached replacement for chain.contract(source, language='solidity')."""
+    data = contract_data(compile_source(source), contract_name)
+    return deploy(data, chain, sender, value, startgas, gasprice, *args)
@@ -0,0 +1,95 @@
+"""Pre-deployed chain state fixtures for the GasToken test suites.
+
+Deploying the token contracts (and, for GST2, reaching the magic deployment
+nonce) is done once per suite and contract version: the resulting state is
+serialized with State.to_snapshot() and stored next to the compiled
+contracts (see compile_cache.py), along with the addresses and ABIs of the
+deployed contracts. Later runs load the state with State.from_snapshot()
+instead of deploying again.
+
+Fixtures are keyed by the suite, the contents of contract/, the solc
+version and the source of the suite's build function (with the methods it
+overrides), so changing a contract source, its deployed bytecode or how the
+suite deploys it invalidates them.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+
+from ethereum.abi import ContractTranslator
+from ethereum.state import State
+from ethereum.tools.tester import ABIContract
+from ethereum import utils
+
+from miner.files import atomic_write
+
+from .compile_cache import CACHE_DIR, solc_version
+
+CONTRACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir, 'contract')
+FIXTURE_DIR = os.path.join(CACHE_DIR, 'fixtures')
+
+# bump when the way the suites build their chains changes outside of their
+# build functions (e.g. in helpers those call)
+FIXTURE_VERSION = 1
+
+
+def _build_source(build):
+    """Source of `build` and, if it is a method, of every definition of it
+    up the class hierarchy, which overrides usually extend with super().
+    """
+    owner = getattr(build, '__self__', None)
+    if owner is None:
+        return inspect.getsource(build)
+    cls = owner if isinstance(owner, type) else type(owner)
+    sources = []
+    for klass in cls.__mro__:
+        method = klass.__dict__.get(build.__name__)
+        if method is not None:
+            sources.append(inspect.getsource(getattr(method, '__func__', method)))
+    return ''.join(sources)
+
+
+def _fixture_path(name, build):
+    h = hashlib.sha256()
+    h.update('{} {} {}'.format(FIXTURE_VERSION, name, solc_version()).encode())
+    h.update(_build_source(build).encode())
+    for filename in sorted(os.listdir(CONTRACT_DIR)):
+        with open(os.path.join(CONTRACT_DIR, filename), 'rb') as fd:
+            h.update(filename.encode())
+            h.update(fd.read())
+    return os.path.join(FIXTURE_DIR, '{}-{}.json'.format(name, h.hexdigest()[:16]))
+
+
+def load(name, chain, build):
+    """Brings `chain` into the state of fixture `name` and returns its
+    contracts as a dict of ABIContracts. On a cache miss, `build()` deploys
+    the contracts on `chain` and returns that dict, and the resulting state
+    is stored.
+    """
+    path = _fixture_path(name, build)
+    if os.path.exists(path):
+        with open(path) as fd:
+            fixture = json.load(fd)
+        chain.head_state = State.from_snapshot(fixture['state'], chain.head_state.env)
+        contracts = {}
+        for key, contract in fixture['contracts'].items():
+            contracts[key] = ABIContract(chain, ContractTranslator(contract['abi']),
+                                         utils.decode_hex(contract['address']))
+            contracts[key].abi = contract['abi']
+        return contracts
+
+    contracts = build()
+    chain.head_state.commit()
+    fixture = {
+        'state': chain.head_state.to_snapshot(),
+        'contracts': {key: {'abi': contract.abi,
+                            'address': utils.encode_hex(contract.address)}
+                      for key, contract in contracts.items()},
+    }
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with atomic_write(path) as fd:
+        json.dump(fixture, fd)
+    return contracts
@@ -0,0 +1,418 @@
+"""Opcode-level gas profiler for calls on the tester chain.
+
+    $ python -m test.gas_profile free 10 --variant GST2_ETH --variant GST2_ETC
+    $ python -m test.gas_profile mint 10 --json mint.json
+
+Every call frame the VM executes (calls to the token, CREATEs of children,
+CALLs of children that SELFDESTRUCT) is tracked by wrapping vm.vm_execute,
+and pyethereum's 'eth.vm.op' trace gives the gas left before each
+instruction. The gas of an instruction is the difference to the next one in
+the same frame, minus what the frames it started used, so every unit of gas
+is counted exactly once. Gas is then summed by opcode, by contract and by
+function, where the function comes from solc's source map of the contract's
+runtime code (only available for contracts compiled from the sources in
+contract/, not for the .asm variants).
+"""
+
+import argparse
+import collections
+import json
+import logging
+import os
+import re
+
+from ethereum import utils, vm
+
+from .compile_cache import compile_file, compile_source
+from .instrumentation import TxRecorder
+
+CONTRACT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.pardir, 'contract')
+
+# slogging's level for the per-instruction VM trace
+TRACE = 5
+
+FUNCTION_RE = re.compile(r'\bfunction\s+(\w+)\s*\(')
+CONTRACT_RE = re.compile(r'\b(?:contract|library)\s+(\w+)')
+
+
+def _block_spans(source, regex):
+    """Yields (start, end, name) for every `regex` match followed by a block."""
+    for m in regex.finditer(source):
+        brace = source.find('{', m.end())
+        semicolon = source.find(';', m.end())
+        if brace < 0 or 0 <= semicolon < brace:
+            continue  # declaration without a body
+        depth = 0
+        for end in range(brace, len(source)):
+            if source[end] == '{':
+                depth += 1
+            elif source[end] == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+        yield m.start(), end + 1, m.group(1)
+
+
+def _instruction_offsets(code):
+    """Maps the pc of every instruction of `code` to its index."""
+    offsets = {}
+    pc = index = 0
+    while pc < len(code):
+        offsets[pc] = index
+        opcode = code[pc]
+        pc += 1 + (opcode - 0x5f if 0x60 <= opcode <= 0x7f else 0)
+        index += 1
+    return offsets
+
+
+class SourceMap(object):
+    """Maps program counters of a contract's runtime code to the name of the
+    solidity function they were compiled from.
+    """
+
+    def __init__(self, runtime, srcmap, sources):
+        self.runtime = runtime
+        self._offsets = _instruction_offsets(runtime)
+        self._functions = {}
+        for index, source in enumerate(sources):
+            contracts = list(_block_spans(source, CONTRACT_RE))
+            functions = list(_block_spans(source, FUNCTION_RE))
+            self._functions[index] = (contracts, functions)
+        # srcmap entries are s:l:f:j, with empty fields repeating the
+        # previous entry
+        self._entries = []
+        fields = ['0', '0', '0']
+        for item in srcmap.split(';'):
+            for i, field in enumerate(item.split(':')[:3]):
+                if field:
+                    fields[i] = field
+            self._entries.append((int(fields[0]), int(fields[1]), int(fields[2])))
+
+    @classmethod
+    def from_output(cls, output, contract_name, read_source):
+        """Builds the source map of `contract_name` from the combined-json
+        output of solc run with `bin-runtime,srcmap-runtime`. `read_source`
+        returns the text of a file of the output's sourceList.
+        """
+        for key, data in output['contracts'].items():
+            if key == contract_name or key.endswith(':' + contract_name):
+                sources = [read_source(name) for name in output['sourceList']]
+                return cls(utils.decode_hex(data['bin-runtime']),
+                           data['srcmap-runtime'], sources)
+        raise KeyError(contract_name)
+
+    def function_at(self, pc):
+        index = self._offsets.get(pc)
+        if index is None or index >= len(self._entries):
+            return '?'
+        start, length, source = self._entries[index]
+        if source < 0:
+            return '(generated)'
+        contracts, functions = self._functions[source]
+        # the innermost function around the mapped range, or the code the
+        # compiler generated for the contract as a whole (dispatch)
+        inner = None
+        for span in functions:
+            if span[0] <= start and start + length <= span[1]:
+                if inner is None or span[0] >= inner[0]:
+                    inner = span
+        if inner is not None:
+            return inner[2]
+        for span in contracts:
+            if span[0] <= start < span[1]:
+                return '{}.(dispatch)'.format(span[2])
+        return '?'
+
+
+class _Frame(object):
+
+    def __init__(self, label, source_map):
+        self.label = label
+        self.source_map = source_map
+        # (op, pc, gas) of the instructions executed so far
+        self.ops = []
+        # the instruction whose gas is not known yet, as (op, pc, gas left)
+        self.pending = None
+        # gas used by the frames the pending instruction started
+        self.child_gas = 0
+
+
+class Profile(object):
+    """Gas of one transaction, by opcode, contract and function."""
+
+    def __init__(self, name):
+        self.name = name
+        self.opcodes = collections.defaultdict(lambda: [0, 0])   # gas, count
+        self.contracts = collections.defaultdict(lambda: [0, 0])  # gas, frames
+        self.functions = collections.Counter()
+        self.execution = 0
+        self.record = None
+
+    def add(self, frame):
+        self.contracts[frame.label][1] += 1
+        for op, pc, gas in frame.ops:
+            self.opcodes[op][0] += gas
+            self.opcodes[op][1] += 1
+            self.contracts[frame.label][0] += gas
+            function = frame.source_map.function_at(pc) if frame.source_map else '?'
+            self.functions['{}.{}'.format(frame.label, function)] += gas
+
+    @property
+    def gas_before_refund(self):
+        return self.record.gas_used + self.record.refund
+
+    @property
+    def intrinsic(self):
+        """Gas charged before execution: the base fee and the input data."""
+        return self.gas_before_refund - self.execution
+
+    def to_json(self):
+        return {
+            'name': self.name,
+            'success': self.record.success,
+            'gas_used': self.record.gas_used,
+            'gas_before_refund': self.gas_before_refund,
+            'refund': self.record.refund,
+            'intrinsic': self.intrinsic,
+            'execution': self.execution,
+            'opcodes': {op: {'gas': gas, 'count': count}
+                        for op, (gas, count) in self.opcodes.items()},
+            'contracts': {label: {'gas': gas, 'frames': frames}
+                          for label, (gas, frames) in self.contracts.items()},
+            'functions': dict(self.functions),
+        }
+
+    def format_text(self, top=15):
+        lines = ['{}: {} gas used ({} before a refund of {}), {} intrinsic, {} executed'.format(
+            self.name, self.record.gas_used, self.gas_before_refund, self.record.refund,
+            self.intrinsic, self.execution)]
+
+        def table(title, rows):
+            lines.append('')
+            lines.append(title)
+            total = float(self.execution) or 1.0
+            for name, gas, extra in rows[:top]:
+                lines.append('  {:<40} {:>10} {:6.1%}  {}'.format(name, gas, gas / total, extra))
+            if len(rows) > top:
+                lines.append('  ... {} more'.format(len(rows) - top))
+
+        table('by opcode:', sorted(((op, gas, '{}x'.format(count))
+                                    for op, (gas, count) in self.opcodes.items()),
+                                   key=lambda row: -row[1]))
+        table('by contract:', sorted(((label, gas, '{} frames'.format(frames))
+                                      for label, (gas, frames) in self.contracts.items()),
+                                     key=lambda row: -row[1]))
+        table('by function:', sorted(((name, gas, '') for name, gas in self.functions.items()),
+                                     key=lambda row: -row[1]))
+        return '\n'.join(lines)
+
+
+class _TraceHandler(logging.Handler):
+
+    def __init__(self, profiler):
+        super(_TraceHandler, self).__init__(TRACE)
+        self.profiler = profiler
+
+    def emit(self, record):
+        kwargs = getattr(record, 'kwargs', None)
+        if kwargs and 'op' in kwargs:
+            self.profiler._step(kwargs['op'], int(kwargs['pc']), int(kwargs['gas']))
+
+
+class GasProfiler(object):
+    """Profiles the transactions sent by a function on a tester chain.
+
+    `labels` names contracts by address, `code_labels` by runtime code
+    (e.g. GST2's children), and `source_maps` maps runtime code to its
+    SourceMap.
+    """
+
+    def __init__(self, labels=None, code_labels=None, source_maps=None):
+        self.labels = dict((utils.normalize_address(a), l) for a, l in (labels or {}).items())
+        self.code_labels = dict(code_labels or {})
+        self.source_maps = dict(source_maps or {})
+        self._frames = []
+        self._profile = None
+
+    def _label(self, address, code):
+        label = self.labels.get(address)
+        if label is None:
+            label = self.code_labels.get(code, '0x' + utils.encode_hex(address))
+        return label
+
+    def _account(self, frame, gas_left):
+        if frame.pending is not None:
+            op, pc, gas = frame.pending
+            frame.ops.append((op, pc, gas - gas_left - frame.child_gas))
+        frame.child_gas = 0
+
+    def _step(self, op, pc, gas):
+        if not self._frames:
+            return
+        frame = self._frames[-1]
+        self._account(frame, gas)
+        frame.pending = (op, pc, gas)
+
+    def _vm_execute(self, ext, msg, code):
+        address = utils.normalize_address(msg.to)
+        creating = len(code) > 0 and len(ext.get_code(address)) == 0
+        if creating:
+            # init code: named after the code it deploys, once it is known
+            frame = _Frame(None, None)
+        else:
+            frame = _Frame(self._label(address, code), self.source_maps.get(code))
+        self._frames.append(frame)
+        try:
+            result = self._original_vm_execute(ext, msg, code)
+        finally:
+            self._frames.pop()
+        success, gas_left, output = result
+        if not success:
+            gas_left = 0
+        if creating:
+            frame.label = '{} (init)'.format(self._label(address, bytes(output)))
+        self._account(frame, gas_left)
+        self._profile.add(frame)
+        used = msg.gas - gas_left
+        if self._frames:
+            self._frames[-1].child_gas += used
+        else:
+            self._profile.execution += used
+        return result
+
+    def profile(self, func, name=''):
+        """Calls `func`, which sends a single transaction, and returns its
+        Profile.
+        """
+        self._profile = Profile(name)
+        self._frames = []
+        self._original_vm_execute = vm.vm_execute
+        logger = vm.log_vm_op
+        handler = _TraceHandler(self)
+        level, propagate = logger.level, logger.propagate
+        vm.vm_execute = self._vm_execute
+        logger.addHandler(handler)
+        logger.setLevel(TRACE)
+        logger.propagate = False
+        try:
+            with TxRecorder() as recorder:
+                func()
+        finally:
+            vm.vm_execute = self._original_vm_execute
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+            logger.propagate = propagate
+        profile, self._profile = self._profile, None
+        profile.record = recorder.first
+        return profile
+
+
+def _read_contract_source(name):
+    with open(os.path.join(CONTRACT_DIR, name)) as fd:
+        return fd.read()
+
+
+def _source_map_of_source(path, contract_name):
+    """Source map of a contract the suites compile from stdin."""
+    source = _read_contract_source(path)
+    output = compile_source(source, combined='bin-runtime,srcmap-runtime', parse=False)
+    return SourceMap.from_output(output, contract_name, lambda name: source)
+
+
+def _source_map_of_file(path, contract_name):
+    """Source map of a contract the suites compile from contract/."""
+    cwd = os.getcwd()
+    os.chdir(CONTRACT_DIR)
+    try:
+        output = compile_file(path, combined='bin-runtime,srcmap-runtime', parse=False)
+    finally:
+        os.chdir(cwd)
+    return SourceMap.from_output(output, contract_name, _read_contract_source)
+
+
+def suites():
+    """The test suite and the source map of each variant."""
+    from .test_GST1 import TestGST1, TestDeployedGST1
+    from .test_GST2 import TestGST2, TestDeployedGST2, TestGST2ETC, TestDeployedGST2ETC
+    gst1 = lambda: _source_map_of_source('GST1.sol', 'GasToken1')
+    gst2_eth = lambda: _source_map_of_file('GST2_ETH.sol', 'GasToken2')
+    gst2_etc = lambda: _source_map_of_file('GST2_ETC.sol', 'GasToken2')
+    return collections.OrderedDict([
+        ('GST1', (TestGST1, gst1)),
+        ('GST2_ETH', (TestGST2, gst2_eth)),
+        ('GST2_ETC', (TestGST2ETC, gst2_etc)),
+        # the deployed bytecode has no source map, but is profiled the same
+        ('GST1.asm', (TestDeployedGST1, gst1)),
+        ('GST2_ETH.asm', (TestDeployedGST2, gst2_eth)),
+        ('GST2_ETC.asm', (TestDeployedGST2ETC, gst2_etc)),
+    ])
+
+
+VARIANTS = ('GST1', 'GST2_ETH', 'GST2_ETC', 'GST1.asm', 'GST2_ETH.asm', 'GST2_ETC.asm')
+CALLS = ('mint', 'free', 'freeUpTo', 'freeFrom', 'freeFromUpTo')
+
+
+def prepare_call(suite, call, value):
+    """Sets up `suite`'s chain for `call(value)`, minting the tokens to
+    free first. Returns the call as (function, args, sender key).
+    """
+    t, token = suite.t, suite.c
+    if call == 'mint':
+        return 'mint', (value,), t.k1
+    token.mint(value, sender=t.k1)
+    if call.startswith('freeFrom'):
+        token.approve(t.a2, value, sender=t.k1)
+        return call, (t.a1, value), t.k2
+    return call, (value,), t.k1
+
+
+def profile_variant(variant, call, value):
+    """Deploys `variant` like its test suite does and profiles
+    `call(value)`, minting the tokens to free first.
+    """
+    suite, source_map = suites()[variant]
+    suite.setUpClass()
+    token = suite.c
+
+    maps = [source_map(), _source_map_of_source('test_helper.sol', 'TestHelper')]
+    code_labels = {}
+    if hasattr(suite, 'CHILD_CONTRACT_BIN'):
+        code_labels[utils.decode_hex(suite.CHILD_CONTRACT_BIN)] = 'child'
+    profiler = GasProfiler(
+        labels={token.address: variant, suite.helper.address: 'TestHelper'},
+        code_labels=code_labels,
+        source_maps=dict((m.runtime, m) for m in maps))
+
+    function, args, key = prepare_call(suite, call, value)
+    send = lambda: getattr(token, function)(*args, sender=key)
+    return profiler.profile(send, '{} {}({})'.format(variant, call, value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profiles the gas of a GasToken call.')
+    parser.add_argument('call', choices=CALLS)
+    parser.add_argument('value', type=int, help='number of tokens')
+    parser.add_argument('--variant', action='append', choices=VARIANTS,
+                        help='contract to profile, may be repeated '
+                             '(default: GST1, GST2_ETH and GST2_ETC)')
+    parser.add_argument('--top', type=int, default=15, help='rows per table')
+    parser.add_argument('--json', help='also write the profiles to this file')
+    args = parser.parse_args()
+
+    profiles = [profile_variant(variant, args.call, args.value)
+                for variant in args.variant or VARIANTS[:3]]
+    for profile in profiles:
+        print(profile.format_text(args.top))
+        print()
+    if len(profiles) > 1:
+        for profile in profiles:
+            print('{:<30} {:>10} gas used {:>10} before refund'.format(
+                profile.name, profile.record.gas_used, profile.gas_before_refund))
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump([profile.to_json() for profile in profiles], fd, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""Search for the minimum gas a call needs to succeed on the tester chain.
+
+The chain's state is serialized once (State.to_snapshot(), as fixtures.py
+does) and loaded by every worker process. A search round then tries k gas
+levels spread over the interval that is still open, one per worker, each
+from that same state, so it narrows the interval k + 1 fold per round
+instead of halving it:
+
+    search = GasSearch(self.s)
+    boundary = search.minimum_gas(Call.of(self.c, 'mint', 1, sender=self.t.k1))
+    boundary.gas    # mint(1) succeeds with this much gas, but not with one less
+
+An `inspect(chain, contract)` function (defined at module level, so that
+workers can unpickle it) is called after every probe, and what it returns
+is kept with the probe, to check the state a failed or successful call
+leaves behind.
+
+    $ python -m test.gas_search mint 1 --variant GST2_ETH --variant GST2_ETC -j 8
+"""
+
+import argparse
+import collections
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from ethereum.abi import ContractTranslator
+from ethereum.exceptions import InsufficientStartGas
+from ethereum.state import State
+from ethereum.tools import tester
+
+from .instrumentation import TxRecorder
+from .parallel import PROCESSES_ENV
+
+
+class Call(collections.namedtuple('Call', 'address abi function args sender')):
+    """A call of `function(*args)` on the contract at `address` with
+    `abi`, sent by the account of key `sender`.
+    """
+
+    @classmethod
+    def of(cls, contract, function, *args, sender=tester.k0):
+        return cls(contract.address, contract.abi, function, args, sender)
+
+
+# success is whether the call did not fail, gas_used is None if it failed
+# before running (gas below the intrinsic gas), observation is what
+# inspect returned
+Probe = collections.namedtuple('Probe', 'gas success gas_used observation')
+
+# gas is the least gas the call succeeds with; probes are all tries, by gas
+Boundary = collections.namedtuple('Boundary', 'gas probes rounds seconds')
+
+
+class Fork(object):
+    """A chain loaded from a state snapshot, to be reverted to it after
+    every use.
+    """
+
+    def __init__(self, snapshot):
+        self.chain = tester.Chain()
+        self.chain.head_state = State.from_snapshot(snapshot, self.chain.head_state.env)
+        self.base = self.chain.snapshot()
+        self.contracts = {}
+
+    def contract(self, address, abi):
+        if address not in self.contracts:
+            contract = tester.ABIContract(self.chain, ContractTranslator(abi), address)
+            contract.abi = abi
+            self.contracts[address] = contract
+        return self.contracts[address]
+
+    def revert(self):
+        self.chain.revert(self.base)
+
+    def probe(self, call, gas, inspect=None):
+        contract = self.contract(call.address, call.abi)
+        send = lambda: getattr(contract, call.function)(*call.args, sender=call.sender,
+                                                         startgas=gas)
+        with TxRecorder() as recorder:
+            try:
+                send()
+                success = True
+            except (tester.TransactionFailed, InsufficientStartGas):
+                success = False
+        record = recorder.first
+        observation = inspect(self.chain, contract) if inspect is not None else None
+        self.revert()
+        return Probe(gas, success, record.gas_used if record is not None else None, observation)
+
+
+# the fork of a worker process and the key of its snapshot, loaded by the
+# first job (ProcessPoolExecutor has no initializer before Python 3.7)
+_fork = None
+_fork_key = None
+
+
+def worker_fork(key, snapshot):
+    """The worker's Fork of `snapshot`, loaded once per `key`."""
+    global _fork, _fork_key
+    if _fork_key != key:
+        _fork = Fork(snapshot)
+        _fork_key = key
+    return _fork
+
+
+def _probe(job):
+    key, snapshot, call, gas, inspect = job
+    return worker_fork(key, snapshot).probe(call, gas, inspect)
+
+
+def _interior(low, high, k):
+    """Up to k gas levels spread evenly over (low, high)."""
+    return sorted(set(low + (high - low) * i // (k + 1) for i in range(1, k + 1)) - {low, high})
+
+
+def default_processes():
+    """One worker process per CPU, or per CPU of this process's share of
+    them when running in a test/parallel.py worker.
+    """
+    return int(os.environ.get(PROCESSES_ENV) or os.cpu_count() or 1)
+
+
+class GasSearch(object):
+    """Probes calls from the current state of `chain` in `processes`
+    worker processes (0: in this process, on a separate chain). Later
+    changes to `chain` are not seen by the search.
+    """
+
+    def __init__(self, chain, processes=None):
+        chain.head_state.commit()
+        self.snapshot = chain.head_state.to_snapshot()
+        self.key = uuid.uuid4().hex
+        if processes is None:
+            processes = default_processes()
+        self.processes = processes
+        self._pool = None
+        self._fork = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def probe(self, call, gases, inspect=None):
+        """Sends `call` with each of `gases` gas, from the same state.
+        Returns the Probes in the order of `gases`.
+        """
+        if not self.processes:
+            if self._fork is None:
+                self._fork = Fork(self.snapshot)
+            return [self._fork.probe(call, gas, inspect) for gas in gases]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.processes)
+        return list(self._pool.map(_probe, [(self.key, self.snapshot, call, gas, inspect)
+                                            for gas in gases]))
+
+    def minimum_gas(self, call, low=0, high=2**20, k=None, inspect=None):
+        """Finds the least gas `call` succeeds with, which must be above
+        `low` and at most `high`, by trying k levels (default: one per
+        process) per round. Success must be monotonic in the gas.
+        """
+        k = k or max(self.processes, 1)
+        start = time.time()
+        probes = {}
+        rounds = 0
+        gases = [low, high] + _interior(low, high, k)
+        while gases:
+            rounds += 1
+            for probe in self.probe(call, gases, inspect):
+                probes[probe.gas] = probe
+            if not probes[high].success:
+                raise ValueError("{} fails with {} gas".format(call.function, high))
+            if probes[low].success:
+                raise ValueError("{} succeeds with {} gas".format(call.function, low))
+
+            ordered = [probes[gas] for gas in sorted(probes)]
+            first_success = min(p.gas for p in ordered if p.success)
+            if any(not p.success for p in ordered if p.gas > first_success):
+                raise ValueError("{} does not succeed monotonically in the gas: {}".format(
+                    call.function, [(p.gas, p.success) for p in ordered]))
+            last_failure = max(p.gas for p in ordered if p.gas < first_success)
+            gases = _interior(last_failure, first_success, k)
+
+        return Boundary(first_success, ordered, rounds, time.time() - start)
+
+
+def minimum_gas(chain, contract, function, *args, sender=tester.k0, processes=None, **kwargs):
+    """The least gas `contract.function(*args)` succeeds with on `chain`,
+    see GasSearch.minimum_gas.
+    """
+    with GasSearch(chain, processes) as search:
+        return search.minimum_gas(Call.of(contract, function, *args, sender=sender), **kwargs)
+
+
+def main():
+    from .gas_profile import CALLS, VARIANTS, prepare_call, suites
+
+    parser = argparse.ArgumentParser(description='Finds the least gas a GasToken call succeeds with.')
+    parser.add_argument('call', choices=CALLS)
+    parser.add_argument('value', type=int, help='number of tokens')
+    parser.add_argument('--variant', action='append', choices=VARIANTS,
+                        help='contract to search, may be repeated '
+                             '(default: GST1, GST2_ETH and GST2_ETC)')
+    parser.add_argument('--high', type=int, default=2**24, help='gas the call succeeds with')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of worker processes (0: none)')
+    parser.add_argument('-k', type=int, help='gas levels per round (default: --jobs)')
+    args = parser.parse_args()
+
+    for variant in args.variant or VARIANTS[:3]:
+        suite = suites()[variant][0]
+        suite.setUpClass()
+        function, call_args, key = prepare_call(suite, args.call, args.value)
+        with GasSearch(suite.s, args.jobs) as search:
+            boundary = search.minimum_gas(Call.of(suite.c, function, *call_args, sender=key),
+                                          high=args.high, k=args.k)
+        print("{:>12} {}({}): {} gas ({} probes in {} rounds, {:.2f}s)".format(
+            variant, args.call, args.value, boundary.gas, len(boundary.probes),
+            boundary.rounds, boundary.seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Sweeps of a transaction over a range of gas levels, in parallel.
+
+A sweep applies step(chain, contracts, gas) for every gas level in order,
+each step seeing the state the previous ones left. To run in parallel, the
+levels are split into contiguous chunks, and every chunk is swept by a
+worker process starting from the same state (the chain's when the sweep
+was created, loaded from a State.to_snapshot() like gas_search.py does).
+The steps' results, which must be picklable, are merged in gas order:
+
+    results = GasSweep(self.s).run(free_example_step, {'token': self.c},
+                                   range(24000, 1000000, 1000), chunks=4)
+
+The results depend on the chunking, since every chunk starts over from the
+same state; pass `chunks` wherever they are checked.
+
+`step` has to be defined at module level, so that workers can unpickle it.
+"""
+
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from .gas_search import Fork, default_processes, worker_fork
+
+
+def _sweep(fork, job):
+    step, contracts, gases = job
+    contracts = dict((name, fork.contract(address, abi))
+                     for name, (address, abi) in contracts.items())
+    try:
+        return [step(fork.chain, contracts, gas) for gas in gases]
+    finally:
+        fork.revert()
+
+
+def _sweep_chunk(job):
+    key, snapshot, job = job
+    return _sweep(worker_fork(key, snapshot), job)
+
+
+def chunked(items, chunks):
+    """Splits `items` into `chunks` contiguous pieces of about equal size."""
+    size, rest = divmod(len(items), chunks)
+    pieces, start = [], 0
+    for i in range(chunks):
+        end = start + size + (i < rest)
+        if end > start:
+            pieces.append(items[start:end])
+        start = end
+    return pieces
+
+
+class GasSweep(object):
+    """Sweeps from the current state of `chain` in `processes` worker
+    processes (0: in this process, on a separate chain).
+    """
+
+    def __init__(self, chain, processes=None):
+        chain.head_state.commit()
+        self.snapshot = chain.head_state.to_snapshot()
+        self.key = uuid.uuid4().hex
+        if processes is None:
+            processes = default_processes()
+        self.processes = processes
+
+    def run(self, step, contracts, gases, chunks=None):
+        """Returns the results of `step` for each of `gases`, swept in
+        `chunks` pieces (default: one per process). `contracts` are the
+        ABIContracts the steps get, by name.
+        """
+        gases = list(gases)
+        contracts = dict((name, (contract.address, contract.abi))
+                         for name, contract in contracts.items())
+        jobs = [(step, contracts, piece)
+                for piece in chunked(gases, chunks or max(self.processes, 1))]
+        if not self.processes:
+            fork = Fork(self.snapshot)
+            pieces = [_sweep(fork, job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(self.processes) as pool:
+                pieces = list(pool.map(_sweep_chunk, [(self.key, self.snapshot, job)
+                                                      for job in jobs]))
+        return [result for piece in pieces for result in piece]
@@ -4,6 +4,8 @@ import unittest
 from ethereum.tools import tester
 from ethereum import utils
 
+from .instrumentation import record_tx
+
 
 def bytes_to_int(bytez):
     o = 0
@@ -41,21 +43,8 @@ class TestGenericERC20Token(unittest.TestCase):
         self.s.revert(self.initial_state)
 
     def get_refund_from_tx(self, func):
-        from ethereum.slogging import get_logger
-        log_tx = get_logger('eth.pb.tx')
-        log_msg_prefix = 'DEBUG:eth.pb.tx:Refunding gas_refunded='
-
-        with self.assertLogs(log_tx, "DEBUG") as cm:
-            func()
-
-            refund_log = [log_msg for log_msg in cm.output
-                          if log_msg.startswith(log_msg_prefix)]
-
-            if len(refund_log) == 0:
-                refund = 0
-            else:
-                refund = int(refund_log[0].split(log_msg_prefix)[1])
-            return refund
+        record = record_tx(func)
+        return 0 if record is None else record.refund
 
     def assert_tx_failed(self, function_to_test,
                          exception=tester.TransactionFailed):
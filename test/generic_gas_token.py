@@ -1,7 +1,12 @@
 
+from . import fixtures
+from .compile_cache import deploy_solidity_source
 from .generic_ERC20_token import TestGenericERC20Token
+from miner.costmodel import CostModel, input_data_cost
+from miner import simulator
 import ethereum.opcodes as op
 import collections
+import random
 import warnings
 
 # cost of SLOAD op (200), CALL op (700) and CREATE op (24000)
@@ -9,14 +14,8 @@ GSLOAD = op.opcodes[op.reverse_opcodes['SLOAD']][-1] + op.SLOAD_SUPPLEMENTAL_GAS
 GCALL = op.opcodes[op.reverse_opcodes['CALL']][-1] + op.CALL_SUPPLEMENTAL_GAS
 GCREATE = op.opcodes[op.reverse_opcodes['CREATE']][-1]
 
-
-def input_data_cost(x, num_bytes=32):
-    bytez = tuple((x).to_bytes(num_bytes, byteorder='big'))
-    zero_bytes = sum([1 for b in bytez if b == 0])
-
-    # 4 for zero bytes, 68 for non-zero
-    return op.GTXDATAZERO * zero_bytes + \
-           op.GTXDATANONZERO * (len(bytez) - zero_bytes)
+# expected gas costs, fitted by test/calibrate.py
+MODEL = CostModel.load()
 
 
 class TestGenericGasToken(TestGenericERC20Token):
@@ -24,28 +23,43 @@ class TestGenericGasToken(TestGenericERC20Token):
     MINT_COST_LOWER_BOUND = None
     REFUND = None
 
+    # name of the contract in the cost model
+    VARIANT = None
+
     def mint_cost(self, x):
-        pass
+        return MODEL.mint_cost(self.VARIANT, x)
+
+    def _free_cost(self, function, x):
+        return MODEL.free_cost(self.VARIANT, x, function)
 
     def free_cost(self, x):
-        pass
+        return self._free_cost('free', x)
 
     def free_up_to_cost(self, x):
-        pass
+        return self._free_cost('freeUpTo', x)
 
     def free_from_cost(self, x):
-        pass
+        return self._free_cost('freeFrom', x)
 
     def free_from_up_to_cost(self, x):
-        pass
+        return self._free_cost('freeFromUpTo', x)
 
     @classmethod
     def setUpClass(cls):
         super(TestGenericGasToken, cls).setUpClass()
 
+        # the deployed contracts are cached per suite, see fixtures.py
+        contracts = fixtures.load(cls.__name__, cls.s, cls.deploy_contracts)
+        cls.helper = contracts['helper']
+        cls.c = contracts.get('token')
+        cls.initial_state = cls.s.snapshot()
+
+    @classmethod
+    def deploy_contracts(cls):
+        """Deploys the suite's contracts on cls.s and returns them by name."""
         with open('contract/test_helper.sol') as fd:
             helper_contract_code = fd.read()
-        cls.helper = cls.s.contract(helper_contract_code, language='solidity')
+        return {'helper': deploy_solidity_source(helper_contract_code, 'TestHelper', cls.s)}
 
     def setUp(self):
         super().setUp()
@@ -264,3 +278,116 @@ class TestGenericGasToken(TestGenericERC20Token):
                     self.assertEqual(free_amount * self.REFUND, refund)
 
                 self.assertTrue(scaled_as_expected)
+
+    def storage_words(self):
+        """Number of non-zero words in the token's storage."""
+        return len(self.s.head_state.account_to_dict(self.c.address)['storage'])
+
+    def check_simulator_state(self, sim, accounts):
+        self.assertEqual(sim.total_supply(), self.c.totalSupply())
+        for owner in accounts:
+            self.assertEqual(sim.balance_of(owner), self.c.balanceOf(owner))
+            for spender in accounts:
+                self.assertEqual(sim.allowance(owner, spender), self.c.allowance(owner, spender))
+        self.assertEqual(sim.storage_words(), self.storage_words())
+
+    def test_simulator(self):
+        """Applies the same random operations to the token on the chain and
+        to miner.simulator's model of it, and checks that they return the
+        same, leave the same state and that the model charges mint and free*
+        (called through the helper, as in test_free_cost_and_refund) the gas
+        and refund the chain does.
+        """
+        rng = random.Random(self.VARIANT)
+        sim = simulator.simulator(self.VARIANT, MODEL)
+        t, helper = self.t, self.helper
+        keys = {t.a1: t.k1, t.a2: t.k2}
+        accounts = [t.a1, t.a2, helper.address]
+
+        free_functions = [
+            ('free', helper.burnGasAndFree, True),
+            ('freeUpTo', helper.burnGasAndFreeUpTo, True),
+            ('freeFrom', helper.burnGasAndFreeFrom, False),
+            ('freeFromUpTo', helper.burnGasAndFreeFromUpTo, False),
+        ]
+        max_free = 40
+        ideal_burn = max_free * self.REFUND * 2 + 1000
+        gas_used_before = self.s.head_state.gas_used
+        self.assertIsNone(helper.burnGas(ideal_burn, startgas=10 ** 20))
+        actual_burn = self.s.head_state.gas_used - gas_used_before
+
+        def gas_of(tx):
+            before = self.s.head_state.gas_used
+            result = tx()
+            return result, self.s.head_state.gas_used - before
+
+        def close(gas, expected):
+            return abs(gas - expected) <= 0.01 * expected
+
+        for step in range(60):
+            owner = rng.choice([t.a1, t.a2])
+            other = rng.choice(accounts)
+            value = rng.choice([0, 1, 2, rng.randint(1, 30)])
+            kind = rng.choice(['mint', 'mint', 'transfer', 'transferFrom', 'approve',
+                               'free', 'free', 'helper'])
+
+            if kind == 'mint':
+                result, gas = gas_of(lambda: self.c.mint(value, sender=keys[owner], startgas=10 ** 20))
+                receipt = sim.mint(owner, value)
+                self.assertIsNone(result)
+                self.assertTrue(close(gas, receipt.gas),
+                                "mint({}): {} gas, simulated {}".format(value, gas, receipt.gas))
+            elif kind == 'transfer':
+                value += rng.choice([0, sim.balance_of(owner)])
+                self.assertEqual(sim.transfer(owner, other, value).result,
+                                 self.c.transfer(other, value, sender=keys[owner]))
+            elif kind == 'transferFrom':
+                spender = t.a2 if owner == t.a1 else t.a1
+                self.assertEqual(sim.transfer_from(spender, owner, other, value).result,
+                                 self.c.transferFrom(owner, other, value, sender=keys[spender]))
+            elif kind == 'approve':
+                value = rng.choice([0, value, 2 ** 128])
+                self.assertEqual(sim.approve(owner, other, value).result,
+                                 self.c.approve(other, value, sender=keys[owner]))
+            elif kind == 'free':
+                # called directly, possibly for more than there is
+                spender = t.a2 if owner == t.a1 else t.a1
+                function = rng.choice(['free', 'freeUpTo', 'freeFrom', 'freeFromUpTo'])
+                if function == 'free':
+                    expected = sim.free(owner, value)
+                    result = self.c.free(value, sender=keys[owner])
+                elif function == 'freeUpTo':
+                    expected = sim.free_up_to(owner, value)
+                    result = self.c.freeUpTo(value, sender=keys[owner])
+                elif function == 'freeFrom':
+                    expected = sim.free_from(spender, owner, value)
+                    result = self.c.freeFrom(owner, value, sender=keys[spender])
+                else:
+                    expected = sim.free_from_up_to(spender, owner, value)
+                    result = self.c.freeFromUpTo(owner, value, sender=keys[spender])
+                self.assertEqual(expected.result, result, function)
+            else:
+                # through the helper, which requires all tokens to be freed
+                function, fn, own_tokens = rng.choice(free_functions)
+                if own_tokens:
+                    value = min(value, sim.balance_of(helper.address))
+                else:
+                    value = min(value, sim.balance_of(owner), sim.allowance(owner, helper.address))
+                value = min(value, max_free)
+                gas_used_before = self.s.head_state.gas_used
+                refund = self.get_refund_from_tx(
+                    lambda: fn(self.c.address, ideal_burn, value, sender=keys[owner], startgas=10 ** 20))
+                gas = self.s.head_state.gas_used - gas_used_before - actual_burn + refund
+                if function == 'free':
+                    receipt = sim.free(helper.address, value)
+                elif function == 'freeUpTo':
+                    receipt = sim.free_up_to(helper.address, value)
+                elif function == 'freeFrom':
+                    receipt = sim.free_from(helper.address, owner, value)
+                else:
+                    receipt = sim.free_from_up_to(helper.address, owner, value)
+                self.assertEqual(receipt.refund, refund, function)
+                self.assertTrue(close(gas, receipt.gas),
+                                "{}({}): {} gas, simulated {}".format(function, value, gas, receipt.gas))
+
+            self.check_simulator_state(sim, accounts)
@@ -0,0 +1,120 @@
+"""Structured records of the transactions applied by pyethereum's tester.
+
+    with TxRecorder() as recorder:
+        self.c.free(10, sender=self.t.k1)
+    recorder.last.refund
+
+While a TxRecorder is active, every transaction the tester applies is
+recorded with its gas usage, refund and wall time, by wrapping
+tester.apply_transaction and the top-level apply_msg / create_contract
+calls of ethereum.messages. The wrappers are installed on first use and
+do nothing but a list check while no recorder is active, so no DEBUG
+logging is needed to learn the refund.
+"""
+
+import collections
+import time
+
+import ethereum.opcodes as op
+from ethereum import messages
+from ethereum.tools import tester
+
+# gas_used is net of the refund; refund is what was actually refunded,
+# refund_requested what the transaction asked for (SSTORE clears plus
+# SELFDESTRUCTs) and refund_cap the gas_used // 2 limit on it
+TxRecord = collections.namedtuple(
+    'TxRecord', 'success gas_used refund refund_requested refund_cap '
+                'cap_applied seconds')
+
+_recorders = []
+_installed = False
+# state of the transaction being applied, and what its top-level message
+# left behind as (gas remaining, refund requested)
+_state = None
+_frame = None
+
+
+def _top_level(fn):
+    def wrapper(ext, msg):
+        global _frame
+        result = fn(ext, msg)
+        if msg.depth == 0 and _state is not None:
+            state = _state
+            refund = state.refunds + len(set(state.suicides)) * op.GSUICIDEREFUND
+            _frame = (result[1], refund)
+        return result
+    return wrapper
+
+
+def _apply_transaction(apply_transaction):
+    def wrapper(state, tx):
+        global _state, _frame
+        if not _recorders:
+            return apply_transaction(state, tx)
+
+        _state, _frame = state, None
+        gas_used_before = state.gas_used
+        start = time.perf_counter()
+        try:
+            success, output = apply_transaction(state, tx)
+        finally:
+            _state = None
+        seconds = time.perf_counter() - start
+
+        gas_used = state.gas_used - gas_used_before
+        gas_remained, requested = _frame if _frame is not None else (0, 0)
+        gas_before_refund = tx.startgas - gas_remained
+        cap = gas_before_refund // 2
+        record = TxRecord(
+            success=bool(success),
+            gas_used=gas_used,
+            refund=gas_before_refund - gas_used if success else 0,
+            refund_requested=requested if success else 0,
+            refund_cap=cap,
+            cap_applied=bool(success) and requested > cap,
+            seconds=seconds)
+        for recorder in _recorders:
+            recorder.records.append(record)
+        return success, output
+    return wrapper
+
+
+def install():
+    global _installed
+    if _installed:
+        return
+    messages.apply_msg = _top_level(messages.apply_msg)
+    messages.create_contract = _top_level(messages.create_contract)
+    tester.apply_transaction = _apply_transaction(tester.apply_transaction)
+    _installed = True
+
+
+class TxRecorder(object):
+
+    def __init__(self):
+        self.records = []
+
+    def __enter__(self):
+        install()
+        _recorders.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _recorders.remove(self)
+
+    @property
+    def first(self):
+        return self.records[0] if self.records else None
+
+    @property
+    def last(self):
+        return self.records[-1] if self.records else None
+
+
+def record_tx(func):
+    """Calls `func` and returns the TxRecord of the first transaction it
+    sends, or None if it sends none.
+    """
+    with TxRecorder() as recorder:
+        func()
+    return recorder.first
@@ -0,0 +1,194 @@
+"""Runs the test suites in parallel.
+
+Every test class owns its chain and reverts to its initial state before
+each test, so classes run independently in a pool of processes. Long
+single tests listed in a class's SHARDED_TESTS (such as
+TestRLP.test_exhaustive2) are split further: each of `--shards` copies of
+the test runs with `cls.shard = (index, count)` and checks only its part of
+the inputs. Process pools started by the tests themselves are limited to
+the workers' share of the CPUs. Results, including captured warnings, are
+merged into a single report.
+
+    $ python -m test.parallel test.test_GST1 test.test_GST2 test.test_rlp -j 8
+"""
+
+import argparse
+import collections
+import contextlib
+import importlib
+import io
+import os
+import sys
+import time
+import traceback
+import unittest
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DEFAULT_MODULES = ['test.test_GST1', 'test.test_GST2', 'test.test_rlp',
+                   'test.test_costmodel', 'test.test_calldata', 'test.test_rpc',
+                   'test.test_engine', 'test.test_window', 'test.test_replacement',
+                   'test.test_wal', 'test.test_history', 'test.test_analytics',
+                   'test.test_vanity', 'test.test_benchmark']
+
+# environment variable that tells the process pools tests start
+# (gas_search.py, gas_sweep.py) how many workers each test process may use
+PROCESSES_ENV = 'GASTOKEN_TEST_PROCESSES'
+
+# one unit of work: the tests named `tests` of class `cls` in `module`, with
+# `shard` = (index, count) for a piece of a sharded test, else None
+Job = collections.namedtuple('Job', 'module cls tests shard')
+
+
+def _test_classes(suite):
+    """Returns (class, test names) for the test classes of `suite`, in order."""
+    classes = collections.OrderedDict()
+    for test in _flatten(suite):
+        classes.setdefault(type(test), []).append(test._testMethodName)
+    return classes.items()
+
+
+def _flatten(suite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for t in _flatten(test):
+                yield t
+        else:
+            yield test
+
+
+def plan(modules, shards):
+    jobs = []
+    loader = unittest.TestLoader()
+    for name in modules:
+        suite = loader.loadTestsFromModule(importlib.import_module(name))
+        for cls, tests in _test_classes(suite):
+            sharded = [t for t in tests if t in getattr(cls, 'SHARDED_TESTS', ())]
+            for test in sharded:
+                jobs.extend(Job(name, cls.__name__, (test,), (i, shards))
+                            for i in range(shards))
+            rest = tuple(t for t in tests if t not in sharded)
+            if rest:
+                jobs.append(Job(name, cls.__name__, rest, None))
+    return jobs
+
+
+def _describe(job):
+    label = '{}.{}'.format(job.module, job.cls)
+    if job.shard is not None:
+        label += '.{} [{}/{}]'.format(job.tests[0], job.shard[0] + 1, job.shard[1])
+    return label
+
+
+def run_job(job):
+    """Runs `job` in this process and returns its results as plain data."""
+    cls = getattr(importlib.import_module(job.module), job.cls)
+    if job.shard is not None:
+        cls.shard = job.shard
+    suite = unittest.TestSuite(cls(test) for test in job.tests)
+
+    start = time.time()
+    with warnings.catch_warnings(record=True) as caught, \
+            contextlib.redirect_stdout(io.StringIO()), \
+            contextlib.redirect_stderr(io.StringIO()):
+        warnings.simplefilter('always')
+        result = unittest.TestResult()
+        # the output of failing tests is attached to their tracebacks, the
+        # rest is dropped
+        result.buffer = True
+        suite.run(result)
+
+    return {
+        'job': _describe(job),
+        'run': result.testsRun,
+        'failures': [(str(test), tb) for test, tb in result.failures],
+        'errors': [(str(test), tb) for test, tb in result.errors],
+        'skipped': [(str(test), reason) for test, reason in result.skipped],
+        'expected_failures': len(result.expectedFailures),
+        'unexpected_successes': len(result.unexpectedSuccesses),
+        'warnings': ['{}:{}: {}: {}'.format(os.path.relpath(w.filename), w.lineno,
+                                            w.category.__name__, w.message)
+                     for w in caught],
+        'time': time.time() - start,
+    }
+
+
+def _run_job_safely(job):
+    # anything raised here would otherwise only surface as a pickled
+    # exception without the worker's traceback
+    try:
+        return run_job(job)
+    except Exception:
+        return {'job': _describe(job), 'run': 0, 'failures': [],
+                'errors': [(_describe(job), traceback.format_exc())], 'skipped': [],
+                'expected_failures': 0, 'unexpected_successes': 0,
+                'warnings': [], 'time': 0.0}
+
+
+def report(results, elapsed, stream=sys.stdout):
+    totals = collections.Counter()
+    warning_counts = collections.OrderedDict()
+    for r in results:
+        for key in ('run', 'expected_failures', 'unexpected_successes'):
+            totals[key] += r[key]
+        for key in ('failures', 'errors', 'skipped'):
+            totals[key] += len(r[key])
+        for w in r['warnings']:
+            warning_counts[w] = warning_counts.get(w, 0) + 1
+
+    for kind in ('errors', 'failures'):
+        for r in results:
+            for test, tb in r[kind]:
+                stream.write('=' * 70 + '\n')
+                stream.write('{}: {}\n'.format(kind[:-1].upper(), test))
+                stream.write('-' * 70 + '\n')
+                stream.write(tb + '\n')
+
+    if warning_counts:
+        stream.write('=' * 70 + '\nWARNINGS\n' + '-' * 70 + '\n')
+        for w, count in warning_counts.items():
+            stream.write('{}{}\n'.format(w, '' if count == 1 else ' ({}x)'.format(count)))
+
+    stream.write('-' * 70 + '\n')
+    stream.write('Ran {} tests in {} jobs in {:.3f}s\n\n'.format(
+        totals['run'], len(results), elapsed))
+    details = ['{}={}'.format(key, totals[key])
+               for key in ('failures', 'errors', 'skipped', 'expected_failures',
+                           'unexpected_successes') if totals[key]]
+    ok = not totals['failures'] and not totals['errors']
+    stream.write('{}{}\n'.format('OK' if ok else 'FAILED',
+                                 ' ({})'.format(', '.join(details)) if details else ''))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES,
+                        help='test modules (default: {})'.format(' '.join(DEFAULT_MODULES)))
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--shards', type=int, default=None,
+                        help='pieces to split SHARDED_TESTS into (default: --jobs)')
+    args = parser.parse_args()
+
+    jobs = plan(args.modules, args.shards or args.jobs)
+    # the workers inherit this, so that pools started by tests share the
+    # CPUs instead of starting cpu_count processes each
+    os.environ[PROCESSES_ENV] = str(max((os.cpu_count() or 1) // max(args.jobs, 1), 1))
+    start = time.time()
+    results = []
+    with ProcessPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(_run_job_safely, job) for job in jobs]
+        for future in as_completed(futures):
+            r = future.result()
+            status = 'ok' if not r['failures'] and not r['errors'] else 'FAIL'
+            print('{:<60} {:>4} tests {:8.2f}s  {}'.format(r['job'], r['run'], r['time'], status))
+            sys.stdout.flush()
+            results.append(r)
+    results.sort(key=lambda r: r['job'])
+    ok = report(results, time.time() - start)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
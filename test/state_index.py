@@ -0,0 +1,208 @@
+"""Incremental index of the accounts on a tester chain.
+
+Checking whether a contract exists with `a in head_state.to_dict()` dumps
+the whole state, so a test that does it after every token grows
+quadratically. A StateIndex instead reads the state once, when it is
+created, and then follows the CREATEs and SELFDESTRUCTs the VM executes:
+
+    index = StateIndex(self.s)
+    self.c.mint(2, sender=self.t.k1)
+    index.live_count(self.c.address)        # 2 children created by the token
+    index.is_live_child(self.c.address, 1)  # True
+
+Creations are tracked per call frame and only kept when the frame (and the
+transaction) succeeds, like the VM keeps them. Reverting the chain to a
+snapshot taken while the index was open rewinds it too; reverting to an
+older snapshot leaves it stale, and it raises on every query. The VM and
+the tester are patched while at least one index is open.
+"""
+
+from ethereum import messages, utils
+from ethereum.tools import tester
+
+from miner.children import ChildAddresses
+
+_indexes = []
+# the patched (owner, name, original) functions, while installed
+_originals = []
+# the transaction being applied: its state, and the events of its frames
+# as a stack of lists of ('create' | 'destroy', address, creator)
+_state = None
+_frames = []
+
+
+def _frame(fn, created):
+    """Wraps _apply_msg or create_contract to collect the events of the
+    frames they run, passing them up only if the frame succeeds.
+    """
+    def wrapper(ext, msg, *args):
+        if _state is None:
+            return fn(ext, msg, *args)
+        _frames.append([])
+        try:
+            result = fn(ext, msg, *args)
+        finally:
+            events = _frames.pop()
+        if result[0]:
+            if created:
+                events.append(('create', utils.normalize_address(result[2]), msg.sender))
+            if msg.depth == 0:
+                # SELFDESTRUCTed accounts are deleted at the end of the
+                # transaction, if its message succeeded
+                events.extend(('destroy', address, None) for address in set(_state.suicides))
+            _frames[-1].extend(events)
+        return result
+    return wrapper
+
+
+def _apply_transaction(apply_transaction):
+    def wrapper(state, tx):
+        global _state
+        indexes = [index for index in _indexes if index.chain.head_state is state]
+        if not indexes:
+            return apply_transaction(state, tx)
+
+        _state = state
+        _frames.append([])
+        try:
+            return apply_transaction(state, tx)
+        finally:
+            events = _frames.pop()
+            _state = None
+            for index in indexes:
+                index.apply(events)
+    return wrapper
+
+
+def _snapshot(snapshot):
+    def wrapper(chain):
+        result = snapshot(chain)
+        for index in _indexes:
+            if index.chain is chain:
+                index.snapshots[id(result)] = (result, len(index.journal))
+        return result
+    return wrapper
+
+
+def _revert(revert):
+    def wrapper(chain, snapshot):
+        revert(chain, snapshot)
+        for index in _indexes:
+            if index.chain is chain:
+                index.rewind(snapshot)
+    return wrapper
+
+
+def _patch(owner, name, wrap):
+    original = getattr(owner, name)
+    _originals.append((owner, name, original))
+    setattr(owner, name, wrap(original))
+
+
+def install():
+    if _originals:
+        return
+    _patch(messages, '_apply_msg', lambda fn: _frame(fn, False))
+    _patch(messages, 'create_contract', lambda fn: _frame(fn, True))
+    _patch(tester, 'apply_transaction', _apply_transaction)
+    _patch(tester.Chain, 'snapshot', _snapshot)
+    _patch(tester.Chain, 'revert', _revert)
+
+
+def uninstall():
+    while _originals:
+        owner, name, original = _originals.pop()
+        setattr(owner, name, original)
+
+
+class StateIndex(object):
+
+    def __init__(self, chain):
+        install()
+        self.chain = chain
+        self.live = set(utils.normalize_address(address)
+                        for address in chain.head_state.to_dict().keys())
+        # creator of every live account created while the index was open
+        self.creators = {}
+        self.counts = {}
+        # events applied, to undo them on revert, and the position in it of
+        # the snapshots taken since
+        self.journal = []
+        self.snapshots = {}
+        self.stale = False
+        self._children = {}
+        _indexes.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self in _indexes:
+            _indexes.remove(self)
+        if not _indexes:
+            uninstall()
+
+    def _create(self, address, creator):
+        self.live.add(address)
+        if creator is not None:
+            creator = utils.normalize_address(creator)
+            self.creators[address] = creator
+            self.counts[creator] = self.counts.get(creator, 0) + 1
+
+    def _destroy(self, address):
+        self.live.discard(address)
+        creator = self.creators.pop(address, None)
+        if creator is not None:
+            self.counts[creator] -= 1
+        return creator
+
+    def apply(self, events):
+        for kind, address, creator in events:
+            if kind == 'create':
+                if address not in self.live:
+                    self._create(address, creator)
+                    self.journal.append((kind, address, creator))
+            elif address in self.live:
+                creator = self._destroy(address)
+                self.journal.append((kind, address, creator))
+
+    def rewind(self, snapshot):
+        entry = self.snapshots.get(id(snapshot))
+        if entry is None or entry[0] is not snapshot:
+            self.stale = True
+            return
+        length = entry[1]
+        while len(self.journal) > length:
+            kind, address, creator = self.journal.pop()
+            if kind == 'create':
+                self._destroy(address)
+            else:
+                self._create(address, creator)
+
+    def _check(self):
+        if self.stale:
+            raise RuntimeError("the chain was reverted to a state before the index")
+
+    def is_live(self, address):
+        """Whether the account at `address` (hex or bytes) exists."""
+        self._check()
+        return utils.normalize_address(address) in self.live
+
+    def live_count(self, creator=None):
+        """Number of accounts, or of the live ones `creator` created while
+        the index was open.
+        """
+        self._check()
+        if creator is None:
+            return len(self.live)
+        return self.counts.get(utils.normalize_address(creator), 0)
+
+    def is_live_child(self, creator, nonce):
+        """Whether the contract `creator` created with `nonce` exists."""
+        creator = utils.normalize_address(creator)
+        if creator not in self._children:
+            self._children[creator] = ChildAddresses(creator)
+        return self.is_live(self._children[creator].address(nonce))
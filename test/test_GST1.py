@@ -4,57 +4,44 @@ import unittest
 import ethereum.opcodes as op
 from ethereum import utils
 
-from .generic_gas_token import TestGenericGasToken, GSLOAD, input_data_cost
+from .compile_cache import deploy_solidity_source
+from .generic_gas_token import TestGenericGasToken, GSLOAD, MODEL
+
+COSTS = MODEL.variants['GST1']
 
 
 class TestGST1(TestGenericGasToken):
 
+    VARIANT = 'GST1'
+
     MINT_COST_LOWER_BOUND = op.GTXCOST + 3*op.GSTORAGEADD + 2*GSLOAD
 
     # Base cost of mint transaction (includes base transaction fee)
-    MINT_BASE = 32259
+    MINT_BASE = COSTS.mint_base
 
     # Additional minting cost per token
-    MINT_TOKEN_COST = 20046
+    MINT_TOKEN_COST = COSTS.mint_token
 
     # Base cost of free transaction (includes CALL from external contract)
-    FREE_BASE = 14505
-    FREE_UP_TO_BASE = 14419
-    FREE_FROM_BASE = 20223
-    FREE_FROM_UP_TO_BASE = 20089
+    FREE_BASE = COSTS.free_base
+    FREE_UP_TO_BASE = COSTS.free_up_to_base
+    FREE_FROM_BASE = COSTS.free_from_base
+    FREE_FROM_UP_TO_BASE = COSTS.free_from_up_to_base
 
     # Additional free cost per token
-    FREE_TOKEN_COST = 5046
-
-    def mint_cost(self, x):
-        if x == 0:
-            return 21800
-            
-        return self.MINT_BASE + x * self.MINT_TOKEN_COST + input_data_cost(x)
-
-    def free_cost(self, x):
-        return self.FREE_BASE + x * self.FREE_TOKEN_COST + input_data_cost(x)
-
-    def free_up_to_cost(self, x):
-        return self.FREE_UP_TO_BASE + x * self.FREE_TOKEN_COST + input_data_cost(x)
-
-    def free_from_cost(self, x):
-        return self.FREE_FROM_BASE + x * self.FREE_TOKEN_COST + input_data_cost(x)
-
-    def free_from_up_to_cost(self, x):
-        return self.FREE_FROM_UP_TO_BASE + x * self.FREE_TOKEN_COST + input_data_cost(x)
+    FREE_TOKEN_COST = COSTS.free_token
 
     # Refund per freed token
     REFUND = op.GSTORAGEREFUND
 
     @classmethod
-    def setUpClass(cls):
-        super(TestGST1, cls).setUpClass()
+    def deploy_contracts(cls):
+        contracts = super(TestGST1, cls).deploy_contracts()
 
         with open('contract/GST1.sol') as fd:
             contract_code = fd.read()
-        cls.c = cls.s.contract(contract_code, language='solidity')
-        cls.initial_state = cls.s.snapshot()
+        contracts['token'] = deploy_solidity_source(contract_code, 'GasToken1', cls.s)
+        return contracts
 
     def setUp(self):
         super().setUp()
@@ -101,13 +88,13 @@ class TestGST1(TestGenericGasToken):
 class TestDeployedGST1(TestGST1):
 
     @classmethod
-    def setUpClass(cls):
-        super(TestDeployedGST1, cls).setUpClass()
+    def deploy_contracts(cls):
+        contracts = super(TestDeployedGST1, cls).deploy_contracts()
 
         with open('contract/GST1.asm') as fd:
             contract_code = utils.decode_hex(fd.read())
-        cls.s.head_state.set_code(cls.c.address, contract_code)
-        cls.initial_state = cls.s.snapshot()
+        cls.s.head_state.set_code(contracts['token'].address, contract_code)
+        return contracts
 
     def setUp(self):
         super().setUp()
@@ -0,0 +1,146 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from miner.analytics import BatchAnalytics
+from miner.history import DTYPE, BatchHistory
+
+# (end_nonce, time_start, time_end, wei_consumed); the batches hold 4, 4 and
+# 8 transactions, the size of the first one is unknown
+BATCHES = [
+    (4, 0.0, 10.0, 100.0),
+    (8, 10.0, 20.0, 200.0),
+    (12, 20.0, 40.0, 300.0),
+    (20, 40.0, 50.0, 800.0),
+]
+
+
+def _records(batches):
+    return np.array(batches, dtype=DTYPE)
+
+
+class TestBatchAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.analytics = BatchAnalytics(_records(BATCHES), tokens_per_tx=1)
+
+    def assertNanEqual(self, first, second):
+        self.assertEqual(len(first), len(second))
+        for a, b in zip(first, second):
+            if math.isnan(b):
+                self.assertTrue(math.isnan(a), (first, second))
+            else:
+                self.assertAlmostEqual(a, b)
+
+    def test_per_batch(self):
+        analytics = self.analytics
+        self.assertEqual(len(analytics), 4)
+        self.assertEqual(analytics.txs().tolist(), [0, 4, 4, 8])
+        self.assertEqual(analytics.durations().tolist(), [10, 10, 20, 10])
+        self.assertEqual(analytics.burn_rates().tolist(), [10, 20, 15, 80])
+        self.assertNanEqual(analytics.wei_per_token(), [float('nan'), 50, 75, 100])
+        self.assertEqual(BatchAnalytics(_records(BATCHES)).wei_per_token()[1], 200 / (4 * 0x1a))
+
+    def test_latency_percentiles(self):
+        # durations 10, 10, 10, 20: the 90th percentile is 70% of the way
+        # from the third to the fourth
+        self.assertEqual(self.analytics.latency_percentiles((50, 90)), {50: 10.0, 90: 17.0})
+        empty = BatchAnalytics().latency_percentiles((50,))
+        self.assertTrue(math.isnan(empty[50]))
+
+    def test_summary(self):
+        summary = self.analytics.summary()
+        self.assertEqual(summary['batches'], 4)
+        self.assertEqual(summary['txs'], 16)
+        self.assertEqual(summary['tokens'], 16)
+        self.assertEqual(summary['wei_consumed'], 1400)
+        self.assertEqual(summary['seconds'], 50)
+        self.assertEqual(summary['burn_rate'], 28)
+        # without the first batch's wei, whose tx count is unknown
+        self.assertEqual(summary['wei_per_token'], 1300 / 16)
+
+    def test_summary_range(self):
+        # the batches that ended in [15, 45)
+        summary = self.analytics.summary(15, 45)
+        self.assertEqual(summary['batches'], 2)
+        self.assertEqual(summary['txs'], 8)
+        self.assertEqual(summary['wei_consumed'], 500)
+        self.assertEqual(summary['seconds'], 30)
+        self.assertAlmostEqual(summary['burn_rate'], 500 / 30)
+        self.assertEqual(summary['wei_per_token'], 500 / 8)
+        # ranges are half open
+        self.assertEqual(self.analytics.summary(20, 50)['batches'], 2)
+
+        summary = self.analytics.summary(start=100)
+        self.assertEqual(summary['batches'], 0)
+        self.assertEqual(summary['wei_consumed'], 0)
+        self.assertTrue(math.isnan(summary['burn_rate']))
+        self.assertTrue(math.isnan(summary['wei_per_token']))
+
+    def test_rolling(self):
+        ends, burn_rate, wei_per_token = self.analytics.rolling(20)
+        self.assertEqual(ends.tolist(), [10, 20, 40, 50])
+        # the windows hold batches 0, 0-1, 2 and 2-3: a batch that ended
+        # exactly `window` seconds before is outside
+        self.assertNanEqual(burn_rate, [100 / 10, 300 / 20, 300 / 20, 1100 / 30])
+        self.assertNanEqual(wei_per_token, [float('nan'), 200 / 4, 300 / 4, 1100 / 12])
+
+    def test_update_matches_full_build(self):
+        rng = np.random.RandomState(1)
+        sizes = rng.randint(1, 9, 3000)
+        ends = np.cumsum(rng.uniform(1, 30, 3000))
+        batches = [(int(n), float(start), float(end), float(wei)) for n, start, end, wei in
+                   zip(np.cumsum(sizes), np.concatenate([[0], ends[:-1]]), ends,
+                       rng.uniform(1e14, 1e16, 3000))]
+        full = BatchAnalytics(_records(batches))
+        # grows past the initial capacity one piece at a time
+        incremental = BatchAnalytics()
+        for i, j in ((0, 1), (1, 700), (700, 2500), (2500, 2500), (2500, 3000)):
+            incremental.update(_records(batches[i:j]))
+        self.assertEqual(len(incremental), 3000)
+        self.assertEqual(incremental.txs()[1:].tolist(), sizes[1:].tolist())
+        np.testing.assert_allclose(incremental.rolling(3600)[1], full.rolling(3600)[1])
+        np.testing.assert_allclose(incremental.rolling(3600)[2][1:], full.rolling(3600)[2][1:])
+
+        summary = incremental.summary(ends[100], ends[2000])
+        self.assertEqual(summary['batches'], 1900)
+        self.assertEqual(summary['txs'], sizes[100:2000].sum())
+        self.assertAlmostEqual(summary['wei_consumed'] / sum(b[3] for b in batches[100:2000]),
+                               1.0)
+
+
+class TestHistoryRoundTrip(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'batchtimes.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_from_history_and_refresh(self):
+        history = BatchHistory(self.path)
+        history.extend(BATCHES[:2])
+        history.close()
+
+        history = BatchHistory(self.path)
+        analytics = BatchAnalytics.from_history(history, tokens_per_tx=1)
+        self.assertEqual(analytics.summary()['wei_consumed'], 300)
+        for batch in BATCHES[2:]:
+            history.append(batch)
+        analytics.refresh(history)
+        analytics.refresh(history)
+        history.close()
+        self.assertEqual(analytics.summary(), self.analytics_of(BATCHES).summary())
+
+    @staticmethod
+    def analytics_of(batches):
+        return BatchAnalytics(_records(batches), tokens_per_tx=1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
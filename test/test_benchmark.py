@@ -0,0 +1,93 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from .benchmark import FORMAT_VERSION, Result, compare, load
+
+RESULTS = {
+    'GST2_ETH': {
+        'mint': Result(30000, 36000, 5.0, 21400, 1.0, 12),
+        'free': Result(14000, -24000, 3.0, None, 2.0, 12),
+    },
+}
+
+
+def _baseline(results):
+    return {
+        'version': FORMAT_VERSION,
+        'variants': dict((variant, dict((function, result._asdict())
+                                        for function, result in functions.items()))
+                         for variant, functions in results.items()),
+    }
+
+
+def _changed(function, **fields):
+    return {'GST2_ETH': {function: RESULTS['GST2_ETH'][function]._replace(**fields)}}
+
+
+class TestCompare(unittest.TestCase):
+
+    def setUp(self):
+        self.baseline = _baseline(RESULTS)
+
+    def test_unchanged(self):
+        self.assertEqual(compare(RESULTS, self.baseline), [])
+        self.assertEqual(compare(RESULTS, self.baseline, max_slowdown=1.0), [])
+
+    def test_gas_regression(self):
+        # 1% of 30000 is 300 gas
+        self.assertEqual(compare(_changed('mint', base=30300), self.baseline, 0.01), [])
+        self.assertEqual(compare(_changed('mint', base=30301), self.baseline, 0.01),
+                         ['GST2_ETH mint base: 30301 gas, was 30000'])
+        # with no tolerance, any growth is a regression
+        self.assertEqual(compare(_changed('mint', zero=21401), self.baseline),
+                         ['GST2_ETH mint zero: 21401 gas, was 21400'])
+        self.assertEqual(compare(_changed('mint', base=29000, per_token=35000), self.baseline),
+                         [])
+
+    def test_negative_costs(self):
+        # a smaller refund is a regression, measured against its magnitude
+        self.assertEqual(compare(_changed('free', per_token=-23760), self.baseline, 0.01), [])
+        self.assertEqual(compare(_changed('free', per_token=-23759), self.baseline, 0.01),
+                         ['GST2_ETH free per_token: -23759 gas, was -24000'])
+
+    def test_slowdown(self):
+        slower = _changed('free', seconds=3.0)
+        self.assertEqual(compare(slower, self.baseline), [])
+        self.assertEqual(compare(slower, self.baseline, max_slowdown=1.5), [])
+        self.assertEqual(compare(slower, self.baseline, max_slowdown=1.4),
+                         ['GST2_ETH free: 3.00s, was 2.00s'])
+
+    def test_missing_from_baseline(self):
+        results = {'GST2_ETH': {'freeUpTo': Result(1, 1, 0.0, None, 1.0, 1)},
+                   'GST1': {'mint': Result(10**6, 10**6, 0.0, 10**6, 10.0, 1)}}
+        self.assertEqual(compare(results, self.baseline), [])
+
+
+class TestLoad(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'bench.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_round_trip(self):
+        with open(self.path, 'w') as fd:
+            json.dump(_baseline(RESULTS), fd)
+        baseline = load(self.path)
+        self.assertEqual(compare(RESULTS, baseline), [])
+        self.assertEqual(len(compare(_changed('mint', per_token=36001), baseline)), 1)
+
+    def test_version(self):
+        with open(self.path, 'w') as fd:
+            json.dump(dict(_baseline(RESULTS), version=FORMAT_VERSION + 1), fd)
+        with self.assertRaises(ValueError):
+            load(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,52 @@
+import json
+import unittest
+
+from ethereum.abi import ContractTranslator
+
+from miner import calldata
+
+ADDRESS = '0x' + '42' * 20
+
+
+class TestCalldata(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(calldata.ABI_PATH) as fd:
+            cls.translator = ContractTranslator(json.load(fd))
+
+    def encode(self, name, *args):
+        return self.translator.encode_function_call(name, list(args))
+
+    def test_value_calls(self):
+        for value in (0, 1, 0x1a, 255, 256, 2**128 + 7, 2**256 - 1):
+            self.assertEqual(calldata.mint(value), self.encode('mint', value))
+            self.assertEqual(calldata.free(value), self.encode('free', value))
+            self.assertEqual(calldata.free_up_to(value), self.encode('freeUpTo', value))
+
+    def test_from_value_calls(self):
+        for address in (ADDRESS, ADDRESS[2:], bytes(20), b'\xff' * 20):
+            for value in (0, 0x1a, 2**256 - 1):
+                self.assertEqual(calldata.free_from(address, value),
+                                 self.encode('freeFrom', address, value))
+                self.assertEqual(calldata.free_from_up_to(address, value),
+                                 self.encode('freeFromUpTo', address, value))
+
+    def test_templates_are_not_modified(self):
+        template = calldata.TEMPLATES['freeFrom']
+        calldata.free_from(ADDRESS, 5)
+        self.assertEqual(calldata.TEMPLATES['freeFrom'], template)
+        self.assertEqual(calldata.mint(0), self.encode('mint', 0))
+
+    def test_to_hex(self):
+        self.assertEqual(calldata.to_hex(calldata.mint(0x1a)),
+                         '0xa0712d68' + '%064x' % 0x1a)
+
+    def test_invalid_address(self):
+        for address in ('0x' + '42' * 19, b'\x00' * 21, ''):
+            with self.assertRaises(ValueError):
+                calldata.free_from(address, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from miner.costmodel import CostModel
+
+
+class TestCostModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = CostModel.load()
+
+    def brute_force_range_cost(self, first, count):
+        small = self.model.rlp.small_nonce
+        return sum(self.model.rlp_cost(n) - small for n in range(first, first + count))
+
+    def test_rlp_range_cost(self):
+        for first, count in [(0, 1), (1, 127), (100, 1000), (250, 20), (2**16 - 5, 10),
+                             (2**56 - 3, 7), (2**64 - 2, 4)]:
+            self.assertEqual(self.model.rlp_range_cost(first, count),
+                             self.brute_force_range_cost(first, count))
+
+    def test_rlp_range_cost_int64_overflow(self):
+        # first and count fit into int64, first + count does not
+        for first, count in [(2**63 - 10, 20), (2**63 - 1, 1), (2**63 - 2, 2)]:
+            self.assertGreater(first + count, 2**63 - 1)
+            self.assertEqual(self.model.rlp_range_cost(first, count),
+                             self.brute_force_range_cost(first, count))
+
+        # one overflowing row sends the whole array down the exact path
+        firsts = np.array([5, 300, 2**63 - 10], dtype=np.int64)
+        costs = self.model.rlp_range_cost(firsts, 20)
+        self.assertEqual([int(c) for c in costs],
+                         [self.brute_force_range_cost(int(f), 20) for f in firsts])
+
+        # an end of exactly 2**63 - 1 still fits
+        self.assertEqual(self.model.rlp_range_cost(2**63 - 21, 20),
+                         self.brute_force_range_cost(2**63 - 21, 20))
+
+    def test_free_cost_first_nonce(self):
+        for variant in ('GST2_ETH', 'GST2_ETC'):
+            lower_bound = self.model.free_cost(variant, 50)
+            self.assertEqual(self.model.free_cost(variant, 50, first_nonce=1), lower_bound)
+            self.assertEqual(self.model.free_cost(variant, 50, first_nonce=200),
+                             lower_bound + self.brute_force_range_cost(200, 50))
+
+        self.assertIsInstance(self.model.free_cost('GST1', 50), int)
+        with self.assertRaises(ValueError):
+            self.model.free_cost('GST1', 50, first_nonce=1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
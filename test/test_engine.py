@@ -0,0 +1,278 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from miner.engine import MintEngine
+from miner.pricing import ConstantPrice, DynamicPrice
+from miner.replacement import Replacer
+from miner.rpc import connect
+from miner.standin_node import StandinChain, StandinNode
+from miner.wal import WriteAheadLog, replay
+
+SENDER = '0x' + '11' * 20
+CONTRACT = "0x0000000000b3f879cb30fe243b4dfee438691c04"
+# mint(0x1a)
+MINT_DATA = '0xa0712d68' + '%064x' % 0x1a
+TX_GAS = 982614
+
+
+class TestEngine(unittest.TestCase):
+    """MintEngine against the stand-in node, over IPC."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.path = os.path.join(tempfile.mkdtemp(), 'standin.ipc')
+
+    def tearDown(self):
+        self.loop.close()
+
+    def mine(self, chain, batches, block_time=0.05, **kwargs):
+        """Runs an engine until `batches` batches are mined. Returns the
+        engine and the batchtuples it reported.
+        """
+        node = StandinNode(chain, block_time=block_time)
+        records = []
+
+        async def go():
+            await node.start(ipc_path=self.path)
+            rpc = await connect(self.path)
+            kwargs.setdefault('pricing', ConstantPrice(int(4e9)))
+            engine = MintEngine(rpc, SENDER, CONTRACT, MINT_DATA, on_batch=records.append,
+                                **kwargs)
+            try:
+                await engine.run(batches)
+            finally:
+                rpc.close()
+                node.stop()
+            return engine
+
+        engine = self.loop.run_until_complete(asyncio.wait_for(go(), 60))
+        return engine, records
+
+    def mined_nonces(self, chain):
+        return sorted(int(tx['nonce'], 16) for tx in chain.transactions.values()
+                      if tx['from'] == SENDER and 'blockNumber' in tx)
+
+    def test_mints_batches(self):
+        chain = StandinChain(block_gas_limit=TX_GAS * 4)
+        engine, records = self.mine(chain, 3, batch_size=4, window_size=8)
+
+        self.assertGreaterEqual(engine.batches_done, 3)
+        mined = self.mined_nonces(chain)
+        self.assertEqual(mined, list(range(len(mined))))
+        self.assertGreaterEqual(len(mined), 12)
+        for tx in chain.transactions.values():
+            self.assertEqual(tx['data'], MINT_DATA)
+            self.assertEqual(tx['to'], CONTRACT)
+
+        # batches end at the nonce they were confirmed up to, one after the
+        # other, and take time
+        ends = [record[0] for record in records]
+        self.assertEqual(ends, sorted(ends))
+        self.assertLessEqual(ends[-1], len(mined))
+        self.assertEqual(ends[-1] % 4, 0)
+        for end_nonce, time_start, time_end, wei in records:
+            self.assertGreater(time_end, time_start)
+            self.assertGreater(wei, 0)
+
+    def test_dynamic_price_with_full_blocks(self):
+        # a block holds four batches, which are recorded as one
+        chain = StandinChain(block_gas_limit=TX_GAS * 16)
+        pricing = DynamicPrice(int(4e9), 1e15, int(1e8), int(1e11))
+        engine, records = self.mine(chain, 8, batch_size=4, window_size=16, pricing=pricing)
+
+        self.assertGreaterEqual(engine.batches_done, 8)
+        self.assertLess(len(records), engine.batches_done)
+        prices = dict((int(tx['nonce'], 16), int(tx['gasPrice'], 16))
+                      for tx in chain.transactions.values() if 'blockNumber' in tx)
+        previous_end = 0
+        for end_nonce, time_start, time_end, wei in records:
+            self.assertGreater(time_end, time_start)
+            self.assertEqual((end_nonce - previous_end) % 4, 0)
+            self.assertEqual(wei, 1.0 * sum(prices[n] for n in range(previous_end, end_nonce)) * TX_GAS)
+            previous_end = end_nonce
+        # the rate was measured, so the price moved
+        self.assertNotEqual(pricing.gas_price, int(4e9))
+
+
+class TestBatchGrouping(unittest.TestCase):
+    """MintEngine._confirmed, without a node."""
+
+    def setUp(self):
+        self.records = []
+        self.pricing = DynamicPrice(int(4e9), 1e15, int(1e8), int(1e11))
+        self.engine = MintEngine(None, SENDER, CONTRACT, MINT_DATA, self.pricing, batch_size=4,
+                                 window_size=32, on_batch=self.records.append)
+        self.engine._group_start = 100.0
+
+    def send(self, nonces, gas_price=int(4e9)):
+        for nonce in nonces:
+            self.engine.window.sent(nonce, 90.0)
+            self.engine._prices[nonce] = gas_price
+
+    def test_one_record_per_block(self):
+        self.send(range(10))
+        self.assertTrue(self.engine._confirmed(list(range(10)), 110.0))
+        # two full batches, ending at nonce 8, the rest waits for the next
+        self.assertEqual(self.engine.batches_done, 2)
+        self.assertEqual(self.records, [(8, 100.0, 110.0, 8 * 4e9 * TX_GAS)])
+        self.assertEqual(self.pricing.gas_price, int(4e9 * 0.75))
+
+        self.send(range(10, 14), gas_price=int(5e9))
+        self.engine._confirmed(list(range(10, 14)), 115.0)
+        self.assertEqual(self.engine.batches_done, 3)
+        self.assertEqual(self.records[-1],
+                         (12, 110.0, 115.0, (2 * 4e9 + 2 * 5e9) * TX_GAS))
+
+    def test_partial_batch(self):
+        self.send(range(3))
+        self.assertTrue(self.engine._confirmed([0, 1, 2], 110.0))
+        self.assertEqual(self.records, [])
+        self.assertEqual(self.engine.batches_done, 0)
+        # nonces that were not in flight are not progress
+        self.assertFalse(self.engine._confirmed([0, 1], 111.0))
+
+    def test_zero_length_batch(self):
+        self.send(range(4))
+        self.engine._confirmed(list(range(4)), 100.0)
+        self.assertEqual(self.records, [(4, 100.0, 100.0, 4 * 4e9 * TX_GAS)])
+        # no time to measure a rate over: the price stays
+        self.assertEqual(self.pricing.gas_price, int(4e9))
+
+
+class _RecordingRPC(object):
+
+    def __init__(self):
+        self.batches = []
+
+    async def batch(self, calls):
+        self.batches.append(calls)
+        return ['0x{:064x}'.format(len(self.batches) * 100 + i) for i in range(len(calls))]
+
+
+class TestTimeout(unittest.TestCase):
+    """MintEngine.wait_for_confirmations when no block confirms anything."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.rpc = _RecordingRPC()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def time_out(self, **kwargs):
+        pricing = DynamicPrice(int(4e9), 1e15, int(1e9), int(1e11))
+        engine = MintEngine(self.rpc, SENDER, CONTRACT, MINT_DATA, pricing, password=None,
+                            batch_timeout=0.01, **kwargs)
+
+        async def no_heads():
+            await asyncio.sleep(60)
+        engine.blocks.next_heads = no_heads
+        engine._block_number = 10
+        engine.nonces.confirm_below(3)
+        engine.nonces.next_nonce = 5
+        for nonce in (3, 4):
+            engine.nonces.mark_sent(nonce, None)
+            engine._track(nonce, [], int(4e9), 50.0)
+        engine._last_progress = time.time()
+        self.loop.run_until_complete(asyncio.wait_for(engine.wait_for_confirmations(), 10))
+        return engine
+
+    def test_resends_window_at_raised_price(self):
+        engine = self.time_out()
+        self.assertEqual(engine.pricing.gas_price, int(5e9))
+        calls, = self.rpc.batches
+        self.assertEqual([(method, params[0]['nonce'], params[0]['gasPrice'])
+                          for method, params in calls],
+                         [('eth_sendTransaction', hex(3), hex(int(5e9))),
+                          ('eth_sendTransaction', hex(4), hex(int(5e9)))])
+        self.assertEqual(engine._prices, {3: int(5e9), 4: int(5e9)})
+        # the send time is kept for the latency estimate
+        self.assertEqual(engine.window.in_flight[3], 50.0)
+
+    def test_replacer_handles_stuck_nonces(self):
+        engine = self.time_out(replacer=Replacer(int(1e11)))
+        self.assertEqual(engine.pricing.gas_price, int(5e9))
+        self.assertEqual(self.rpc.batches, [])
+
+
+class _RecoveryRPC(object):
+    """Knows the transactions in `pending`, has mined the ones in `mined`
+    and accepts every send.
+    """
+
+    def __init__(self, mined, pending):
+        self.mined = mined
+        self.pending = pending
+        self.sent = []
+
+    async def call(self, method, *params):
+        if method == 'eth_getTransactionCount':
+            return hex(5)
+        assert method == 'eth_sendTransaction', method
+        self.sent.append(int(params[0]['nonce'], 16))
+        return '0x{:064x}'.format(len(self.sent))
+
+    async def batch(self, calls):
+        results = []
+        for method, (tx_hash,) in calls:
+            if method == 'eth_getTransactionReceipt':
+                results.append({'blockNumber': '0x9'} if tx_hash in self.mined else None)
+            elif tx_hash in self.mined or tx_hash in self.pending:
+                results.append({'hash': tx_hash})
+            else:
+                results.append(None)
+        return results
+
+
+class TestRecover(unittest.TestCase):
+    """MintEngine._recover against a log left by a previous run."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'miner.wal')
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.dir)
+
+    def test_resends_only_unknown_nonces(self):
+        wal = WriteAheadLog(self.path).open()
+        wal.sent([(4, '0xa4'), (5, '0xa5'), (6, '0xa6'), (7, '0xa7')], int(4e9), 1.0)
+        # a replacement the node knows, of a transaction it dropped
+        wal.sent([(6, '0xb6')], int(5e9), 2.0)
+        # the node was about to sign 8 when the previous run crashed
+        wal.sending([8], int(5e9), 3.0)
+        wal.close()
+
+        rpc = _RecoveryRPC(mined={'0xa5'}, pending={'0xb6'})
+        wal = WriteAheadLog(self.path).open()
+        engine = MintEngine(rpc, SENDER, CONTRACT, MINT_DATA, ConstantPrice(int(4e9)),
+                            password=None, wal=wal)
+        engine._block_number = 9
+
+        async def recover():
+            await engine.nonces.start()
+            await engine._recover()
+        self.loop.run_until_complete(asyncio.wait_for(recover(), 10))
+        wal.close()
+
+        # 5 was mined, 6 is still pending, 7 and 8 are unknown to the node
+        self.assertEqual(engine.nonces.confirmed, 6)
+        self.assertEqual(rpc.sent, [7, 8])
+        self.assertEqual(sorted(engine.window.in_flight), [6, 7, 8])
+        self.assertEqual(engine._prices, {6: int(5e9), 7: int(4e9), 8: int(4e9)})
+        self.assertEqual(engine.nonces.next_nonce, 9)
+        self.assertEqual(sorted(engine.tracker.outstanding.values()), [6, 6, 7, 8])
+        self.assertEqual(sorted(replay(self.path)[1]), [6, 7, 8])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
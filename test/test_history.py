@@ -0,0 +1,113 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from miner.history import DTYPE, HEADER, MAGIC, BatchHistory, convert_csv, read_csv
+
+BATCHES = [
+    (4, 100.5, 110.25, 3.5e15),
+    (8, 110.25, 125.0, 4e15),
+    (16, 125.0, 126.5, 8.25e15),
+]
+
+
+class TestBatchHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'batchtimes.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_record_format(self):
+        history = BatchHistory(self.path)
+        history.append(BATCHES[0])
+        history.close()
+        with open(self.path, 'rb') as fd:
+            data = fd.read()
+        self.assertEqual(DTYPE.itemsize, 32)
+        self.assertEqual(len(data), HEADER.size + 32)
+        self.assertEqual(data[:HEADER.size], HEADER.pack(MAGIC, 1, 32))
+        self.assertEqual(struct.unpack('<Qddd', data[HEADER.size:]), BATCHES[0])
+
+    def test_round_trip(self):
+        history = BatchHistory(self.path)
+        self.assertEqual(len(history), 0)
+        self.assertEqual(len(history.records), 0)
+        history.append(BATCHES[0])
+        # the map follows appends
+        self.assertEqual(history.records.tolist(), BATCHES[:1])
+        history.extend(BATCHES[1:])
+        history.extend([])
+        self.assertEqual(history.records.tolist(), BATCHES)
+        history.close()
+
+        history = BatchHistory(self.path)
+        self.assertEqual(len(history), 3)
+        self.assertEqual(history.records.tolist(), BATCHES)
+        self.assertEqual(history.records['end_nonce'].tolist(), [4, 8, 16])
+        self.assertEqual(history.last(2).tolist(), BATCHES[1:])
+        self.assertEqual(history.last(10).tolist(), BATCHES)
+        history.close()
+
+    def test_torn_record(self):
+        history = BatchHistory(self.path)
+        history.extend(BATCHES[:2])
+        history.close()
+        with open(self.path, 'ab') as fd:
+            fd.write(b'\x01' * 10)
+
+        history = BatchHistory(self.path)
+        self.assertEqual(len(history), 2)
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + 2 * 32)
+        history.append(BATCHES[2])
+        self.assertEqual(history.records.tolist(), BATCHES)
+        history.close()
+
+    def test_not_a_history(self):
+        with open(self.path, 'wb') as fd:
+            fd.write(b'4,100,110,3500000000000000\n')
+        with self.assertRaises(ValueError):
+            BatchHistory(self.path)
+        with open(self.path, 'wb') as fd:
+            fd.write(HEADER.pack(MAGIC, 2, 32))
+        with self.assertRaises(ValueError):
+            BatchHistory(self.path)
+
+
+class TestCSV(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.csv = os.path.join(self.dir, 'batchtimes')
+        self.path = os.path.join(self.dir, 'batchtimes.bin')
+        # as written by the original miner, with a trailing blank line
+        with open(self.csv, 'w') as fd:
+            fd.write("4,100,110,3500000000000000\n8,110.0,125,4e+15\n\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_read_csv(self):
+        self.assertEqual(read_csv(self.csv), [[4, 100, 110, 3500000000000000],
+                                              [8, 110, 125, 4000000000000000]])
+
+    def test_convert_and_append(self):
+        self.assertEqual(convert_csv(self.csv, self.path), 2)
+        expected = [(4, 100.0, 110.0, 3.5e15), (8, 110.0, 125.0, 4e15)]
+        history = BatchHistory(self.path)
+        self.assertEqual(history.records.tolist(), expected)
+        history.close()
+
+        # converting into an existing history appends to it
+        self.assertEqual(convert_csv(self.csv, self.path), 2)
+        history = BatchHistory(self.path)
+        self.assertEqual(history.records.tolist(), expected * 2)
+        history.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
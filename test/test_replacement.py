@@ -0,0 +1,75 @@
+import unittest
+
+from miner.replacement import Replacer
+
+
+class TestReplacer(unittest.TestCase):
+
+    def test_stuck_after_stuck_blocks(self):
+        replacer = Replacer(10**6, stuck_blocks=2)
+        replacer.sent(5, 1000, 10)
+        replacer.sent(6, 1000, 11)
+        self.assertEqual(len(replacer), 2)
+        self.assertEqual(replacer.stuck(11, 1000), ([], None))
+        # 1000 * 1.125
+        self.assertEqual(replacer.stuck(12, 1000), ([5], 1125))
+        self.assertEqual(replacer.stuck(13, 1000), ([5, 6], 1125))
+
+    def test_bump_from_most_expensive(self):
+        replacer = Replacer(10**6, stuck_blocks=1, bump=1.2)
+        replacer.sent(3, 1000, 10)
+        replacer.sent(2, 1500, 10)
+        self.assertEqual(replacer.stuck(11, 1000), ([2, 3], 1800))
+        # the current price, if that is already higher
+        self.assertEqual(replacer.stuck(11, 2500), ([2, 3], 2500))
+
+    def test_bump_rounds_up(self):
+        replacer = Replacer(10**6, stuck_blocks=1, bump=1.1)
+        replacer.sent(0, 1001, 0)
+        # 1001 * 1.1 = 1101.1
+        self.assertEqual(replacer.stuck(1, 0), ([0], 1102))
+
+    def test_max_price(self):
+        replacer = Replacer(1125, stuck_blocks=1)
+        replacer.sent(0, 1000, 0)
+        self.assertEqual(replacer.stuck(1, 2000), ([0], 1125))
+
+        # at the cap, less than 10% above 1050: the node would reject it
+        replacer = Replacer(1150, stuck_blocks=1)
+        replacer.sent(0, 1050, 0)
+        self.assertEqual(replacer.stuck(1, 0), ([], None))
+
+    def test_capped_price_skips_nonces_it_cannot_replace(self):
+        replacer = Replacer(125, stuck_blocks=1)
+        replacer.sent(0, 100, 0)
+        replacer.sent(1, 120, 0)
+        # 125 is at least 10% above 100, but not above 120
+        self.assertEqual(replacer.stuck(1, 0), ([0], 125))
+
+    def test_underpriced(self):
+        replacer = Replacer(10**6, stuck_blocks=2)
+        replacer.sent(0, 1000, 10)
+        replacer.underpriced(0, 1125)
+        # the next bump starts from the refused price, and the nonce is not
+        # treated as freshly sent
+        self.assertEqual(replacer.stuck(12, 0), ([0], 1266))
+        replacer.underpriced(7, 1125)
+        self.assertEqual(len(replacer), 1)
+
+    def test_confirmed(self):
+        replacer = Replacer(10**6, stuck_blocks=1)
+        replacer.sent(0, 1000, 0)
+        replacer.sent(1, 1000, 0)
+        replacer.confirmed(0)
+        replacer.confirmed(9)
+        self.assertEqual(replacer.stuck(5, 0), ([1], 1125))
+        replacer.confirmed(1)
+        self.assertEqual(replacer.stuck(5, 0), ([], None))
+
+    def test_bump_below_minimum(self):
+        with self.assertRaises(AssertionError):
+            Replacer(10**6, bump=1.05)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
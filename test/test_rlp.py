@@ -2,8 +2,9 @@ from ethereum.tools import tester
 from ethereum import utils
 import unittest
 import random
-from itertools import chain
-from .generic_gas_token import input_data_cost
+from .compile_cache import deploy_solidity_source
+from .generic_gas_token import input_data_cost, MODEL
+from miner.children import ChildAddresses
 import warnings
 
 RLP_BASE = 21000
@@ -13,18 +14,7 @@ RLP_BASE = 21000
 # The value returned includes the cost of traversing the function jump table.
 # These values are best used to compute the delta in gas costs as the nonce 
 # increases. We find that rlp_cost(256**9 - 1) - rlp_cost(1) = 1526 - 884 = 642
-def rlp_cost(nonce):
-    if nonce == 0:
-        return 1036
-    elif nonce <= 127:
-        return 906
-    else:
-        hex = utils.encode_hex(utils.encode_int(nonce))
-        num_bytes = len(hex) / 2
-        cost = 1058 + num_bytes * 60
-        if nonce >= 256**8:
-            cost -= 50
-        return cost
+rlp_cost = MODEL.rlp_cost
 
 
 class TestRLP(unittest.TestCase):
@@ -33,6 +23,11 @@ class TestRLP(unittest.TestCase):
     s = None
     c = None
 
+    # tests that test.parallel may split into shards; test_exhaustive2 only
+    # checks the shard[0]-th of shard[1] contiguous pieces of its nonces
+    SHARDED_TESTS = ('test_exhaustive2',)
+    shard = (0, 1)
+
     @classmethod
     def setUpClass(cls):
         super(TestRLP, cls).setUpClass()
@@ -50,7 +45,7 @@ class TestRLP(unittest.TestCase):
         with open('contract/rlp.sol') as fd:
             contract_code = fd.read()
             contract_code = contract_code.replace(" pure internal ", " public ")
-        cls.c = cls.s.contract(contract_code, language='solidity')
+        cls.c = deploy_solidity_source(contract_code, 'Rlp', cls.s)
         cls.initial_state = cls.s.snapshot()
 
     def tot_rlp_cost(self, nonce, address):
@@ -115,10 +110,24 @@ class TestRLP(unittest.TestCase):
     def test_exhaustive2(self):
         # This is the actual address we use on the mainnet
         address = utils.normalize_address("0x0000000000b3F879cb30FE243b4Dfee438691c04")
-        for nonce in chain(range(72000), range(4722366482869645213696-72000, 4722366482869645213696)):
-            self.assertEqual(utils.encode_hex(utils.mk_contract_address(address, nonce)), self.c.mk_contract_address(address, nonce)[2:])
-            if nonce % 1000 == 0:
-                print('exhaustive test currently at nonce:', nonce)
+        ranges = [range(72000), range(4722366482869645213696-72000, 4722366482869645213696)]
+        # the same addresses, derived in bulk by miner/children.py, for the
+        # nonces of this shard only
+        children = ChildAddresses(address)
+        index, count = self.shard
+        total = sum(len(r) for r in ranges)
+        first, end = total * index // count, total * (index + 1) // count
+        for r in ranges:
+            nonces, first, end = r[max(first, 0):max(end, 0)], first - len(r), end - len(r)
+            if not nonces:
+                continue
+            derived = children.addresses(nonces.start, nonces.stop)
+            for i, nonce in enumerate(nonces):
+                expected = utils.encode_hex(utils.mk_contract_address(address, nonce))
+                self.assertEqual(expected, self.c.mk_contract_address(address, nonce)[2:])
+                self.assertEqual(expected, utils.encode_hex(derived[20 * i:20 * i + 20]))
+                if nonce % 1000 == 0:
+                    print('exhaustive test currently at nonce:', nonce)
 
     def test_random(self):
         for i in range(20):
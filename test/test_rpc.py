@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from miner.rpc import HTTPConnection, IPCConnection, RPCError, _Connection, _JSONStream
+
+VALUES = [
+    {"jsonrpc": "2.0", "id": 1, "result": "0x1a"},
+    {"jsonrpc": "2.0", "id": 2, "result": "Zürich € 😀"},
+    {"jsonrpc": "2.0", "id": 3, "result": "quote \" backslash \\ brackets ] } [ {"},
+    [{"jsonrpc": "2.0", "id": 4, "result": ["\\", "\\\"", "]"]},
+     {"jsonrpc": "2.0", "id": 5, "error": {"code": -32000, "message": "ü"}}],
+]
+
+
+def _feed(chunks):
+    stream = _JSONStream()
+    values = []
+    for chunk in chunks:
+        values.extend(stream.feed(chunk))
+    return values
+
+
+class TestJSONStream(unittest.TestCase):
+
+    def test_every_split(self):
+        data = ''.join(json.dumps(v, ensure_ascii=False) for v in VALUES).encode()
+        for split in range(1, len(data)):
+            self.assertEqual(_feed([data[:split], data[split:]]), VALUES, split)
+
+    def test_byte_by_byte(self):
+        data = '\n'.join(json.dumps(v, ensure_ascii=False) for v in VALUES).encode()
+        self.assertEqual(_feed([data[i:i + 1] for i in range(len(data))]), VALUES)
+
+    def test_multibyte_character_split(self):
+        data = json.dumps({"result": "😀"}, ensure_ascii=False).encode()
+        start = data.index('😀'.encode())
+        for split in range(start + 1, start + 4):
+            self.assertEqual(_feed([data[:split], data[split:]]), [{"result": "😀"}])
+
+    def test_escape_split(self):
+        # the backslash ends one chunk, the quote it escapes starts the next
+        value = {"result": "a\"]b\\"}
+        data = json.dumps(value).encode()
+        backslash = data.index(b'\\')
+        self.assertEqual(_feed([data[:backslash + 1], data[backslash + 1:]]), [value])
+        last = data.rindex(b'\\')
+        self.assertEqual(_feed([data[:last + 1], data[last + 1:]]), [value])
+
+    def test_values_are_returned_when_complete(self):
+        stream = _JSONStream()
+        first = json.dumps(VALUES[0]).encode()
+        self.assertEqual(stream.feed(first[:-1]), [])
+        self.assertEqual(stream.feed(first[-1:] + b' {"id"'), [VALUES[0]])
+        self.assertEqual(stream.feed(b': 7}  '), [{"id": 7}])
+
+
+class TestDispatch(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_batch(self):
+        connection = _Connection()
+        payloads = [connection._payload('eth_blockNumber', []) for _ in range(3)]
+        futures = connection._register(payloads)
+        connection._dispatch([
+            {"jsonrpc": "2.0", "id": 3, "result": "0x3"},
+            {"jsonrpc": "2.0", "id": 99, "result": "unknown id"},
+            {"jsonrpc": "2.0", "id": 1, "result": "0x1"},
+            {"jsonrpc": "2.0", "id": 2, "error": {"code": -32000, "message": "nonce too low"}},
+        ])
+        self.assertEqual(futures[0].result(), '0x1')
+        self.assertIsInstance(futures[1].result(), RPCError)
+        self.assertEqual(futures[1].result().message, 'nonce too low')
+        self.assertEqual(futures[2].result(), '0x3')
+        self.assertEqual(connection._pending, {})
+
+    def test_fail_pending(self):
+        connection = _Connection()
+        future, = connection._register([connection._payload('eth_blockNumber', [])])
+        connection._fail_pending(ConnectionError('gone'))
+        with self.assertRaises(ConnectionError):
+            future.result()
+
+
+class TestConnections(unittest.TestCase):
+    """HTTPConnection and IPCConnection against scripted servers."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.connections = 0
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_until_complete(self, coroutine):
+        return self.loop.run_until_complete(asyncio.wait_for(coroutine, 10))
+
+    @staticmethod
+    def respond(request):
+        if isinstance(request, list):
+            return [{"jsonrpc": "2.0", "id": r['id'], "result": r['params']} for r in request]
+        return {"jsonrpc": "2.0", "id": request['id'], "result": request['params']}
+
+    async def http_server(self, chunked, close):
+        async def serve(reader, writer):
+            self.connections += 1
+            while True:
+                if not await reader.readline():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    key, _, value = line.decode().partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                request = json.loads((await reader.readexactly(int(headers['content-length']))).decode())
+                body = json.dumps(self.respond(request), ensure_ascii=False).encode()
+                head = "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                if close:
+                    head += "Connection: close\r\n"
+                if chunked:
+                    head += "Transfer-Encoding: chunked\r\n\r\n"
+                    payload = b''.join('{:x}\r\n'.format(len(body[i:i + 7])).encode() +
+                                       body[i:i + 7] + b'\r\n' for i in range(0, len(body), 7))
+                    payload += b'0\r\n\r\n'
+                else:
+                    head += "Content-Length: {}\r\n\r\n".format(len(body))
+                    payload = body
+                writer.write(head.encode() + payload)
+                await writer.drain()
+                if close:
+                    break
+            writer.close()
+
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        return server, HTTPConnection('http://127.0.0.1:{}/'.format(port))
+
+    def http_calls(self, chunked, close):
+        async def go():
+            server, rpc = await self.http_server(chunked, close)
+            try:
+                await rpc.open()
+                first = await rpc.call('echo', 'ü', 1)
+                batch = await rpc.batch([('echo', [2]), ('echo', ['😀'])])
+                # calls made while a request is outstanding go out together
+                together = await asyncio.gather(rpc.call('echo', 3), rpc.call('echo', 4))
+                return first, batch, together
+            finally:
+                rpc.close()
+                server.close()
+        return self.run_until_complete(go())
+
+    def test_http_content_length(self):
+        first, batch, together = self.http_calls(chunked=False, close=False)
+        self.assertEqual(first, ['ü', 1])
+        self.assertEqual(batch, [[2], ['😀']])
+        self.assertEqual(together, [[3], [4]])
+        self.assertEqual(self.connections, 1)
+
+    def test_http_chunked(self):
+        first, batch, together = self.http_calls(chunked=True, close=False)
+        self.assertEqual(first, ['ü', 1])
+        self.assertEqual(batch, [[2], ['😀']])
+        self.assertEqual(together, [[3], [4]])
+        self.assertEqual(self.connections, 1)
+
+    def test_http_connection_close(self):
+        first, batch, together = self.http_calls(chunked=True, close=True)
+        self.assertEqual(first, ['ü', 1])
+        self.assertEqual(batch, [[2], ['😀']])
+        self.assertEqual(together, [[3], [4]])
+        # the client reconnects for every request the server closed
+        self.assertGreaterEqual(self.connections, 3)
+
+    def test_ipc_split_responses(self):
+        path = os.path.join(tempfile.mkdtemp(), 'rpc.ipc')
+
+        async def serve(reader, writer):
+            stream = _JSONStream()
+            while True:
+                data = await reader.read(2**16)
+                if not data:
+                    break
+                for request in stream.feed(data):
+                    body = json.dumps(self.respond(request), ensure_ascii=False).encode()
+                    # one byte at a time, so that characters and escapes
+                    # are split across the client's reads
+                    for i in range(len(body)):
+                        writer.write(body[i:i + 1])
+                        await writer.drain()
+                        await asyncio.sleep(0)
+            writer.close()
+
+        async def go():
+            server = await asyncio.start_unix_server(serve, path)
+            rpc = await IPCConnection(path).open()
+            try:
+                return await asyncio.gather(rpc.call('echo', 'Zürich € 😀'),
+                                            rpc.batch([('echo', ['"]\\']), ('echo', [{}])]))
+            finally:
+                rpc.close()
+                server.close()
+
+        single, batch = self.run_until_complete(go())
+        self.assertEqual(single, ['Zürich € 😀'])
+        self.assertEqual(batch, [['"]\\'], [{}]])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,109 @@
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from miner import vanity
+from miner.children import ChildAddresses
+
+# nonces of the deployer are searched, about one in 256 addresses matches
+ADDRESS = '42' * 20
+MAX_NONCE = 4095
+
+
+def _expected():
+    packed = ChildAddresses(bytes.fromhex(ADDRESS)).addresses(0, MAX_NONCE + 1)
+    return [nonce for nonce in range(MAX_NONCE + 1) if packed[20 * nonce] == 0]
+
+
+class TestMatches(unittest.TestCase):
+
+    def test_aligned_only(self):
+        packed = (b'\x00\x00' + b'\x01' * 18 +
+                  # two zero bytes at the end, and one at the start of the
+                  # next address, are no match
+                  b'\x01' * 18 + b'\x00\x00' +
+                  b'\x00' + b'\x01' * 19 +
+                  bytes(20))
+        self.assertEqual(list(vanity._matches(packed, 2)), [0, 3])
+        self.assertEqual(list(vanity._matches(packed, 1)), [0, 2, 3])
+        self.assertEqual(list(vanity._matches(packed, 3)), [3])
+        self.assertEqual(list(vanity._matches(b'', 1)), [])
+
+    def test_zero_bytes(self):
+        with self.assertRaises(ValueError):
+            vanity.Search(0, MAX_NONCE, ADDRESS)
+
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.dir, 'vanity.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def search(self):
+        return vanity.Search(1, MAX_NONCE, ADDRESS, chunk_size=256)
+
+    def test_count(self):
+        expected = _expected()
+        self.assertGreater(len(expected), 3)
+        found = vanity.run(self.search(), processes=2, count=3, report=lambda line: None)
+        self.assertEqual(len(found), 3)
+        for match in found:
+            self.assertIn(match['nonce'], expected)
+            self.assertTrue(match['address'].startswith('00'))
+
+    def test_whole_space(self):
+        search = self.search()
+        found = vanity.run(search, processes=2, count=None, report=lambda line: None)
+        self.assertEqual(sorted(match['nonce'] for match in found), _expected())
+        self.assertEqual(search.candidates, MAX_NONCE + 1)
+        self.assertEqual(list(search.pending()), [])
+
+    def test_resume_from_checkpoint(self):
+        search = self.search()
+        vanity.run(search, processes=2, count=1, checkpoint=self.checkpoint,
+                   report=lambda line: None)
+        # the checkpoint holds the keys found, for key searches
+        self.assertEqual(stat.S_IMODE(os.stat(self.checkpoint).st_mode), 0o600)
+
+        resumed = vanity.Search.load(self.checkpoint)
+        self.assertEqual(resumed.params, search.params)
+        self.assertEqual(resumed.next_chunk, search.next_chunk)
+        self.assertEqual(resumed.done, search.done)
+        self.assertEqual(resumed.found, search.found)
+        self.assertEqual(resumed.candidates, search.candidates)
+        self.assertLess(resumed.candidates, MAX_NONCE + 1)
+
+        # the rest of the search finds every match exactly once
+        found = vanity.run(resumed, processes=2, count=None, checkpoint=self.checkpoint,
+                           report=lambda line: None)
+        self.assertEqual(sorted(match['nonce'] for match in found), _expected())
+        self.assertEqual(resumed.candidates, MAX_NONCE + 1)
+        self.assertEqual(vanity.Search.load(self.checkpoint).found, resumed.found)
+
+    def test_key_search_checkpoint(self):
+        search = vanity.Search(1, 3, chunk_size=2)
+        search.complete(1, [{'key': '11' * 32, 'deployer': ADDRESS, 'nonce': 2,
+                             'address': '00' * 20}], 8)
+        search.save(self.checkpoint)
+        resumed = vanity.Search.load(self.checkpoint)
+        self.assertEqual(resumed.params['seed'], search.params['seed'])
+        self.assertIsNone(resumed.chunks)
+        # chunk 0 is still to do, chunk 1 is done
+        pending = resumed.pending()
+        self.assertEqual([next(pending) for _ in range(3)], [0, 2, 3])
+
+    def test_checkpoint_version(self):
+        with open(self.checkpoint, 'w') as fd:
+            fd.write('{"version": 99}')
+        with self.assertRaises(ValueError):
+            vanity.Search.load(self.checkpoint)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
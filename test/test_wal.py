@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from miner.wal import Entry, WriteAheadLog, replay
+
+
+class TestWriteAheadLog(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'miner.wal')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def records(self):
+        with open(self.path) as fd:
+            return [json.loads(line) for line in fd]
+
+    def test_replay(self):
+        wal = WriteAheadLog(self.path).open()
+        wal.sent([(0, '0xa0'), (1, '0xa1'), (2, None)], 100, 1.0)
+        wal.sent([(1, '0xb1')], 125, 2.0)
+        wal.confirm_below(1)
+        wal.close()
+
+        confirmed, entries, good_size = replay(self.path)
+        self.assertEqual(confirmed, 1)
+        # the node already knew nonce 2, so there is no hash to log
+        self.assertEqual(entries, {1: Entry(1, ['0xa1', '0xb1'], 125, 2.0)})
+        self.assertEqual(good_size, os.path.getsize(self.path))
+        self.assertEqual(WriteAheadLog(self.path).open().entries, entries)
+
+    def test_torn_last_line(self):
+        wal = WriteAheadLog(self.path).open()
+        wal.sent([(0, '0xa0'), (1, '0xa1')], 100, 1.0)
+        wal.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as fd:
+            fd.write(b'{"gas_price": 100, "hash": "0xa2", "no')
+
+        self.assertEqual(replay(self.path)[2], size)
+        wal = WriteAheadLog(self.path).open()
+        self.assertEqual(sorted(wal.entries), [0, 1])
+        self.assertEqual(os.path.getsize(self.path), size)
+        # new records start on a line of their own
+        wal.sent([(2, '0xa2')], 100, 3.0)
+        wal.close()
+        self.assertEqual([record['nonce'] for record in self.records()], [0, 1, 2])
+
+    def test_corrupt_record(self):
+        with open(self.path, 'w') as fd:
+            fd.write('{"confirmed": 3}\n{"nonce": \n{"confirmed": 4}\n')
+        with self.assertRaises(ValueError):
+            replay(self.path)
+
+    def test_confirm_below_and_compact(self):
+        wal = WriteAheadLog(self.path, compact_every=6).open()
+        wal.sent([(0, '0xa0'), (1, '0xa1'), (2, '0xa2')], 100, 1.0)
+        wal.sent([(2, '0xb2')], 125, 2.0)
+        wal.confirm_below(1)
+        self.assertEqual(len(self.records()), 5)
+        # nothing new confirmed, nothing logged
+        wal.confirm_below(1)
+        self.assertEqual(sorted(wal.entries), [1, 2])
+
+        # the sixth record triggers compaction
+        wal.confirm_below(2)
+        self.assertEqual(self.records(), [
+            {'confirmed': 2},
+            {'nonce': 2, 'hash': '0xa2', 'gas_price': 125, 'sent_at': 2.0},
+            {'nonce': 2, 'hash': '0xb2', 'gas_price': 125, 'sent_at': 2.0},
+        ])
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+        # and the log stays appendable
+        wal.sent([(3, '0xa3'), (1, '0xc1')], 150, 3.0)
+        wal.close()
+
+        wal = WriteAheadLog(self.path).open()
+        self.assertEqual(wal.confirmed, 2)
+        self.assertEqual(wal.entries, {2: Entry(2, ['0xa2', '0xb2'], 125, 2.0),
+                                       3: Entry(3, ['0xa3'], 150, 3.0)})
+
+    def test_intent(self):
+        wal = WriteAheadLog(self.path).open()
+        wal.sending([0, 1], 100, 1.0)
+        wal.sent([(0, '0xa0')], 100, 1.5)
+        self.assertEqual(WriteAheadLog(self.path).open().entries,
+                         {0: Entry(0, ['0xa0'], 100, 1.5), 1: Entry(1, [], 100, 1.0)})
+
+        # a replacement keeps the hashes sent before it
+        wal.sending([0], 125, 2.0)
+        self.assertEqual(replay(self.path)[1][0], Entry(0, ['0xa0'], 125, 2.0))
+
+        # compaction keeps nonces that were only about to be sent
+        wal.sent([(2, '0xa2')], 100, 3.0)
+        wal.compact()
+        wal.close()
+        self.assertEqual(replay(self.path)[1], {0: Entry(0, ['0xa0'], 125, 2.0),
+                                                1: Entry(1, [], 100, 1.0),
+                                                2: Entry(2, ['0xa2'], 100, 3.0)})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
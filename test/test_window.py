@@ -0,0 +1,63 @@
+import unittest
+
+from miner.window import Window
+
+
+class TestWindow(unittest.TestCase):
+
+    def test_fixed_size(self):
+        window = Window(3)
+        self.assertFalse(window.auto)
+        self.assertEqual(window.free_slots(), 3)
+        window.sent(10, 100.0)
+        window.sent(11, 101.0)
+        self.assertEqual(len(window), 2)
+        self.assertEqual(window.free_slots(), 1)
+        self.assertEqual(window.oldest(), (10, 100.0))
+
+        window.observe(30.0)
+        self.assertEqual(window.resize(10.0), 3)
+        self.assertEqual(window.size, 3)
+
+    def test_confirm(self):
+        window = Window(4, smoothing=0.5)
+        window.sent(1, 100.0)
+        window.sent(2, 102.0)
+        self.assertEqual(window.confirm(1, 110.0), 100.0)
+        self.assertEqual(window.latency, 10.0)
+        self.assertIsNone(window.confirm(1, 111.0))
+        self.assertIsNone(window.confirm(7, 111.0))
+        self.assertEqual(window.latency, 10.0)
+        self.assertEqual(window.oldest(), (2, 102.0))
+        # moving average: 10 + 0.5 * (20 - 10)
+        self.assertEqual(window.confirm(2, 122.0), 102.0)
+        self.assertEqual(window.latency, 15.0)
+        self.assertIsNone(window.oldest())
+
+    def test_littles_law(self):
+        window = Window(None, min_size=2, max_size=40, smoothing=0.25, initial_size=4)
+        self.assertTrue(window.auto)
+        self.assertEqual(window.size, 4)
+        # no latency observed yet, or no rate: the size stays
+        self.assertEqual(window.resize(1.0), 4)
+        window.observe(12.0)
+        self.assertEqual(window.resize(None), 4)
+
+        # rate * latency transactions in flight, rounded up
+        self.assertEqual(window.resize(0.5), 6)
+        self.assertEqual(window.resize(0.51), 7)
+        window.observe(28.0)
+        self.assertEqual(window.latency, 16.0)
+        self.assertEqual(window.resize(0.5), 8)
+
+        # clamped to [min_size, max_size]
+        self.assertEqual(window.resize(0.01), 2)
+        self.assertEqual(window.resize(100.0), 40)
+        self.assertEqual(window.free_slots(), 40)
+
+    def test_initial_size(self):
+        self.assertEqual(Window(None, min_size=3).size, 3)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)